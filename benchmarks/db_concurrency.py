@@ -0,0 +1,98 @@
+"""Prueba de carga: throughput de /api/chat con consultas lentas a la base de datos.
+
+Levanta la aplicación en proceso (httpx + ASGITransport), sustituye Ollama por
+una espera asíncrona y añade una latencia artificial a cada sentencia SQL. Si las
+consultas se ejecutan en el event loop, las peticiones concurrentes se serializan
+detrás de ellas; si se ejecutan en el executor de base de datos, se solapan.
+
+Uso:
+    python -m benchmarks.db_concurrency --requests 200 --concurrency 20
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+from sqlalchemy import event
+from sqlmodel import SQLModel, Session, create_engine
+
+from src.main import app, get_session
+
+
+def build_engine(db_path: Path, db_latency: float):
+    """Engine SQLite en fichero con una latencia fija por sentencia"""
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        connect_args={"check_same_thread": False},
+    )
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _slow_query(*_args, **_kwargs):
+        time.sleep(db_latency)
+
+    SQLModel.metadata.create_all(engine)
+    return engine
+
+
+async def run(requests: int, concurrency: int, db_latency: float, llm_latency: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_engine(Path(tmp) / "bench.db", db_latency)
+
+        def get_session_override():
+            with Session(engine) as session:
+                yield session
+
+        async def fake_chat(*_args, **_kwargs):
+            await asyncio.sleep(llm_latency)
+            return "ok"
+
+        app.dependency_overrides[get_session] = get_session_override
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one(client: httpx.AsyncClient, i: int):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(
+                    "/api/chat", json={"message": "hola", "user_id": f"user-{i % concurrency}"}
+                )
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        try:
+            with patch("src.main.ollama_service.chat", new=fake_chat):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                    started = time.perf_counter()
+                    await asyncio.gather(*(one(client, i) for i in range(requests)))
+                    elapsed = time.perf_counter() - started
+        finally:
+            app.dependency_overrides.clear()
+            engine.dispose()
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "req_per_s": round(requests / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--db-latency", type=float, default=0.01, help="segundos por sentencia SQL")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="segundos por respuesta de Ollama")
+    args = parser.parse_args()
+    print(asyncio.run(run(args.requests, args.concurrency, args.db_latency, args.llm_latency)))
+
+
+if __name__ == "__main__":
+    main()
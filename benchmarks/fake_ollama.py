@@ -0,0 +1,136 @@
+"""Servidor /api/chat de Ollama simulado para pruebas de carga.
+
+Responde con un guion configurable: primero las herramientas de ``tool_script``
+(una ronda por herramienta) y después una respuesta de ``tokens`` tokens. Cada
+ronda espera ``latency`` segundos (evaluación del prompt) más el tiempo de
+generar los tokens a ``token_rate`` tokens/s, y devuelve los mismos campos de
+tiempos que Ollama (``prompt_eval_*``, ``eval_*``).
+
+Se puede usar en proceso (``FakeOllama().client()``) o como servidor:
+    FAKE_OLLAMA_LATENCY=0.2 uvicorn benchmarks.fake_ollama:app --port 11435
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Argumentos que el guion pasa a cada herramienta
+TOOL_ARGS: Dict[str, Dict[str, Any]] = {
+    "find_free_slots": {},
+    "get_appointment_lists": {"limit": 5},
+    "check_occupied_slots": {"start": "2030-01-07T09:00:00", "end": "2030-01-07T18:00:00"},
+}
+
+
+class FakeOllama:
+    """Ollama simulado con latencia, velocidad de generación y guion de herramientas"""
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        token_rate: float = 200.0,
+        tokens: int = 40,
+        tool_script: Optional[List[str]] = None,
+    ):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.tokens = tokens
+        self.tool_script = tool_script or []
+        self.requests = 0
+        self.app = FastAPI(title="Fake Ollama")
+        self.app.post("/api/chat")(self.chat)
+
+    def client(self, timeout: float = 300.0) -> httpx.AsyncClient:
+        """Cliente HTTP que habla con este servidor sin abrir sockets"""
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), timeout=timeout)
+
+    async def chat(self, request: Request):
+        payload = await request.json()
+        self.requests += 1
+        messages: List[Dict[str, Any]] = payload.get("messages", [])
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+
+        # Ronda actual: herramientas ya respondidas desde el último mensaje del usuario
+        tool_round = 0
+        for message in reversed(messages):
+            if message.get("role") == "user":
+                break
+            if message.get("role") == "tool":
+                tool_round += 1
+
+        if payload.get("tools") and tool_round < len(self.tool_script):
+            name = self.tool_script[tool_round]
+            message = {
+                "role": "assistant",
+                "content": "",
+                "tool_calls": [{"function": {"name": name, "arguments": TOOL_ARGS.get(name, {})}}],
+            }
+            tokens = 10
+        else:
+            message = {"role": "assistant", "content": ""}
+            tokens = self.tokens
+
+        if payload.get("stream"):
+            return StreamingResponse(
+                self._stream(message, prompt_tokens, tokens), media_type="application/x-ndjson"
+            )
+
+        await asyncio.sleep(self.latency + tokens / self.token_rate)
+        if not message.get("tool_calls"):
+            message["content"] = self._text(tokens)
+        return JSONResponse(self._final(payload, message, prompt_tokens, tokens))
+
+    async def _stream(self, message: Dict[str, Any], prompt_tokens: int, tokens: int) -> AsyncIterator[str]:
+        await asyncio.sleep(self.latency)
+        if message.get("tool_calls"):
+            await asyncio.sleep(tokens / self.token_rate)
+        else:
+            # Fragmentos de ~8 tokens para no ahogar el bucle con sleeps diminutos
+            for start in range(0, tokens, 8):
+                chunk = min(8, tokens - start)
+                await asyncio.sleep(chunk / self.token_rate)
+                yield json.dumps({"message": {"role": "assistant", "content": self._text(chunk)}, "done": False}) + "\n"
+            message = {"role": "assistant", "content": ""}
+        yield json.dumps(self._final({}, message, prompt_tokens, tokens, done=True)) + "\n"
+
+    def _final(
+        self,
+        payload: Dict[str, Any],
+        message: Dict[str, Any],
+        prompt_tokens: int,
+        tokens: int,
+        done: bool = True,
+    ) -> Dict[str, Any]:
+        return {
+            "model": payload.get("model", "fake"),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "message": message,
+            "done": done,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(self.latency * 1e9),
+            "eval_count": tokens,
+            "eval_duration": int(tokens / self.token_rate * 1e9),
+        }
+
+    @staticmethod
+    def _text(tokens: int) -> str:
+        return " ".join("bla" for _ in range(tokens))
+
+
+def _from_env() -> FakeOllama:
+    script = os.getenv("FAKE_OLLAMA_TOOL_SCRIPT", "")
+    return FakeOllama(
+        latency=float(os.getenv("FAKE_OLLAMA_LATENCY", 0.05)),
+        token_rate=float(os.getenv("FAKE_OLLAMA_TOKEN_RATE", 200)),
+        tokens=int(os.getenv("FAKE_OLLAMA_TOKENS", 40)),
+        tool_script=[s for s in script.split(",") if s],
+    )
+
+
+# Aplicación ASGI para lanzarlo con uvicorn
+app = _from_env().app
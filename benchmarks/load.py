@@ -0,0 +1,248 @@
+"""Prueba de carga de la API con Ollama simulado y comparación con una línea base.
+
+Lanza cada escenario con la concurrencia indicada y mide latencias (p50/p95/p99)
+y peticiones por segundo. Por defecto levanta la aplicación en proceso
+(httpx + ASGITransport) sobre una BdD SQLite temporal y con
+``benchmarks.fake_ollama`` en lugar de Ollama; con ``--url`` ataca un servidor
+ya arrancado (que debe apuntar a su propio Ollama o al simulado).
+
+Uso:
+    python -m benchmarks.load --scenario chat --scenario appointments_list
+    python -m benchmarks.load --save-baseline          # guardar la línea base
+    python -m benchmarks.load --fail-on-regression     # comparar (CI)
+"""
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from unittest.mock import patch
+
+import httpx
+from sqlmodel import SQLModel, Session
+
+from benchmarks.fake_ollama import FakeOllama
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+Scenario = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+def _chat(client: httpx.AsyncClient, i: int) -> Awaitable[httpx.Response]:
+    return client.post("/api/chat", json={"message": f"Quiero una cita, petición {i}", "user_id": f"bench-{i % 50}"})
+
+
+async def _chat_stream(client: httpx.AsyncClient, i: int) -> httpx.Response:
+    async with client.stream(
+        "POST", "/api/chat/stream",
+        json={"message": f"Quiero una cita, petición {i}", "user_id": f"bench-{i % 50}"},
+    ) as response:
+        async for _ in response.aiter_lines():
+            pass
+    return response
+
+
+def _appointments_list(client: httpx.AsyncClient, i: int) -> Awaitable[httpx.Response]:
+    return client.get("/api/appointments", params={"limit": 20})
+
+
+def _free_slots(client: httpx.AsyncClient, i: int) -> Awaitable[httpx.Response]:
+    return client.get("/api/slots/free", params={"limit": 10})
+
+
+# Desplazamiento aleatorio para que ejecuciones contra el mismo servidor no choquen
+_RUN_OFFSET = random.randrange(0, 1_000_000)
+
+
+def _appointments_create(client: httpx.AsyncClient, i: int) -> Awaitable[httpx.Response]:
+    date = datetime(2040, 1, 1) + timedelta(minutes=30 * (_RUN_OFFSET + i))
+    return client.post("/api/appointments", json={
+        "name": f"Paciente {i}",
+        "email": f"paciente{i}@example.com",
+        "phone": "5551234567",
+        "date": date.isoformat(),
+        "description": "Prueba de carga",
+    })
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "chat": _chat,
+    "chat_stream": _chat_stream,
+    "appointments_list": _appointments_list,
+    "appointments_create": _appointments_create,
+    "free_slots": _free_slots,
+}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    warmup: int = 5,
+) -> Dict[str, Any]:
+    """Lanzar ``requests`` peticiones con ``concurrency`` en vuelo y medirlas"""
+    for i in range(warmup):
+        await scenario(client, -1 - i)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await scenario(client, i)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "req_per_s": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    """Ejecutar los escenarios pedidos (en proceso o contra ``--url``)"""
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=300) as client:
+            return {
+                name: await run_scenario(client, SCENARIOS[name], args.requests, args.concurrency)
+                for name in args.scenario
+            }
+
+    from src.database import build_engine, get_session
+    from src.main import app
+    from src.ollama_service import ollama_service
+    from src.slot_index import slot_index
+
+    fake = FakeOllama(
+        latency=args.llm_latency,
+        token_rate=args.token_rate,
+        tokens=args.tokens,
+        tool_script=args.tool_script,
+    )
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, ExitStack() as stack:
+        engine = build_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        SQLModel.metadata.create_all(engine)
+        # Herramientas y resúmenes usan el engine global: apuntarlo a la BdD temporal
+        for target in ("src.tools.engine", "src.conversation_context.engine"):
+            stack.enter_context(patch(target, engine))
+        stack.enter_context(patch.object(ollama_service, "client", fake.client()))
+
+        def get_session_override():
+            with Session(engine) as session:
+                yield session
+
+        app.dependency_overrides[get_session] = get_session_override
+        with Session(engine) as session:
+            slot_index.rebuild(session)
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+                for name in args.scenario:
+                    results[name] = await run_scenario(client, SCENARIOS[name], args.requests, args.concurrency)
+        finally:
+            app.dependency_overrides.clear()
+            slot_index.clear()
+            engine.dispose()
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Escenarios cuyo p95 o req/s empeoran más de ``tolerance`` respecto a la línea base"""
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            continue
+        p95_delta = (current["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+        rps_delta = (current["req_per_s"] - base["req_per_s"]) / base["req_per_s"] if base["req_per_s"] else 0.0
+        print(f"{name:22} p95 {base['p95_ms']:>8} -> {current['p95_ms']:>8} ms ({p95_delta:+.0%})  "
+              f"req/s {base['req_per_s']:>7} -> {current['req_per_s']:>7} ({rps_delta:+.0%})")
+        if p95_delta > tolerance or rps_delta < -tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="escenario a ejecutar (repetible); por defecto, todos")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--url", help="atacar un servidor ya arrancado en lugar de la app en proceso")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="segundos de evaluación del prompt por ronda")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="tokens/s generados")
+    parser.add_argument("--tokens", type=int, default=40, help="tokens de cada respuesta final")
+    parser.add_argument("--tool-script", type=lambda s: [t for t in s.split(",") if t], default=[],
+                        help="herramientas a pedir antes de responder, p. ej. find_free_slots")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="guardar los resultados como línea base")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="empeoramiento tolerado (0.2 = 20%%)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+    args.scenario = args.scenario or list(SCENARIOS)
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({
+            "python": platform.python_version(),
+            "params": {
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "llm_latency": args.llm_latency,
+                "token_rate": args.token_rate,
+                "tokens": args.tokens,
+                "tool_script": args.tool_script,
+            },
+            "results": results,
+        }, indent=2) + "\n")
+        print(f"Línea base guardada en {args.baseline}")
+        return 0
+
+    if args.baseline.exists():
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        if regressions:
+            print(f"Regresiones: {', '.join(regressions)}")
+            if args.fail_on_regression:
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""Micro-benchmark: serialización de un turno de chat, módulo json frente a src/serialization.
+
+Simula un turno con historial y varias rondas de herramientas y mide, por cada
+camino, el tiempo de generar todos los cuerpos de /api/chat y los mensajes de
+resultado de herramienta, y los bytes/s resultantes:
+
+- ``stdlib``: lo que se hacía antes. El payload completo (prompt de sistema y
+  herramientas incluidos) pasa por ``json.dumps`` de httpx en cada ronda y cada
+  resultado se serializa dos veces (comprobación y mensaje).
+- ``fast``: ``ChatPayloadEncoder`` (partes estáticas codificadas una vez,
+  solo los mensajes nuevos en cada ronda) y ``dumps`` para los resultados.
+
+Uso:
+    python -m benchmarks.serialization --turns 16 --rounds 3 --iterations 2000
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from src.config import OLLAMA_KEEP_ALIVE, OLLAMA_MODEL
+from src.models import Appointment
+from src.ollama_service import SYSTEM_MESSAGE
+from src.ollama_tools import TOOLS
+from src.serialization import ChatPayloadEncoder, dumps_str
+
+
+def build_turn(turns: int, results_per_tool: int) -> Dict[str, Any]:
+    """Mensajes de un turno con ``turns`` turnos de historial y un resultado de herramienta"""
+    messages: List[Dict[str, Any]] = [SYSTEM_MESSAGE]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"Quiero una cita el miércoles {i} por la mañana, ¿hay hueco?"})
+        messages.append({"role": "assistant", "content": f"Sí, el miércoles {i} hay franjas libres a las 9:00 y a las 9:30."})
+    messages.append({"role": "system", "content": "Contexto adicional: próximas citas de la semana."})
+    messages.append({"role": "user", "content": "Resérvame la primera franja libre, por favor."})
+    start = datetime(2025, 1, 6, 9, 0)
+    result = [
+        Appointment(id=i, name=f"Paciente {i}", email=f"p{i}@example.com",
+                    date=start + timedelta(minutes=30 * i), created_at=start)
+        for i in range(results_per_tool)
+    ]
+    return {"messages": messages, "result": result}
+
+
+def _stdlib_turn(messages: List[Dict[str, Any]], result: Any, rounds: int) -> int:
+    sent = 0
+    messages = list(messages)
+    for _ in range(rounds):
+        payload = {"model": OLLAMA_MODEL, "messages": messages, "stream": False, "tools": TOOLS}
+        if OLLAMA_KEEP_ALIVE:
+            payload["keep_alive"] = OLLAMA_KEEP_ALIVE
+        # httpx 0.27 con json=: json.dumps con ensure_ascii
+        sent += len(json.dumps(payload).encode("utf-8"))
+        try:
+            json.dumps(result)  # la comprobación que hacía _execute_tool
+            value = result
+        except TypeError:
+            value = str(result)
+        content = json.dumps({"ok": True, "result": value, "error": None}, ensure_ascii=False)
+        messages.append({"role": "tool", "content": content})
+    return sent
+
+
+def _fast_turn(encoder: ChatPayloadEncoder, messages: List[Dict[str, Any]], result: Any, rounds: int) -> int:
+    sent = 0
+    messages = list(messages)
+    encoded: List[bytes] = []
+    for _ in range(rounds):
+        sent += len(encoder.encode(messages, stream=False, encoded=encoded))
+        content = dumps_str({"ok": True, "result": result, "error": None})
+        messages.append({"role": "tool", "content": content})
+    return sent
+
+
+def _measure(turn: Callable[[], int], iterations: int) -> Dict[str, float]:
+    turn()  # calentamiento
+    sent = 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        sent += turn()
+    elapsed = time.perf_counter() - started
+    return {
+        "us_per_turn": round(elapsed / iterations * 1e6, 1),
+        "bytes_per_turn": sent // iterations,
+        "mb_per_s": round(sent / elapsed / 1e6, 1),
+    }
+
+
+def run(turns: int = 16, rounds: int = 3, iterations: int = 2000, results_per_tool: int = 10) -> Dict[str, Any]:
+    data = build_turn(turns, results_per_tool)
+    messages, result = data["messages"], data["result"]
+    encoder = ChatPayloadEncoder(OLLAMA_MODEL, TOOLS, OLLAMA_KEEP_ALIVE, SYSTEM_MESSAGE)
+    stdlib = _measure(lambda: _stdlib_turn(messages, result, rounds), iterations)
+    fast = _measure(lambda: _fast_turn(encoder, messages, result, rounds), iterations)
+    return {
+        "params": {"turns": turns, "rounds": rounds, "iterations": iterations, "results_per_tool": results_per_tool},
+        "stdlib": stdlib,
+        "fast": fast,
+        "speedup": round(stdlib["us_per_turn"] / fast["us_per_turn"], 2) if fast["us_per_turn"] else None,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=16, help="turnos de historial en el prompt")
+    parser.add_argument("--rounds", type=int, default=3, help="rondas contra Ollama por turno")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--results-per-tool", type=int, default=10, help="citas devueltas por la herramienta")
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.turns, args.rounds, args.iterations, args.results_per_tool), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
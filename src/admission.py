@@ -0,0 +1,150 @@
+# src/admission.py
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+
+
+# Cola del trabajo en segundo plano; no coincide con ningún user_id real
+BACKGROUND_QUEUE = "\x00background"
+
+
+class AdmissionRejected(Exception):
+    """No se admitió la petición: la cola está llena o se agotó la espera."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Límite de conversaciones simultáneas con Ollama y cola justa por usuario.
+
+    Como mucho ``max_concurrency`` turnos hablan con Ollama a la vez. El resto
+    espera en una cola por ``user_id`` que se atiende por turnos (round-robin),
+    para que un usuario con muchas peticiones no retrase a los demás.
+
+    - Con la cola llena (``max_queue`` en total o ``max_queue_per_user`` para
+      ese usuario) la petición se rechaza al momento (429).
+    - Si la espera supera ``max_wait`` segundos, se rechaza (503).
+
+    En ambos casos ``retry_after`` estima cuándo reintentar a partir del tiempo
+    medio que cada turno ocupa su plaza.
+
+    El trabajo en segundo plano (``background=True``, p. ej. los resúmenes)
+    espera en una cola propia que no cuenta para ``max_queue_per_user``: así
+    no quita sitio a los mensajes del usuario.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        max_queue_per_user: int,
+        max_wait: float,
+        ewma_alpha: float = 0.2,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.max_wait = max_wait
+        self.ewma_alpha = ewma_alpha
+        self.active = 0
+        self.queued = 0
+        self.rejected = 0
+        # Tiempo medio (EWMA) que un turno mantiene su plaza, en segundos
+        self.hold_time = 1.0
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[str] = None, background: bool = False) -> AsyncIterator[None]:
+        """Ocupar una plaza mientras dura el bloque.
+
+        Raises:
+            AdmissionRejected: Si la cola está llena o se agota la espera.
+        """
+        await self._acquire(BACKGROUND_QUEUE if background else user_id or "", background)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.hold_time += self.ewma_alpha * (time.monotonic() - started - self.hold_time)
+            self._release()
+
+    def stats(self) -> Dict[str, float]:
+        """Estado de la cola, para /health"""
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+    def retry_after(self) -> int:
+        """Segundos estimados hasta que haya una plaza libre"""
+        waves = (self.queued + 1) / max(1, self.max_concurrency)
+        return max(1, math.ceil(self.hold_time * waves))
+
+    async def _acquire(self, user_id: str, background: bool = False):
+        if self.active < self.max_concurrency and not self.queued:
+            self.active += 1
+            return
+
+        user_queue = self._queues.get(user_id)
+        if self.queued >= self.max_queue or (
+            not background and user_queue is not None and len(user_queue) >= self.max_queue_per_user
+        ):
+            self.rejected += 1
+            raise AdmissionRejected(
+                "Demasiadas peticiones en cola", status_code=429, retry_after=self.retry_after()
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_id, deque()).append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter, timeout=self.max_wait)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # La plaza llegó justo a la vez que el timeout/cancelación
+                if isinstance(e, asyncio.TimeoutError):
+                    return
+                self._release()
+                raise
+            self._forget(user_id, waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise AdmissionRejected(
+                    "Tiempo de espera agotado en la cola",
+                    status_code=503,
+                    retry_after=self.retry_after(),
+                ) from None
+            raise
+
+    def _release(self):
+        # La plaza pasa directamente al siguiente usuario en turno
+        while self._queues:
+            user_id, user_queue = next(iter(self._queues.items()))
+            waiter = user_queue.popleft()
+            self.queued -= 1
+            if user_queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _forget(self, user_id: str, waiter: asyncio.Future):
+        user_queue = self._queues.get(user_id)
+        if user_queue is None or waiter not in user_queue:
+            return
+        user_queue.remove(waiter)
+        self.queued -= 1
+        if not user_queue:
+            del self._queues[user_id]
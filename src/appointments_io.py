@@ -0,0 +1,181 @@
+# src/appointments_io.py
+import codecs
+import csv
+import io
+import logging
+from datetime import timedelta
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from pydantic import ValidationError
+from sqlmodel import Session, select
+
+from src.models import Appointment
+from src.schemas import AppointmentCreate, AppointmentResponse
+from src.serialization import loads
+from src.slot_index import SLOT_MINUTES, normalize_datetime, slot_index, slot_of
+
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("ndjson", "csv")
+CSV_FIELDS = ["id", "name", "email", "phone", "date", "description", "created_at", "updated_at"]
+# Filas leídas del cursor del servidor en cada viaje
+EXPORT_FETCH_SIZE = 500
+
+Record = Tuple[int, Union[Dict[str, Optional[str]], str]]
+
+
+def iter_export(session: Session, fmt: str) -> Iterator[str]:
+    """Volcar todas las citas, en orden de fecha, como NDJSON o CSV.
+
+    Usa un cursor del lado del servidor (``yield_per``), así que la memoria no
+    crece con el tamaño de la tabla.
+    """
+    statement = (
+        select(Appointment)
+        .order_by(Appointment.date.asc(), Appointment.id.asc())
+        .execution_options(yield_per=EXPORT_FETCH_SIZE)
+    )
+    rows = session.exec(statement)
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for appointment in rows:
+            writer.writerow(AppointmentResponse.model_validate(appointment).model_dump(mode="json"))
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+        return
+
+    for appointment in rows:
+        yield AppointmentResponse.model_validate(appointment).model_dump_json() + "\n"
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Partir un cuerpo recibido en fragmentos en líneas de texto UTF-8."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Record]:
+    """Registros ``(línea, datos)`` de un cuerpo NDJSON o CSV.
+
+    Si una línea no se puede interpretar, en lugar de los datos se devuelve el
+    mensaje de error. En CSV la primera línea es la cabecera y cada registro debe
+    ocupar una sola línea.
+    """
+    header: Optional[List[str]] = None
+    line_no = 0
+    async for line in iter_lines(chunks):
+        line_no += 1
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [h.strip() for h in values]
+                continue
+            if len(values) != len(header):
+                yield line_no, f"Se esperaban {len(header)} columnas y hay {len(values)}"
+                continue
+            yield line_no, {k: (v if v != "" else None) for k, v in zip(header, values)}
+        else:
+            try:
+                data = loads(line)
+            except ValueError as e:
+                yield line_no, f"JSON inválido: {e}"
+                continue
+            if not isinstance(data, dict):
+                yield line_no, "Cada línea debe ser un objeto JSON"
+                continue
+            yield line_no, data
+
+
+def parse_record(data: Dict[str, Optional[str]]) -> AppointmentCreate:
+    """Validar un registro importado con el esquema de creación de citas"""
+    return AppointmentCreate.model_validate(data)
+
+
+def format_validation_error(error: ValidationError) -> str:
+    """Resumen legible de un error de validación de pydantic"""
+    return "; ".join(
+        f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}" for err in error.errors()
+    )
+
+
+def _occupied_slots(session: Session, batch: List[Tuple[int, AppointmentCreate]]) -> Set[tuple]:
+    """Franjas ya ocupadas que afectan al lote, con una sola consulta."""
+    if slot_index.loaded:
+        return {slot_of(item.date) for _, item in batch if slot_index.is_taken(item.date)}
+
+    dates = [normalize_datetime(item.date) for _, item in batch]
+    first, last = min(dates), max(dates)
+    booked = session.exec(
+        select(Appointment.date)
+        .where(Appointment.date >= first - timedelta(minutes=SLOT_MINUTES))
+        .where(Appointment.date <= last + timedelta(minutes=SLOT_MINUTES))
+    ).all()
+    wanted = {slot_of(dt) for dt in dates}
+    return {key for key in map(slot_of, booked) if key in wanted}
+
+
+def import_batch(
+    session: Session,
+    batch: List[Tuple[int, AppointmentCreate]],
+) -> Tuple[int, List[Dict[str, object]]]:
+    """Insertar un lote de citas en una sola transacción.
+
+    Los conflictos de franja se detectan para todo el lote a la vez (contra las
+    citas existentes y entre las propias filas del lote) y esas filas se
+    rechazan con su número de línea.
+
+    Returns:
+        Número de citas insertadas y lista de errores por fila.
+    """
+    if not batch:
+        return 0, []
+
+    occupied = _occupied_slots(session, batch)
+    errors: List[Dict[str, object]] = []
+    accepted: List[Tuple[int, Appointment]] = []
+    for line_no, item in batch:
+        key = slot_of(item.date)
+        if key in occupied:
+            errors.append({"line": line_no, "error": "El horario ya está ocupado"})
+            continue
+        occupied.add(key)
+        accepted.append((line_no, Appointment(**item.model_dump())))
+
+    if not accepted:
+        return 0, errors
+
+    try:
+        session.add_all([appointment for _, appointment in accepted])
+        session.flush()
+        snapshots = [Appointment(**appointment.model_dump()) for _, appointment in accepted]
+        session.commit()
+    except Exception as e:  # noqa: BLE001
+        session.rollback()
+        logger.exception("Error importando un lote de %s citas", len(accepted))
+        errors.extend(
+            {"line": line_no, "error": f"Error al guardar el lote: {str(e)}"}
+            for line_no, _ in accepted
+        )
+        errors.sort(key=lambda err: err["line"])
+        return 0, errors
+
+    for snapshot in snapshots:
+        slot_index.add(snapshot)
+    return len(snapshots), errors
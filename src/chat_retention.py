@@ -0,0 +1,150 @@
+# src/chat_retention.py
+import asyncio
+import json
+import logging
+import zlib
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from src.config import CHAT_RETENTION_BATCH_SIZE, CHAT_RETENTION_DAYS, CHAT_RETENTION_INTERVAL
+from src.database import engine, run_db
+from src.models import ChatArchive, ChatMessage
+
+
+logger = logging.getLogger(__name__)
+
+# Nivel de zlib: el archivado va en segundo plano, se prima el tamaño
+ZLIB_LEVEL = 9
+
+
+def pack_turns(messages: List[ChatMessage]) -> bytes:
+    """Turnos como JSON comprimido con zlib"""
+    rows = [
+        {
+            "id": m.id,
+            "user_message": m.user_message,
+            "bot_response": m.bot_response,
+            "created_at": m.created_at.isoformat(),
+        }
+        for m in messages
+    ]
+    return zlib.compress(json.dumps(rows, ensure_ascii=False).encode("utf-8"), ZLIB_LEVEL)
+
+
+def unpack_turns(payload: bytes) -> List[Dict[str, Any]]:
+    """Inversa de ``pack_turns``"""
+    return json.loads(zlib.decompress(payload))
+
+
+def archive_batch(cutoff: datetime, batch_size: int) -> int:
+    """Mover a ``ChatArchive`` hasta ``batch_size`` turnos anteriores a ``cutoff``.
+
+    Los turnos se recorren por ID (los más antiguos están al principio de la
+    clave primaria, así que no hace falta un índice por fecha) y se guardan
+    agrupados por usuario. Alta en el archivo y borrado van en la misma
+    transacción.
+
+    Returns:
+        Número de turnos archivados.
+    """
+    with Session(engine) as session:
+        messages = session.exec(
+            select(ChatMessage)
+            .where(ChatMessage.created_at < cutoff)
+            .order_by(ChatMessage.id)
+            .limit(batch_size)
+        ).all()
+        if not messages:
+            return 0
+
+        ordered = sorted(messages, key=lambda m: (m.user_id or "", m.created_at, m.id))
+        for user_id, group in groupby(ordered, key=lambda m: m.user_id):
+            group = list(group)
+            session.add(ChatArchive(
+                user_id=user_id,
+                first_created_at=group[0].created_at,
+                last_created_at=group[-1].created_at,
+                turns=len(group),
+                payload=pack_turns(group),
+            ))
+        session.execute(delete(ChatMessage).where(ChatMessage.id.in_([m.id for m in messages])))
+        session.commit()
+        return len(messages)
+
+
+class ChatRetention:
+    """Archivado periódico de los turnos con más de ``max_age_days`` días.
+
+    Cada pasada mueve los turnos antiguos a ``ChatArchive`` en lotes de
+    ``batch_size``, cada uno en su propia transacción, para no retener la
+    tabla mientras dura. Con ``max_age_days`` a 0 no hace nada.
+    """
+
+    def __init__(
+        self,
+        max_age_days: float = CHAT_RETENTION_DAYS,
+        batch_size: int = CHAT_RETENTION_BATCH_SIZE,
+        interval: float = CHAT_RETENTION_INTERVAL,
+    ):
+        self.max_age_days = max_age_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.archived = 0
+        self.last_run: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age_days > 0
+
+    async def run_once(self, now: Optional[datetime] = None) -> int:
+        """Archivar todo lo anterior al límite de antigüedad; devuelve cuántos turnos"""
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.max_age_days)
+        total = 0
+        while True:
+            archived = await run_db(archive_batch, cutoff, self.batch_size)
+            total += archived
+            if archived < self.batch_size:
+                break
+        self.archived += total
+        self.last_run = datetime.utcnow().isoformat(timespec="seconds")
+        if total:
+            logger.info("Archivados %s turnos anteriores a %s", total, cutoff)
+        return total
+
+    def start(self):
+        """Lanzar el archivado periódico en segundo plano"""
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:  # noqa: BLE001
+                logger.exception("Error archivando el historial de chat")
+            await asyncio.sleep(self.interval)
+
+    def status(self) -> Dict[str, Any]:
+        """Estado del archivado, para /health"""
+        return {
+            "enabled": self.enabled,
+            "max_age_days": self.max_age_days,
+            "archived": self.archived,
+            "last_run": self.last_run,
+        }
+
+
+# Instancia global del archivado
+chat_retention = ChatRetention()
@@ -0,0 +1,302 @@
+# src/chat_writer.py
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.exc import IntegrityError
+
+from src.config import (
+    CHAT_WRITE_BATCH_SIZE,
+    CHAT_WRITE_BEHIND,
+    CHAT_WRITE_FLUSH_INTERVAL,
+    CHAT_WRITE_ID_BLOCK,
+    CHAT_WRITE_MAX_PENDING,
+    CHAT_WRITE_MAX_RETRIES,
+)
+from src.database import engine, run_db
+from src.models import ChatMessage
+
+
+logger = logging.getLogger(__name__)
+
+
+class IdAllocator:
+    """IDs de ``ChatMessage`` asignados antes de insertar la fila.
+
+    - Postgres: reserva ``block_size`` valores de la secuencia de la tabla en
+      una sola consulta, así que es seguro con varios procesos.
+    - Otros (SQLite): parte del ``max(id)`` actual y cuenta en memoria; supone
+      que un único proceso escribe el historial, como en el despliegue local.
+    """
+
+    def __init__(self, block_size: int = CHAT_WRITE_ID_BLOCK):
+        self.block_size = block_size
+        self._ids: Deque[int] = deque()
+        self._next: Optional[int] = None
+        # Último ID entregado: tras ``reset`` no se repite uno aún en cola
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def ready(self) -> bool:
+        """Indica si ``next_id`` puede responder sin consultar la BdD"""
+        return self._next is not None or bool(self._ids)
+
+    def next_id(self) -> int:
+        with self._lock:
+            if not self.ready():
+                self._reserve()
+            if self._next is not None:
+                value, self._next = self._next, self._next + 1
+            else:
+                value = self._ids.popleft()
+            self._last = value
+            return value
+
+    def reset(self):
+        """Olvidar los IDs reservados; el siguiente se vuelve a pedir a la BdD"""
+        with self._lock:
+            self._ids.clear()
+            self._next = None
+
+    def _reserve(self):
+        with engine.connect() as conn:
+            if engine.dialect.name == "postgresql":
+                self._ids.extend(conn.scalars(
+                    text("SELECT nextval(pg_get_serial_sequence('chatmessage', 'id')) FROM generate_series(1, :n)"),
+                    {"n": self.block_size},
+                ))
+            else:
+                self._next = max(conn.scalar(select(func.max(ChatMessage.id))) or 0, self._last) + 1
+
+
+def merge_pending(rows: List[ChatMessage], queued: List[ChatMessage]) -> List[ChatMessage]:
+    """Turnos leídos de la tabla más los que siguen en cola, sin duplicados y en orden"""
+    seen = {row.id for row in rows}
+    merged = list(rows) + [message for message in queued if message.id not in seen]
+    return sorted(merged, key=lambda m: (m.created_at, m.id))
+
+
+class ChatMessageWriter:
+    """Escritura diferida (write-behind) de los turnos de chat.
+
+    ``submit`` asigna el ID del turno y lo deja en cola sin esperar al commit;
+    una tarea en segundo plano guarda la cola en lotes cada ``flush_interval``
+    segundos o en cuanto hay ``batch_size`` turnos. Si la cola llega a
+    ``max_pending`` (la BdD no da abasto), ``submit`` guarda el turno en la
+    propia petición y los errores llegan al llamante.
+
+    Si un lote falla, sus turnos se guardan de uno en uno: los que la BdD
+    rechaza (p. ej. un ID repetido) se descartan y se cuentan en ``dropped``;
+    los que fallan por un error transitorio vuelven a la cola hasta
+    ``max_retries`` veces.
+
+    Mientras un turno no está guardado, ``pending`` lo devuelve para que las
+    lecturas del historial lo incluyan (ver ``merge_pending``). ``stop`` vacía
+    la cola al apagar.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = CHAT_WRITE_BEHIND,
+        batch_size: int = CHAT_WRITE_BATCH_SIZE,
+        flush_interval: float = CHAT_WRITE_FLUSH_INTERVAL,
+        max_pending: int = CHAT_WRITE_MAX_PENDING,
+        max_retries: int = CHAT_WRITE_MAX_RETRIES,
+        ids: Optional[IdAllocator] = None,
+    ):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.ids = ids or IdAllocator()
+        # Cola y lote en curso; se leen también desde los hilos de la BdD
+        self._pending: List[ChatMessage] = []
+        self._inflight: List[ChatMessage] = []
+        # Intentos fallidos de los turnos que han vuelto a la cola, por ID
+        self._attempts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.written = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.dropped = 0
+        self.sync_writes = 0
+
+    async def submit(self, user_id: str, user_message: str, bot_response: str) -> int:
+        """Encolar un turno y devolver su ``message_id``"""
+        message_id = self.ids.next_id() if self.ids.ready() else await run_db(self.ids.next_id)
+        message = ChatMessage(
+            id=message_id,
+            user_id=user_id,
+            user_message=user_message,
+            bot_response=bot_response,
+        )
+        with self._lock:
+            backlog = len(self._pending) + len(self._inflight)
+            if backlog < self.max_pending:
+                self._pending.append(message)
+        self.start()
+        if backlog >= self.max_pending:
+            # Contrapresión: el turno no entra en la cola, se guarda ya
+            await run_db(self._write, [message])
+            self.written += 1
+            self.sync_writes += 1
+        elif backlog + 1 >= self.batch_size:
+            self._wake.set()
+        return message_id
+
+    def pending(self, user_id: str) -> List[ChatMessage]:
+        """Turnos de ``user_id`` aún sin guardar, en orden de llegada"""
+        with self._lock:
+            return [m for m in self._inflight + self._pending if m.user_id == user_id]
+
+    async def flush(self) -> int:
+        """Guardar ya toda la cola; devuelve el número de turnos escritos"""
+        self._bind_loop()
+        async with self._flush_lock:
+            return await self._flush()
+
+    async def _flush(self) -> int:
+        with self._lock:
+            batch, self._pending = self._pending, []
+            self._inflight = batch
+        if not batch:
+            return 0
+        retry: List[ChatMessage] = []
+        try:
+            await run_db(self._write, batch)
+            written = len(batch)
+        except Exception:  # noqa: BLE001
+            self.failed_batches += 1
+            logger.warning(
+                "Error guardando un lote de %s turnos; se guardan de uno en uno", len(batch), exc_info=True
+            )
+            written, rejected, failed = await run_db(self._write_each, batch)
+            if rejected:
+                # Un ID repetido indica que los reservados ya no son fiables
+                self.ids.reset()
+            for message, error in rejected:
+                self._drop(message, error)
+            retry = self._retryable(failed)
+        if self._attempts:
+            retry_ids = {message.id for message in retry}
+            for message in batch:
+                if message.id not in retry_ids:
+                    self._attempts.pop(message.id, None)
+        with self._lock:
+            self._pending[:0] = retry
+            self._inflight = []
+        self.written += written
+        if written:
+            self.batches += 1
+        return written
+
+    def _retryable(self, failed: List[Tuple[ChatMessage, Exception]]) -> List[ChatMessage]:
+        """Turnos que vuelven a la cola; los que agotan sus intentos se descartan"""
+        retry = []
+        for message, error in failed:
+            attempts = self._attempts.get(message.id, 0) + 1
+            if attempts >= self.max_retries:
+                self._drop(message, error)
+            else:
+                self._attempts[message.id] = attempts
+                retry.append(message)
+        return retry
+
+    def _drop(self, message: ChatMessage, error: Exception):
+        self.dropped += 1
+        self._attempts.pop(message.id, None)
+        logger.error(
+            "Turno %s de %s descartado sin guardar: %s", message.id, message.user_id, error
+        )
+
+    def start(self):
+        """Lanzar la tarea de escritura en el event loop actual (si no lo está ya)"""
+        self._bind_loop()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> int:
+        """Detener la tarea y guardar lo que quede en cola (apagado)"""
+        self._bind_loop()
+        async with self._flush_lock:
+            # Con el lock tomado la tarea no está a mitad de un commit
+            if self._task is not None:
+                self._task.cancel()
+                await asyncio.gather(self._task, return_exceptions=True)
+                self._task = None
+            # Cada pasada guarda o descarta turnos, o gasta uno de sus intentos
+            written = await self._flush()
+            while self._pending:
+                written += await self._flush()
+            return written
+
+    def _bind_loop(self):
+        # Event, Lock y tarea pertenecen a un event loop; si cambia, se recrean
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._wake = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    @staticmethod
+    def _write(batch: List[ChatMessage]):
+        with engine.begin() as conn:
+            conn.execute(insert(ChatMessage.__table__), [message.model_dump() for message in batch])
+
+    @staticmethod
+    def _write_each(
+        batch: List[ChatMessage],
+    ) -> Tuple[int, List[Tuple[ChatMessage, Exception]], List[Tuple[ChatMessage, Exception]]]:
+        """Guardar los turnos de uno en uno.
+
+        Returns:
+            Turnos guardados, turnos rechazados por la BdD (no tiene sentido
+            reintentarlos) y turnos que fallaron por otros motivos.
+        """
+        written = 0
+        rejected: List[Tuple[ChatMessage, Exception]] = []
+        failed: List[Tuple[ChatMessage, Exception]] = []
+        for message in batch:
+            try:
+                ChatMessageWriter._write([message])
+                written += 1
+            except IntegrityError as e:
+                rejected.append((message, e))
+            except Exception as e:  # noqa: BLE001
+                failed.append((message, e))
+        return written, rejected, failed
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            queued = len(self._pending) + len(self._inflight)
+        return {
+            "enabled": self.enabled,
+            "queued": queued,
+            "written": self.written,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "dropped": self.dropped,
+            "sync_writes": self.sync_writes,
+        }
+
+
+# Instancia global del escritor del historial
+chat_writer = ChatMessageWriter()
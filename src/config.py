@@ -9,6 +9,14 @@ load_dotenv(dotenv_path=BASE_DIR / ".env")
 # Ollama configuration
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
+# Varios backends separados por comas (por defecto solo OLLAMA_BASE_URL)
+OLLAMA_BASE_URLS = [
+    url.strip()
+    for url in os.getenv("OLLAMA_BASE_URLS", OLLAMA_BASE_URL).split(",")
+    if url.strip()
+]
+# Segundos que un backend caído queda fuera del pool (se duplica con cada fallo seguido)
+OLLAMA_NODE_COOLDOWN = float(os.getenv("OLLAMA_NODE_COOLDOWN", 30))
 
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app/db/database.db")
@@ -20,9 +28,111 @@ FASTAPI_PORT = int(os.getenv("FASTAPI_PORT", 8000))
 ## OLLAMA API CONFIG
 OLLAMA_ENDPOINT_GENERATE = "/api/generate"
 OLLAMA_ENDPOINT_CHAT = "/api/chat"
-# Historial reciente por usuario
-OLLAMA_MAX_TURNS = 8
+# Historial reciente por usuario: máximo de turnos que se cargan; de ellos entran
+# en el prompt los más recientes que quepan en HISTORY_TOKEN_BUDGET
+OLLAMA_MAX_TURNS = int(os.getenv("OLLAMA_MAX_TURNS", 32))
+# Presupuesto (tokens estimados) del historial en el prompt; los turnos que no
+# caben se resumen en segundo plano (ver src/conversation_context.py)
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 1024))
+# Longitud máxima (caracteres) del resumen persistido de cada conversación
+SUMMARY_MAX_CHARS = int(os.getenv("SUMMARY_MAX_CHARS", 1500))
+# Solo se pide un resumen cuando fuera del prompt se acumulan al menos estos
+# turnos sin resumir, o estos tokens estimados (lo que llegue antes)
+SUMMARY_MIN_PENDING_TURNS = int(os.getenv("SUMMARY_MIN_PENDING_TURNS", 4))
+SUMMARY_MIN_PENDING_TOKENS = int(os.getenv("SUMMARY_MIN_PENDING_TOKENS", 512))
 # Timeout for ollama service
 OLLAMA_BASE_TIMEOUT = 300.0
 #
-OLLAMA_MAX_ROUND_FOR_TOOL_CALL = 5
\ No newline at end of file
+OLLAMA_MAX_ROUND_FOR_TOOL_CALL = 5
+# Precarga del modelo al arrancar y keep-alive en horario de atención (ver src/warmup.py)
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "true").lower() in ("1", "true", "yes")
+# Tiempo que Ollama mantiene el modelo cargado tras cada petición ("" = valor del servidor)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# Segundos entre refrescos del keep-alive durante el horario de atención
+OLLAMA_KEEP_ALIVE_INTERVAL = float(os.getenv("OLLAMA_KEEP_ALIVE_INTERVAL", 600))
+# Control de admisión: turnos simultáneos contra Ollama y cola de espera
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", 4))
+OLLAMA_MAX_QUEUE = int(os.getenv("OLLAMA_MAX_QUEUE", 32))
+OLLAMA_MAX_QUEUE_PER_USER = int(os.getenv("OLLAMA_MAX_QUEUE_PER_USER", 2))
+OLLAMA_MAX_QUEUE_WAIT = float(os.getenv("OLLAMA_MAX_QUEUE_WAIT", 30))
+# Database executor
+# Hilos dedicados para ejecutar las consultas síncronas de SQLModel fuera del event loop
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", 8))
+
+# Perfil SQLite (ver src/database.py): modo de diario, sincronización y espera ante bloqueos
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+# Hilos con los que FastAPI ejecuta las rutas síncronas (límite por defecto de anyio)
+API_SYNC_ROUTE_THREADS = 40
+# Pool de conexiones. Solo retienen conexión los hilos que ejecutan consultas: los
+# del executor de BdD (DB_POOL_SIZE) y los de las rutas síncronas con sesión
+# (DB_MAX_OVERFLOW). Los turnos de chat devuelven la suya antes de esperar a
+# Ollama, así que la cola de admisión no cuenta.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", DB_EXECUTOR_WORKERS))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", API_SYNC_ROUTE_THREADS))
+# Espera máxima (segundos) por una conexión libre del pool
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+# Perfil Postgres: reciclado de conexiones y límite de duración de cada sentencia
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 15000))
+
+# Horario de atención (para calcular franjas libres)
+WORKING_HOURS_START = os.getenv("WORKING_HOURS_START", "09:00")
+WORKING_HOURS_END = os.getenv("WORKING_HOURS_END", "18:00")
+# Días laborables, 0=lunes ... 6=domingo
+WORKING_DAYS = os.getenv("WORKING_DAYS", "0,1,2,3,4")
+# Número de franjas libres devueltas por defecto y horizonte máximo de búsqueda
+FREE_SLOTS_DEFAULT_LIMIT = 5
+FREE_SLOTS_MAX_DAYS = 60
+
+# Caché en memoria del historial reciente por usuario
+HISTORY_CACHE_MAX_USERS = int(os.getenv("HISTORY_CACHE_MAX_USERS", 1000))
+HISTORY_CACHE_TTL_SECONDS = float(os.getenv("HISTORY_CACHE_TTL_SECONDS", 300))
+
+# Escritura diferida de los turnos de chat (ver src/chat_writer.py): la respuesta
+# no espera al commit; los turnos se guardan en lotes en segundo plano
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", 50))
+CHAT_WRITE_FLUSH_INTERVAL = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL", 0.2))
+# Turnos pendientes a partir de los cuales cada turno se guarda en la propia
+# petición, como sin escritura diferida (contrapresión)
+CHAT_WRITE_MAX_PENDING = int(os.getenv("CHAT_WRITE_MAX_PENDING", 1000))
+# Intentos de guardar un turno ante errores transitorios antes de descartarlo
+CHAT_WRITE_MAX_RETRIES = int(os.getenv("CHAT_WRITE_MAX_RETRIES", 20))
+# IDs reservados de una vez a la secuencia de Postgres
+CHAT_WRITE_ID_BLOCK = int(os.getenv("CHAT_WRITE_ID_BLOCK", 100))
+
+# Retención del historial (ver src/chat_retention.py): los turnos con más de
+# CHAT_RETENTION_DAYS días se archivan comprimidos en lotes; 0 = no archivar
+CHAT_RETENTION_DAYS = float(os.getenv("CHAT_RETENTION_DAYS", 0))
+CHAT_RETENTION_BATCH_SIZE = int(os.getenv("CHAT_RETENTION_BATCH_SIZE", 500))
+# Segundos entre pasadas del archivado
+CHAT_RETENTION_INTERVAL = float(os.getenv("CHAT_RETENTION_INTERVAL", 3600))
+
+# Caché de resultados de herramientas de solo lectura.
+# Siempre se memoiza dentro de un turno; con un TTL > 0 se comparte entre turnos del mismo usuario
+TOOL_CACHE_USER_TTL_SECONDS = float(os.getenv("TOOL_CACHE_USER_TTL_SECONDS", 0))
+
+# Caché de respuestas a primeros turnos (sin historial ni herramientas); TTL 0 la desactiva
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 500))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 600))
+
+# Intenciones que se resuelven sin el modelo (ver src/intent_router.py).
+# Disponibles: free_slots, list_appointments, cancel_appointment
+FAST_PATH_INTENTS = [
+    i.strip() for i in os.getenv("FAST_PATH_INTENTS", "free_slots,list_appointments").split(",") if i.strip()
+]
+
+# Logging (ver src/logging_config.py)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" (una línea JSON por registro) o "text"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Registrar cada sentencia SQL (antes estaba siempre activo con echo=True)
+LOG_SQL_ECHO = os.getenv("LOG_SQL_ECHO", "false").lower() in ("1", "true", "yes")
+# Registrar las peticiones y respuestas completas de Ollama
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "false").lower() in ("1", "true", "yes")
+# Longitud máxima de mensajes y campos registrados
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", 2000))
+# Muestreo por categoría (nombre de logger): "sqlalchemy.engine=0.1,src.tools=0.5"
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "sqlalchemy.engine=0.1")
@@ -0,0 +1,198 @@
+# src/conversation_context.py
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlmodel import Session
+
+from src.config import (
+    HISTORY_TOKEN_BUDGET,
+    SUMMARY_MAX_CHARS,
+    SUMMARY_MIN_PENDING_TOKENS,
+    SUMMARY_MIN_PENDING_TURNS,
+)
+from src.database import engine, run_db
+from src.models import ConversationSummary
+from src.ollama_service import ollama_service
+
+
+logger = logging.getLogger(__name__)
+
+Turn = Tuple[str, str]
+
+# Aproximación habitual para texto en español con tokenizadores BPE
+CHARS_PER_TOKEN = 4
+# Tokens extra por mensaje (rol y delimitadores de la plantilla de chat)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Estimación barata de los tokens de un mensaje"""
+    if not text:
+        return 0
+    return -(-len(text) // CHARS_PER_TOKEN) + MESSAGE_OVERHEAD_TOKENS
+
+
+def turn_tokens(turn: Turn) -> int:
+    return estimate_tokens(turn[0]) + estimate_tokens(turn[1])
+
+
+def _clip(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 1] + "…" if max_chars > 0 else ""
+
+
+def truncate_turn(turn: Turn, budget: int) -> Turn:
+    """Recortar un turno para que quepa (aproximadamente) en ``budget`` tokens.
+
+    El espacio se reparte a medias entre el mensaje y la respuesta; lo que uno
+    no necesita lo aprovecha el otro.
+    """
+    room = max(0, budget - 2 * MESSAGE_OVERHEAD_TOKENS) * CHARS_PER_TOKEN
+    user_message, bot_response = turn
+    user_message = _clip(user_message, max(room // 2, room - len(bot_response)))
+    return user_message, _clip(bot_response, room - len(user_message))
+
+
+def fit_history(history: List[Turn], budget: int = HISTORY_TOKEN_BUDGET) -> Tuple[List[Turn], List[Turn]]:
+    """Repartir el historial entre lo que cabe en ``budget`` y lo que sobra.
+
+    Se conservan los turnos más recientes que quepan enteros. El último turno
+    se envía siempre: si él solo no cabe, recortado con ``truncate_turn``.
+
+    Returns:
+        Turnos que entran en el prompt y turnos anteriores que quedan fuera,
+        ambos en orden cronológico.
+    """
+    used = 0
+    cut = len(history)
+    while cut > 0:
+        cost = turn_tokens(history[cut - 1])
+        if used + cost > budget:
+            break
+        used += cost
+        cut -= 1
+    if history and cut == len(history):
+        # Mejor el último intercambio recortado que un prompt sin historial
+        return [truncate_turn(history[-1], budget)], history[:-1]
+    return history[cut:], history[:cut]
+
+
+def turn_digest(turn: Turn) -> str:
+    """Huella de un turno, para saber hasta dónde llega un resumen"""
+    return hashlib.sha256("\x00".join(turn).encode("utf-8")).hexdigest()[:16]
+
+
+def pending_turns(summary: Optional[ConversationSummary], dropped: List[Turn]) -> List[Turn]:
+    """Turnos fuera del prompt que todavía no están en el resumen."""
+    if summary is None:
+        return dropped
+    digests = [turn_digest(turn) for turn in dropped]
+    if summary.last_turn_digest in digests:
+        # El último turno resumido puede aparecer repetido: usar la última vez
+        last = len(digests) - 1 - digests[::-1].index(summary.last_turn_digest)
+        return dropped[last + 1:]
+    # El resumen cubre turnos anteriores a los cargados
+    return dropped
+
+
+def load_summary(session: Session, user_id: str) -> Optional[ConversationSummary]:
+    return session.get(ConversationSummary, user_id)
+
+
+def save_summary(user_id: str, summary: str, last_turn: Turn):
+    """Guardar (o reemplazar) el resumen de una conversación"""
+    with Session(engine) as session:
+        row = session.get(ConversationSummary, user_id)
+        if row is None:
+            row = ConversationSummary(user_id=user_id, summary=summary, last_turn_digest="")
+        row.summary = summary[:SUMMARY_MAX_CHARS]
+        row.last_turn_digest = turn_digest(last_turn)
+        row.updated_at = datetime.utcnow()
+        session.add(row)
+        session.commit()
+
+
+Summarize = Callable[[Optional[str], List[Turn], str], Awaitable[Optional[str]]]
+
+
+class ConversationSummarizer:
+    """Resume en segundo plano los turnos que ya no caben en el prompt.
+
+    ``schedule`` no bloquea la petición: lanza una tarea que pide el resumen al
+    modelo (``summarize``) y lo persiste. Como mucho hay una tarea en curso por
+    usuario; lo que quede pendiente se recoge en el siguiente turno.
+
+    Para no gastar una llamada al modelo por cada turno que sale del prompt, se
+    espera a tener ``min_turns`` turnos pendientes o ``min_tokens`` tokens
+    estimados.
+    """
+
+    def __init__(
+        self,
+        summarize: Summarize,
+        min_turns: int = SUMMARY_MIN_PENDING_TURNS,
+        min_tokens: int = SUMMARY_MIN_PENDING_TOKENS,
+    ):
+        self.summarize = summarize
+        self.min_turns = min_turns
+        self.min_tokens = min_tokens
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.completed = 0
+        self.failed = 0
+        self.deferred = 0
+
+    def due(self, turns: List[Turn]) -> bool:
+        """Si hay bastante pendiente como para pedir un resumen"""
+        if not turns:
+            return False
+        return len(turns) >= self.min_turns or sum(turn_tokens(t) for t in turns) >= self.min_tokens
+
+    def schedule(self, user_id: str, previous: Optional[str], turns: List[Turn]) -> bool:
+        """Resumir ``turns`` (sobre el resumen ``previous``) si hay bastante y no hay ya una tarea"""
+        if user_id in self._running:
+            return False
+        if not self.due(turns):
+            if turns:
+                self.deferred += 1
+            return False
+        self._running.add(user_id)
+        task = asyncio.create_task(self._run(user_id, previous, list(turns)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _run(self, user_id: str, previous: Optional[str], turns: List[Turn]):
+        try:
+            summary = await self.summarize(previous, turns, user_id)
+            if summary:
+                await run_db(save_summary, user_id, summary, turns[-1])
+                self.completed += 1
+            else:
+                self.failed += 1
+        except Exception:  # noqa: BLE001
+            self.failed += 1
+            logger.exception("Error resumiendo la conversación %s", user_id)
+        finally:
+            self._running.discard(user_id)
+
+    async def drain(self):
+        """Esperar a las tareas en curso (apagado y tests)"""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "running": len(self._running),
+            "completed": self.completed,
+            "failed": self.failed,
+            "deferred": self.deferred,
+        }
+
+
+# Instancia global del resumidor
+conversation_summarizer = ConversationSummarizer(ollama_service.summarize)
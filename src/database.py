@@ -1,14 +1,106 @@
 # src/database.py
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
 from sqlmodel import create_engine, SQLModel, Session
-from src.config import DATABASE_URL
+from src.config import (
+    DATABASE_URL,
+    DB_EXECUTOR_WORKERS,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_TIMEOUT_MS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_SYNCHRONOUS,
+)
+
+T = TypeVar("T")
+
+
+def build_engine(url: str = DATABASE_URL) -> Engine:
+    """Crear el engine con el perfil adecuado a la base de datos de ``url``.
+
+    - SQLite: diario WAL (las lecturas no bloquean la escritura), ``synchronous``
+      ajustable y ``busy_timeout`` para esperar al escritor en lugar de fallar
+      con "database is locked".
+    - Postgres: ``pool_pre_ping`` para descartar conexiones caídas, reciclado
+      periódico y ``statement_timeout``.
+
+    En ambos (salvo SQLite en memoria) el pool tiene ``DB_POOL_SIZE``
+    conexiones, una por hilo del executor de BdD, más ``DB_MAX_OVERFLOW`` para
+    los hilos de las rutas síncronas.
+
+    El SQL se registra por logging según LOG_SQL_ECHO (ver
+    src/logging_config.py), no con ``echo``.
+    """
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        memory = _is_memory_sqlite(url)
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            # En memoria no hay fichero compartido: se mantiene el pool por defecto
+            **({} if memory else {
+                "pool_size": DB_POOL_SIZE,
+                "max_overflow": DB_MAX_OVERFLOW,
+                "pool_timeout": DB_POOL_TIMEOUT,
+            }),
+        )
+
+        @event.listens_for(engine, "connect")
+        def _sqlite_pragmas(dbapi_connection, _record):
+            cursor = dbapi_connection.cursor()
+            if not memory:
+                cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.close()
+
+        return engine
+
+    if backend == "postgresql":
+        return create_engine(
+            url,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+            connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"},
+        )
+
+    return create_engine(url)
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:" or "mode=memory" in url
+
 
 # Crear el motor de base de datos
-engine = create_engine(DATABASE_URL, echo=True)
+engine = build_engine()
+
+# Pool de hilos dedicado a la base de datos: las rutas async y las herramientas
+# del modelo ejecutan aquí sus consultas síncronas para no bloquear el event loop
+db_executor = ThreadPoolExecutor(
+    max_workers=DB_EXECUTOR_WORKERS,
+    thread_name_prefix="db",
+)
 
 
 def init_db():
-    """Inicializar la base de datos creando las tablas"""
+    """Inicializar la base de datos creando las tablas y aplicando las migraciones"""
+    from src.migrations import run_migrations
+
     SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
 
 
 def get_session():
@@ -16,3 +108,20 @@ def get_session():
     with Session(engine) as session:
         yield session
 
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Ejecutar una función de acceso a datos en el executor de base de datos.
+
+    Args:
+        fn: Función síncrona que usa una ``Session`` (o el ``engine``).
+        *args: Argumentos posicionales para ``fn``.
+        **kwargs: Argumentos con nombre para ``fn``.
+
+    Returns:
+        El valor devuelto por ``fn``.
+    """
+    loop = asyncio.get_running_loop()
+    # Copiar el contexto (p. ej. los spans de la petición) al hilo de la BdD
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(db_executor, partial(ctx.run, fn, *args, **kwargs))
+
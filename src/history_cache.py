@@ -0,0 +1,101 @@
+# src/history_cache.py
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from src.config import HISTORY_CACHE_MAX_USERS, HISTORY_CACHE_TTL_SECONDS, OLLAMA_MAX_TURNS
+
+Turn = Tuple[str, str]
+
+
+class HistoryCache:
+    """Caché LRU/TTL de los últimos turnos de conversación por usuario.
+
+    Guarda, por ``user_id``, los últimos ``max_turns`` pares
+    ``(user_message, bot_response)`` en orden cronológico. Se rellena al leer de
+    la base de datos (``put``) y se mantiene al escribir cada turno (``append``),
+    de modo que el turno siguiente de la misma conversación no consulta la tabla
+    ``ChatMessage``. Una entrada caduca ``ttl_seconds`` después de su última
+    escritura, por si otro proceso escribió en la misma conversación.
+    """
+
+    def __init__(
+        self,
+        max_users: int = HISTORY_CACHE_MAX_USERS,
+        ttl_seconds: float = HISTORY_CACHE_TTL_SECONDS,
+        max_turns: int = OLLAMA_MAX_TURNS,
+    ):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self._entries: "OrderedDict[str, Tuple[float, Deque[Turn]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id: str) -> Optional[List[Turn]]:
+        """Historial en orden cronológico, o ``None`` si no está en caché."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, user_id: str, turns: List[Turn]):
+        """Guardar el historial completo leído de la base de datos"""
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), deque(turns, maxlen=self.max_turns))
+            self._entries.move_to_end(user_id)
+            self._evict()
+
+    def append(self, user_id: str, user_message: str, bot_response: str):
+        """Añadir un turno recién guardado.
+
+        Solo actualiza conversaciones ya cacheadas: si no hay entrada, la
+        siguiente lectura irá a la base de datos y traerá el historial completo.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            turns = entry[1]
+            turns.append((user_message, bot_response))
+            self._entries[user_id] = (time.monotonic(), turns)
+            self._entries.move_to_end(user_id)
+
+    def invalidate(self, user_id: str):
+        """Descartar el historial cacheado de un usuario"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        """Vaciar la caché y reiniciar los contadores"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de uso de la caché"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _evict(self):
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+# Instancia global de la caché
+history_cache = HistoryCache()
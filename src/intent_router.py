@@ -0,0 +1,176 @@
+# src/intent_router.py
+import logging
+import re
+import threading
+import unicodedata
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Collection, Dict, List, Optional, Pattern, Tuple
+
+from src import tools as local_tools
+from src.config import FAST_PATH_INTENTS
+from src.slot_index import SLOTS_PER_DAY
+
+
+logger = logging.getLogger(__name__)
+
+# Un handler recibe el match de su patrón y devuelve la respuesta, o None para
+# dejar que conteste el modelo
+IntentHandler = Callable[[re.Match], Optional[str]]
+
+# Mensajes más largos que esto siempre van al modelo
+MAX_ROUTED_LENGTH = 120
+
+_DAY = r"(?P<day>hoy|manana|pasado manana|(?:el )?\d{4}-\d{2}-\d{2})"
+
+
+def normalize_message(message: str) -> str:
+    """Minúsculas, sin acentos ni signos de puntuación y con espacios simples."""
+    text = unicodedata.normalize("NFKD", message.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[¿?¡!.,;:]", " ", text)
+    return " ".join(text.split())
+
+
+def parse_day(value: str, today: date) -> Optional[date]:
+    """Día de expresiones como 'hoy', 'mañana' o '2025-01-31'."""
+    value = value.removeprefix("el ")
+    if value == "hoy":
+        return today
+    if value == "manana":
+        return today + timedelta(days=1)
+    if value == "pasado manana":
+        return today + timedelta(days=2)
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+class IntentRouter:
+    """Atajo determinista para intenciones sencillas, sin pasar por Ollama.
+
+    Cada intención tiene uno o varios patrones que deben cubrir el mensaje
+    normalizado entero: si no encaja ninguno (o el handler devuelve None) no hay
+    confianza suficiente y el mensaje va al modelo como siempre.
+
+    Solo se atienden las intenciones de ``enabled``; ``stats`` cuenta qué parte
+    del tráfico se ha resuelto por esta vía.
+    """
+
+    def __init__(self, enabled: Collection[str]):
+        self.enabled = set(enabled)
+        self._rules: List[Tuple[str, Pattern[str], IntentHandler]] = []
+        self._lock = threading.Lock()
+        self.total = 0
+        self.routed: Dict[str, int] = {}
+
+    def register(self, intent: str, patterns: List[str], handler: IntentHandler):
+        """Añadir una intención con sus patrones (expresiones regulares)"""
+        for pattern in patterns:
+            self._rules.append((intent, re.compile(pattern), handler))
+
+    def route(self, message: str) -> Optional[str]:
+        """Respuesta directa para ``message`` o None si debe contestar el modelo.
+
+        Los handlers llaman a las herramientas de ``src.tools`` (acceso síncrono
+        a la BdD): ejecutar con ``run_db``.
+        """
+        with self._lock:
+            self.total += 1
+        if len(message) > MAX_ROUTED_LENGTH:
+            return None
+
+        text = normalize_message(message)
+        for intent, pattern, handler in self._rules:
+            if intent not in self.enabled:
+                continue
+            match = pattern.fullmatch(text)
+            if match is None:
+                continue
+            response = handler(match)
+            if response is None:
+                return None
+            logger.info("Mensaje resuelto sin modelo (intención %s)", intent)
+            with self._lock:
+                self.routed[intent] = self.routed.get(intent, 0) + 1
+            return response
+        return None
+
+    def stats(self) -> Dict[str, object]:
+        """Mensajes atendidos y fracción resuelta sin modelo, para /health"""
+        with self._lock:
+            routed = sum(self.routed.values())
+            return {
+                "enabled": sorted(self.enabled),
+                "messages": self.total,
+                "routed": routed,
+                "routed_fraction": round(routed / self.total, 4) if self.total else 0.0,
+                "by_intent": dict(self.routed),
+            }
+
+
+# -------------------------
+# Intenciones por defecto
+# -------------------------
+def _free_slots(match: re.Match) -> Optional[str]:
+    now = datetime.utcnow()
+    day = parse_day(match.group("day"), now.date())
+    if day is None:
+        return None
+    start = max(now, datetime.combine(day, time()))
+    end = datetime.combine(day + timedelta(days=1), time())
+    if end <= start:
+        return None
+    slots = local_tools.find_free_slots(start=start, end=end, limit=SLOTS_PER_DAY)
+    label = match.group("day").removeprefix("el ").replace("manana", "mañana")
+    if not slots:
+        return f"No quedan horarios libres para {label} ({day.isoformat()})."
+    hours = ", ".join(datetime.fromisoformat(s).strftime("%H:%M") for s in slots)
+    return f"Horarios libres para {label} ({day.isoformat()}): {hours}. ¿Quieres reservar alguno?"
+
+
+def _list_appointments(match: re.Match) -> Optional[str]:
+    appointments = local_tools.get_appointment_lists(limit=10)
+    if not appointments:
+        return "No hay citas próximas agendadas."
+    lines = [
+        f"- #{a.id} {a.date.strftime('%Y-%m-%d %H:%M')} {a.name} ({a.description or 'sin motivo'})"
+        for a in appointments
+    ]
+    return "Próximas citas:\n" + "\n".join(lines)
+
+
+def _cancel_appointment(match: re.Match) -> Optional[str]:
+    appointment_id = int(match.group("id"))
+    try:
+        local_tools.delete_appointment(appointment_id)
+    except LookupError:
+        return f"No existe ninguna cita con el número {appointment_id}."
+    return f"La cita {appointment_id} ha sido cancelada."
+
+
+# Instancia global del router
+intent_router = IntentRouter(FAST_PATH_INTENTS)
+intent_router.register(
+    "free_slots",
+    [
+        r"(?:hola )?(?:que|cuales) (?:horarios|huecos|horas)(?: libres| disponibles)? "
+        r"(?:hay|tienes|quedan)(?: libres| disponibles)?(?: para)? " + _DAY,
+        r"(?:horarios|huecos|horas) (?:libres|disponibles)(?: para)? " + _DAY,
+    ],
+    _free_slots,
+)
+# Solo con la frase de seguridad del MASTER_PROMPT se comparte o se toca la BdD
+intent_router.register(
+    "list_appointments",
+    [r"soy el archimago (?:lista|listame|muestra|muestrame|ensename|dame) (?:las |mis |todas las )?(?:proximas )?citas"],
+    _list_appointments,
+)
+intent_router.register(
+    "cancel_appointment",
+    [
+        r"soy el archimago (?:por favor )?(?:cancela|cancelar|anula|anular|elimina|eliminar) (?:la|mi) cita "
+        r"(?:numero |num |no |#|id )?(?P<id>\d+)(?: por favor)?",
+    ],
+    _cancel_appointment,
+)
@@ -0,0 +1,170 @@
+# src/logging_config.py
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from src.config import (
+    LOG_FORMAT,
+    LOG_LEVEL,
+    LOG_MAX_FIELD_CHARS,
+    LOG_SAMPLING,
+    LOG_SQL_ECHO,
+)
+
+# Atributos estándar de LogRecord; el resto son campos de ``extra=``
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[logging.Handler] = None
+
+
+def truncate(value: str, limit: int) -> str:
+    """Recortar textos largos indicando cuántos caracteres se han omitido"""
+    if limit <= 0 or len(value) <= limit:
+        return value
+    return f"{value[:limit]}…(+{len(value) - limit})"
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """``"sqlalchemy.engine=0.1,src.tools=0.5"`` -> ``{categoría: proporción}``"""
+    rates: Dict[str, float] = {}
+    for item in spec.split(","):
+        name, _, rate = item.partition("=")
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Dejar pasar solo una proporción de los registros de cada categoría.
+
+    La categoría es el nombre del logger (o su prefijo más largo configurado).
+    Los avisos y errores pasan siempre.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        # Prefijos más largos primero
+        self.rates = sorted(rates.items(), key=lambda item: -len(item[0]))
+
+    def rate_for(self, name: str) -> float:
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que no formatea en el hilo que registra.
+
+    El ``QueueHandler`` estándar construye el mensaje antes de encolarlo; aquí
+    solo se resuelve la traza de las excepciones y el mensaje se compone en el
+    hilo del ``QueueListener``. Los argumentos no deben modificarse después de
+    registrar el mensaje.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _extra_fields(record: logging.LogRecord, limit: int) -> Dict[str, object]:
+    """Campos pasados con ``extra=``, serializados y recortados"""
+    fields: Dict[str, object] = {}
+    for key, value in vars(record).items():
+        if key in _RESERVED or key.startswith("_"):
+            continue
+        if not isinstance(value, (int, float, bool)) and value is not None:
+            value = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+            value = truncate(value, limit)
+        fields[key] = value
+    return fields
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro, con los campos de ``extra=`` recortados"""
+
+    def __init__(self, max_field_chars: int = LOG_MAX_FIELD_CHARS):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": truncate(record.getMessage(), self.max_field_chars),
+        }
+        entry.update(_extra_fields(record, self.max_field_chars))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class TruncatingFormatter(logging.Formatter):
+    """Formato de texto legible, con el mensaje y los campos extra recortados"""
+
+    def __init__(self, max_field_chars: int = LOG_MAX_FIELD_CHARS):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        self.max_field_chars = max_field_chars
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        record.message = truncate(record.message, self.max_field_chars)
+        line = super().formatMessage(record)
+        extra = _extra_fields(record, self.max_field_chars)
+        if extra:
+            line += " " + " ".join(f"{k}={v}" for k, v in extra.items())
+        return line
+
+
+def setup_logging(stream=None) -> logging.handlers.QueueListener:
+    """Configurar el logging de la aplicación (idempotente).
+
+    Los registros se encolan sin bloquear (``LazyQueueHandler``) y un hilo
+    aparte (``QueueListener``) los formatea y escribe en ``stream``.
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return _listener
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TruncatingFormatter())
+
+    handler = _handler = LazyQueueHandler(queue.SimpleQueue())
+    handler.addFilter(SamplingFilter(parse_sampling(LOG_SAMPLING)))
+
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    # SQL solo si se pide; pasa por la misma cola y muestreo que el resto
+    logging.getLogger("sqlalchemy.engine").setLevel(logging.INFO if LOG_SQL_ECHO else logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """Vaciar la cola y detener el hilo de escritura"""
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
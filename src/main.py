@@ -1,27 +1,54 @@
 # src/main.py
 import logging
 
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import and_, func, or_
 from sqlmodel import Session, select
+import time
 from datetime import datetime
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple
 from uuid import uuid4
 
-from src.database import init_db, get_session
+from src.admission import AdmissionRejected
+from src.chat_retention import chat_retention
+from src.chat_writer import chat_writer, merge_pending
+from src.appointments_io import (
+    EXPORT_FORMATS, format_validation_error, import_batch, iter_export, iter_records, parse_record
+)
+from src.conversation_context import conversation_summarizer, fit_history, load_summary, pending_turns
+from src.database import engine, init_db, get_session, run_db
+from src.metrics import http_request_seconds, registry, server_timing, span, start_request_timing
 from src.models import Appointment, ChatMessage
+from src.serialization import FastJSONResponse, dumps
 from src.schemas import (
     ChatRequest, ChatResponse,
     ChatHistoryResponse,
-    AppointmentCreate, AppointmentUpdate, AppointmentResponse, AppointmentListResponse
+    AppointmentCreate, AppointmentUpdate, AppointmentResponse, AppointmentListResponse,
+    AppointmentImportResponse, FreeSlotsResponse
 )
+from src.history_cache import history_cache
+from src.logging_config import setup_logging
+from src.intent_router import intent_router
 from src.ollama_service import ollama_service
-from src.config import OLLAMA_MAX_TURNS
+from src.recent_appointments import recent_appointments_context
+from src.slot_index import normalize_datetime, slot_index
+from src.tools import SlotConflict, commit_appointment, find_free_slots
+from src.warmup import model_warmer
+from src.config import FREE_SLOTS_DEFAULT_LIMIT, OLLAMA_MAX_TURNS
+
+
+setup_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="MLK Appointments Chatbot",
     description="Chatbot para agendar citas con integración Ollama",
-    version="0.1.0"
+    version="0.1.0",
+    # Respuestas JSON codificadas con orjson (ver src/serialization.py)
+    default_response_class=FastJSONResponse,
 )
 
 # Configurar CORS
@@ -34,15 +61,49 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Medir cada petición y devolver sus fases en la cabecera Server-Timing.
+
+    En las respuestas en streaming la cabecera solo incluye lo ocurrido antes de
+    enviar el primer evento; las métricas de /metrics recogen el turno completo.
+    """
+    spans = start_request_timing()
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    http_request_seconds.observe(
+        elapsed, method=request.method, route=route, status=str(response.status_code)
+    )
+    spans.append(("total", elapsed))
+    response.headers["Server-Timing"] = server_timing(spans)
+    return response
+
+
 @app.on_event("startup")
 async def startup_event():
     """Inicializar la base de datos al iniciar la aplicación"""
     init_db()
+    # Índice en memoria de franjas ocupadas
+    with Session(engine) as session:
+        slot_index.rebuild(session)
+    # Cargar el modelo en segundo plano: el servicio arranca sin esperarlo
+    model_warmer.start()
+    if chat_writer.enabled:
+        chat_writer.start()
+    # Archivado periódico de los turnos antiguos (si CHAT_RETENTION_DAYS > 0)
+    chat_retention.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cerrar conexiones al apagar la aplicación"""
+    await model_warmer.stop()
+    await chat_retention.stop()
+    await conversation_summarizer.drain()
+    # Guardar los turnos que sigan en la cola de escritura diferida
+    await chat_writer.stop()
     await ollama_service.close()
 
 
@@ -53,88 +114,271 @@ async def root():
         "version": "0.1.0",
         "endpoints": {
             "chat": "/api/chat",
+            "chat_stream": "/api/chat/stream",
             "chat_history": "/api/chat/history",
             "appointments": "/api/appointments",
-            "health": "/health"
+            "free_slots": "/api/slots/free",
+            "health": "/health",
+            "metrics": "/metrics"
         }
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas en formato de texto de Prometheus"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health")
 async def health_check():
     """Endpoint de salud para verificar el estado del servicio"""
     return {
         "status": "healthy",
         "ollama_url": ollama_service.base_url,
-        "model": ollama_service.model
+        "model": ollama_service.model,
+        "ollama_nodes": ollama_service.pool.status(),
+        "admission": ollama_service.admission.stats(),
+        "prompt_eval": ollama_service.prompt_stats,
+        "history_cache": history_cache.stats(),
+        "response_cache": ollama_service.response_cache.stats(),
+        "summaries": conversation_summarizer.stats(),
+        "chat_writer": chat_writer.stats(),
+        "chat_retention": chat_retention.status(),
+        "warmup": model_warmer.status(),
+        "fast_path": intent_router.stats()
     }
 
 
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat(
+def _build_chat_inputs(
     request: ChatRequest,
-    session: Session = Depends(get_session)
-):
-    """
-    Endpoint para interactuar con el chatbot de Ollama
+    session: Session,
+) -> Tuple[str, Optional[str], List[Tuple[str, str]], Optional[Tuple[Optional[str], List[Tuple[str, str]]]], bool]:
+    """Resolver user_id, contexto e historial para un turno de chat.
+
+    Al terminar cierra ``session``: la conexión vuelve al pool en lugar de
+    quedarse retenida mientras el turno espera en la cola y a Ollama.
+
+    Returns:
+        ``user_id``, contexto, historial que cabe en el presupuesto de tokens,
+        ``(resumen anterior, turnos)`` para ``conversation_summarizer.schedule``
+        si hay turnos fuera del prompt sin resumir, y si es el primer turno de
+        la conversación (antes de ajustar el historial al presupuesto).
     """
     try:
-        # Obtener contexto de citas existentes para mejorar las respuestas
-        appointments = session.exec(
-            select(Appointment)
-            .order_by(Appointment.date.desc()).limit(5)
-        ).all()
-        
+        return _read_chat_inputs(request, session)
+    finally:
+        session.close()
+
+
+def _read_chat_inputs(
+    request: ChatRequest,
+    session: Session,
+) -> Tuple[str, Optional[str], List[Tuple[str, str]], Optional[Tuple[Optional[str], List[Tuple[str, str]]]], bool]:
+    # Determinar o generar user_id para mantener el contexto entre turnos
+    user_id = (request.user_id or "").strip() or str(uuid4())
+
+    with span("history"):
+        history = history_cache.get(user_id)
+        if history is None:
+            # Turnos aún en la cola de escritura diferida; se toman antes de leer
+            # la tabla para no perder los que se guarden entre medias
+            queued = chat_writer.pending(user_id)
+            history_items_desc: List[ChatMessage] = session.exec(
+                select(ChatMessage)
+                .where(ChatMessage.user_id == user_id)
+                .order_by(ChatMessage.created_at.desc())
+                .limit(OLLAMA_MAX_TURNS)
+            ).all()
+            # Revertir a orden cronológico para el prompt
+            history_items = merge_pending(list(reversed(history_items_desc)), queued)[-OLLAMA_MAX_TURNS:]
+            history = [(item.user_message, item.bot_response) for item in history_items]
+            history_cache.put(user_id, history)
+
+        first_turn = not history
+        # Solo los turnos recientes que caben en el presupuesto; el resto va resumido
+        history, dropped = fit_history(history)
+        summary = load_summary(session, user_id) if dropped else None
+        pending = pending_turns(summary, dropped) if dropped else []
+        to_summarize = (summary.summary if summary else None, pending) if pending else None
+
+    with span("context"):
         # Construir contexto combinando citas recientes y el contexto opcional enviado por el cliente
         context_parts = []
-        if appointments:
-            context_parts.append(
-                "Citas recientes: " + ", ".join([
-                    f"{apt.name} el {apt.date.strftime('%Y-%m-%d %H:%M')}"
-                    for apt in appointments
-                ])
-            )
+        if summary:
+            context_parts.append(f"Resumen de la conversación anterior: {summary.summary}")
+        # Bloque de citas recientes (solo se reconstruye cuando cambian las citas)
+        recent = recent_appointments_context.get(session)
+        if recent:
+            context_parts.append(recent)
         if getattr(request, "context", None):
             context_parts.append(f"Contexto del usuario: {request.context}")
 
         context = "\n".join(context_parts) if context_parts else None
+    return user_id, context, history, to_summarize, first_turn
 
-        # Determinar o generar user_id para mantener el contexto entre turnos
-        user_id = (request.user_id or "").strip() or str(uuid4())
 
-        history_items_desc: List[ChatMessage] = session.exec(
-            select(ChatMessage)
-            .where(ChatMessage.user_id == user_id)
-            .order_by(ChatMessage.created_at.desc())
-            .limit(OLLAMA_MAX_TURNS)
-        ).all()
-        # Revertir a orden cronológico para el prompt
-        history_items = list(reversed(history_items_desc))
-        history = [(item.user_message, item.bot_response) for item in history_items]
+def _schedule_summary(user_id: str, to_summarize) -> None:
+    """Resumir en segundo plano los turnos que ya no caben en el prompt"""
+    if to_summarize is not None:
+        conversation_summarizer.schedule(user_id, *to_summarize)
 
-        # Obtener respuesta de Ollama, pasando también historial
-        response_text = await ollama_service.chat(request.message, context, history)
-        # Guardar el mensaje en el historial
+
+def _admission_error(error: AdmissionRejected) -> HTTPException:
+    """Respuesta rápida cuando Ollama está saturado"""
+    return HTTPException(
+        status_code=error.status_code,
+        detail=str(error),
+        headers={"Retry-After": str(error.retry_after)},
+    )
+
+
+@app.exception_handler(SlotConflict)
+async def _slot_conflict_handler(request: Request, error: SlotConflict) -> FastJSONResponse:
+    """409 con la franja en conflicto y alternativas libres"""
+    return FastJSONResponse(status_code=409, content={"detail": str(error), **error.to_dict()})
+
+
+async def _routed_stream(response: str) -> AsyncIterator[dict]:
+    """Eventos de stream para una respuesta resuelta sin el modelo"""
+    yield {"type": "start"}
+    yield {"type": "token", "content": response}
+    yield {"type": "done", "response": response}
+
+
+async def _chain(first: List[dict], rest: AsyncIterator[dict]) -> AsyncIterator[dict]:
+    """Reemitir los eventos ya leídos y después el resto del stream"""
+    for event in first:
+        yield event
+    async for event in rest:
+        yield event
+
+
+def _save_chat_message(
+    session: Session,
+    user_id: str,
+    user_message: str,
+    bot_response: str,
+) -> int:
+    """Guardar un turno de conversación en el historial y devolver su ID.
+
+    La sesión se cierra tras el commit para no retener la conexión durante el
+    resto de la petición (p. ej. mientras termina un stream).
+    """
+    with span("persist"):
         chat_message = ChatMessage(
             user_id=user_id,
-            user_message=request.message,
-            bot_response=response_text
+            user_message=user_message,
+            bot_response=bot_response
         )
-        session.add(chat_message)
-        session.commit()
-        session.refresh(chat_message)
-        
+        try:
+            session.add(chat_message)
+            session.flush()
+            message_id = chat_message.id
+            session.commit()
+        finally:
+            session.close()
+    history_cache.append(user_id, user_message, bot_response)
+    return message_id
+
+
+async def _persist_turn(session: Session, user_id: str, user_message: str, bot_response: str) -> int:
+    """Guardar el turno (o encolarlo si la escritura diferida está activa) y devolver su ID"""
+    if not chat_writer.enabled:
+        return await run_db(_save_chat_message, session, user_id, user_message, bot_response)
+    with span("persist"):
+        message_id = await chat_writer.submit(user_id, user_message, bot_response)
+    history_cache.append(user_id, user_message, bot_response)
+    return message_id
+
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat(
+    request: ChatRequest,
+    session: Session = Depends(get_session)
+):
+    """
+    Endpoint para interactuar con el chatbot de Ollama
+    """
+    try:
+        user_id, context, history, to_summarize, first_turn = await run_db(_build_chat_inputs, request, session)
+        _schedule_summary(user_id, to_summarize)
+
+        # Intenciones sencillas se responden sin pasar por Ollama
+        response_text = await run_db(intent_router.route, request.message)
+        if response_text is None:
+            # Obtener respuesta de Ollama, pasando también historial
+            response_text = await ollama_service.chat(
+                request.message, context, history, user_id=user_id, first_turn=first_turn
+            )
+        # Guardar el mensaje en el historial
+        message_id = await _persist_turn(session, user_id, request.message, response_text)
+
         return ChatResponse(
             response=response_text,
-            message_id=chat_message.id,
+            message_id=message_id,
             user_id=user_id
         )
+    except AdmissionRejected as e:
+        raise _admission_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error en el chat: {str(e)}")
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    session: Session = Depends(get_session)
+):
+    """
+    Igual que /api/chat pero emitiendo la respuesta token a token (NDJSON).
+
+    Cada línea es un objeto JSON con ``type``:
+    ``token`` (fragmento de texto), ``tool`` (herramienta ejecutada entre rondas)
+    y, al final, ``done`` con la respuesta completa, ``message_id`` y ``user_id``.
+    """
+    try:
+        user_id, context, history, to_summarize, _ = await run_db(_build_chat_inputs, request, session)
+        _schedule_summary(user_id, to_summarize)
+        routed = await run_db(intent_router.route, request.message)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error en el chat: {str(e)}")
 
+    if routed is not None:
+        events = _routed_stream(routed)
+    else:
+        events = ollama_service.chat_stream(
+            request.message, context, history, user_id=user_id
+        )
+    # Esperar la plaza en la cola antes de enviar cabeceras: si no hay, 429/503
+    try:
+        first_event = await events.__anext__()
+    except AdmissionRejected as e:
+        raise _admission_error(e)
+    except StopAsyncIteration:
+        first_event = None
+
+    async def event_stream():
+        try:
+            pending = [first_event] if first_event is not None else []
+            async for event in _chain(pending, events):
+                if event["type"] == "done":
+                    message_id = await _persist_turn(session, user_id, request.message, event["response"])
+                    event = {
+                        **event,
+                        "message_id": message_id,
+                        "user_id": user_id,
+                    }
+                yield dumps(event) + b"\n"
+        except Exception as e:
+            logger.exception("Error en el chat en streaming")
+            yield dumps({"type": "error", "detail": f"Error en el chat: {str(e)}"}) + b"\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
 
 @app.get("/api/chat/history", response_model=ChatHistoryResponse)
-async def get_chat_history(
+def get_chat_history(
     user_id: str,
     limit: int = 50,
     session: Session = Depends(get_session)
@@ -147,12 +391,15 @@ async def get_chat_history(
         max_limit = 200
         effective_limit = max(1, min(limit, max_limit))
 
+        queued = chat_writer.pending(user_id)
         items: List[ChatMessage] = session.exec(
             select(ChatMessage)
             .where(ChatMessage.user_id == user_id)
             .order_by(ChatMessage.created_at.asc())
             .limit(effective_limit)
         ).all()
+        # Incluir los turnos que aún esperan en la cola de escritura diferida
+        items = merge_pending(items, queued)[:effective_limit]
 
         # Convertir a una lista de elementos con roles
         history_items = []
@@ -177,7 +424,7 @@ async def get_chat_history(
 
 
 @app.post("/api/appointments", response_model=AppointmentResponse)
-async def create_appointment(
+def create_appointment(
     appointment: AppointmentCreate,
     session: Session = Depends(get_session)
 ):
@@ -192,39 +439,139 @@ async def create_appointment(
             date=appointment.date,
             description=appointment.description
         )
-        session.add(db_appointment)
-        session.commit()
-        session.refresh(db_appointment)
+        # Inserción atómica: el índice único de la franja detecta el conflicto
+        commit_appointment(session, db_appointment)
         return AppointmentResponse.model_validate(db_appointment)
+    except SlotConflict:
+        raise
     except Exception as e:
         session.rollback()
         raise HTTPException(status_code=500, detail=f"Error al crear la cita: {str(e)}")
 
 
 @app.get("/api/appointments", response_model=AppointmentListResponse)
-async def list_appointments(
+def list_appointments(
     skip: int = 0,
     limit: int = 100,
+    after_date: Optional[datetime] = None,
+    after_id: Optional[int] = None,
+    approximate_total: bool = False,
     session: Session = Depends(get_session)
 ):
     """
     Listar todas las citas
+
+    Admite dos modos de paginación:
+    - ``skip``/``limit`` (offset), compatible con versiones anteriores.
+    - Cursor (``after_date``/``after_id``): devuelve las citas posteriores a la
+      última de la página anterior usando el índice de ``date``, sin recorrer
+      las filas saltadas. Los valores para la página siguiente vienen en
+      ``next_after_date``/``next_after_id``. Si se usa el cursor, ``skip`` se ignora.
+
+    Con ``approximate_total`` el total sale del índice de franjas en memoria en
+    lugar de un ``COUNT(*)`` (puede no reflejar escrituras de otros procesos).
     """
     try:
-        statement = select(Appointment).order_by(Appointment.date.asc())
-        appointments = session.exec(statement.offset(skip).limit(limit)).all()
-        total = len(session.exec(select(Appointment)).all())
+        statement = select(Appointment).order_by(Appointment.date.asc(), Appointment.id.asc())
+        if after_date is not None:
+            after_date = normalize_datetime(after_date)
+            if after_id is None:
+                # Solo fecha: las citas estrictamente posteriores
+                statement = statement.where(Appointment.date > after_date)
+            else:
+                statement = statement.where(
+                    or_(
+                        Appointment.date > after_date,
+                        and_(Appointment.date == after_date, Appointment.id > after_id),
+                    )
+                )
+        else:
+            statement = statement.offset(skip)
+        appointments = session.exec(statement.limit(limit)).all()
+
+        if approximate_total and slot_index.loaded:
+            total = len(slot_index)
+        else:
+            total = session.exec(select(func.count()).select_from(Appointment)).one()
+
+        next_after_date = next_after_id = None
+        if appointments and len(appointments) == limit:
+            next_after_date = appointments[-1].date
+            next_after_id = appointments[-1].id
         
         return AppointmentListResponse(
             appointments=[AppointmentResponse.model_validate(apt) for apt in appointments],
-            total=total
+            total=total,
+            next_after_date=next_after_date,
+            next_after_id=next_after_id
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al listar citas: {str(e)}")
 
 
+@app.get("/api/appointments/export")
+def export_appointments(
+    format: str = "ndjson",
+    session: Session = Depends(get_session)
+):
+    """
+    Exportar todas las citas en streaming (NDJSON o CSV), con memoria constante
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {format}")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        iter_export(session, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="appointments.{format}"'},
+    )
+
+
+@app.post("/api/appointments/import", response_model=AppointmentImportResponse)
+async def import_appointments(
+    request: Request,
+    format: str = "ndjson",
+    batch_size: int = 500,
+    session: Session = Depends(get_session)
+):
+    """
+    Importar citas desde un cuerpo NDJSON o CSV recibido en streaming.
+
+    Las filas se validan una a una y se insertan en transacciones por lotes de
+    ``batch_size``; los conflictos de franja se comprueban por lote. Las filas
+    rechazadas se devuelven con su número de línea.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {format}")
+    batch_size = max(1, min(batch_size, 5000))
+
+    imported = 0
+    errors: List[dict] = []
+    batch = []
+    async for line_no, data in iter_records(request.stream(), format):
+        if isinstance(data, str):
+            errors.append({"line": line_no, "error": data})
+            continue
+        try:
+            batch.append((line_no, parse_record(data)))
+        except ValidationError as e:
+            errors.append({"line": line_no, "error": format_validation_error(e)})
+            continue
+        if len(batch) >= batch_size:
+            count, batch_errors = await run_db(import_batch, session, batch)
+            imported += count
+            errors.extend(batch_errors)
+            batch = []
+
+    count, batch_errors = await run_db(import_batch, session, batch)
+    imported += count
+    errors.extend(batch_errors)
+    errors.sort(key=lambda err: err["line"])
+    return AppointmentImportResponse(imported=imported, errors=errors)
+
+
 @app.get("/api/appointments/{appointment_id}", response_model=AppointmentResponse)
-async def get_appointment(
+def get_appointment(
     appointment_id: int,
     session: Session = Depends(get_session)
 ):
@@ -238,7 +585,7 @@ async def get_appointment(
 
 
 @app.put("/api/appointments/{appointment_id}", response_model=AppointmentResponse)
-async def update_appointment(
+def update_appointment(
     appointment_id: int,
     appointment_update: AppointmentUpdate,
     session: Session = Depends(get_session)
@@ -249,7 +596,7 @@ async def update_appointment(
     appointment = session.get(Appointment, appointment_id)
     if not appointment:
         raise HTTPException(status_code=404, detail="Cita no encontrada")
-    
+
     try:
         # Actualizar solo los campos proporcionados
         update_data = appointment_update.model_dump(exclude_unset=True)
@@ -257,17 +604,17 @@ async def update_appointment(
             setattr(appointment, field, value)
         
         appointment.updated_at = datetime.utcnow()
-        session.add(appointment)
-        session.commit()
-        session.refresh(appointment)
+        commit_appointment(session, appointment)
         return AppointmentResponse.model_validate(appointment)
+    except SlotConflict:
+        raise
     except Exception as e:
         session.rollback()
         raise HTTPException(status_code=500, detail=f"Error al actualizar la cita: {str(e)}")
 
 
 @app.delete("/api/appointments/{appointment_id}")
-async def delete_appointment(
+def delete_appointment(
     appointment_id: int,
     session: Session = Depends(get_session)
 ):
@@ -280,4 +627,21 @@ async def delete_appointment(
     
     session.delete(appointment)
     session.commit()
+    slot_index.remove(appointment_id)
     return {"message": "Cita eliminada exitosamente"}
+
+
+@app.get("/api/slots/free", response_model=FreeSlotsResponse)
+def list_free_slots(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = FREE_SLOTS_DEFAULT_LIMIT,
+):
+    """
+    Obtener las próximas franjas libres de 30 minutos dentro del horario de atención
+    """
+    try:
+        slots = find_free_slots(start=start, end=end, limit=max(1, min(limit, 100)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FreeSlotsResponse(slots=slots)
@@ -0,0 +1,88 @@
+# src/migrations.py
+import logging
+from typing import Dict, List
+
+from sqlalchemy import bindparam, inspect, select, text, update
+from sqlalchemy.engine import Engine
+
+from src.models import Appointment
+from src.slot_index import slot_key
+
+
+logger = logging.getLogger(__name__)
+
+
+def run_migrations(engine: Engine):
+    """Aplicar a una BdD existente los cambios que ``create_all`` no hace.
+
+    ``create_all`` solo crea las tablas que faltan; las columnas e índices
+    nuevos de tablas ya existentes se añaden aquí. Cada paso es idempotente.
+    """
+    migrate_appointment_slot_key(engine)
+    migrate_chatmessage_history_index(engine)
+
+
+def migrate_appointment_slot_key(engine: Engine):
+    """Añadir ``appointment.slot_key``, rellenarla y crear su índice único.
+
+    Si la tabla ya tenía varias citas en la misma franja, solo la primera (por
+    ID) recibe la clave; las demás se quedan sin ella y se avisa en el log para
+    revisarlas a mano, en lugar de borrarlas.
+
+    La clave sale de la fecha tal como está guardada. Las citas nuevas se
+    guardan en UTC, pero antes una fecha con zona horaria se guardaba con su
+    hora local y sin la zona. Como la zona original no se conserva, esas citas
+    antiguas no se pueden convertir: su franja es la de la hora guardada.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("appointment"):
+        return
+    columns = {column["name"] for column in inspector.get_columns("appointment")}
+
+    table = Appointment.__table__
+    with engine.begin() as conn:
+        if "slot_key" not in columns:
+            conn.execute(text("ALTER TABLE appointment ADD COLUMN slot_key VARCHAR"))
+
+        taken = set(conn.scalars(select(table.c.slot_key).where(table.c.slot_key.is_not(None))))
+        pending = conn.execute(
+            select(table.c.id, table.c.date).where(table.c.slot_key.is_(None)).order_by(table.c.id)
+        ).all()
+        updates: List[Dict[str, object]] = []
+        duplicates: List[int] = []
+        for appointment_id, date in pending:
+            key = slot_key(date)
+            if key in taken:
+                duplicates.append(appointment_id)
+                continue
+            taken.add(key)
+            updates.append({"row_id": appointment_id, "key": key})
+
+        if updates:
+            conn.execute(
+                update(table).where(table.c.id == bindparam("row_id")).values(slot_key=bindparam("key")),
+                updates,
+            )
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_appointment_slot_key ON appointment (slot_key)"
+        ))
+
+    if updates:
+        logger.info("slot_key rellenada en %s citas", len(updates))
+    if duplicates:
+        logger.warning("Citas en una franja ya ocupada, sin slot_key: ids=%s", duplicates)
+
+
+def migrate_chatmessage_history_index(engine: Engine):
+    """Sustituir el índice de ``chatmessage.user_id`` por ``(user_id, created_at)``.
+
+    El compuesto sirve a la vez el filtro por usuario y el orden por fecha, así
+    que el índice simple anterior solo encarecía las escrituras.
+    """
+    if not inspect(engine).has_table("chatmessage"):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_chatmessage_user_id_created_at ON chatmessage (user_id, created_at)"
+        ))
+        conn.execute(text("DROP INDEX IF EXISTS ix_chatmessage_user_id"))
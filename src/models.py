@@ -1,6 +1,7 @@
 # src/models.py
 from datetime import datetime
 from typing import Optional
+from sqlalchemy import Column, Index, LargeBinary
 from sqlmodel import SQLModel, Field, create_engine, Session
 
 
@@ -11,6 +12,9 @@ class Appointment(SQLModel, table=True):
     email: Optional[str] = None
     phone: Optional[str] = None
     date: datetime = Field(index=True)
+    # Inicio de la franja de 30 minutos ("AAAA-MM-DDTHH:MM", UTC). Lo rellena
+    # src/slot_index.py al guardar; el índice único impide dos citas por franja
+    slot_key: Optional[str] = Field(default=None, unique=True, index=True)
     description: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: Optional[datetime] = None
@@ -18,10 +22,38 @@ class Appointment(SQLModel, table=True):
 
 class ChatMessage(SQLModel, table=True):
     """Modelo para almacenar el historial de conversación"""
+    # El historial se lee por usuario y en orden de creación: un índice compuesto
+    # evita ordenar en cada consulta (y cubre también los filtros por user_id)
+    __table_args__ = (Index("ix_chatmessage_user_id_created_at", "user_id", "created_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     # Identificador del usuario/cliente para encadenar turnos
-    user_id: Optional[str] = Field(default=None, index=True)
+    user_id: Optional[str] = Field(default=None)
     user_message: str
     bot_response: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+
+
+class ConversationSummary(SQLModel, table=True):
+    """Resumen de los turnos antiguos de una conversación que ya no caben en el prompt"""
+    user_id: str = Field(primary_key=True)
+    summary: str
+    # Huella del último turno incluido en el resumen
+    last_turn_digest: str
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ChatArchive(SQLModel, table=True):
+    """Turnos antiguos del historial, retirados de ``ChatMessage`` y comprimidos.
+
+    Cada fila guarda un lote de turnos consecutivos de un usuario como JSON
+    comprimido con zlib (ver src/chat_retention.py).
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: Optional[str] = Field(default=None, index=True)
+    first_created_at: datetime
+    last_created_at: datetime
+    turns: int
+    payload: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    archived_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,165 @@
+# src/ollama_pool.py
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaNode:
+    """Estado de un backend de Ollama dentro del pool"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.in_flight = 0
+        # Latencia media (EWMA) de las peticiones completadas, en segundos
+        self.latency: Optional[float] = None
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def available(self, now: float) -> bool:
+        """Sano, o expulsado pero con el tiempo de espera cumplido (se reintenta)."""
+        return self.ejected_until <= now
+
+    def status(self, now: float) -> Dict[str, object]:
+        return {
+            "url": self.url,
+            "healthy": self.available(now) and self.failures == 0,
+            "in_flight": self.in_flight,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "failures": self.failures,
+        }
+
+
+class OllamaPool:
+    """Balanceo entre varios backends de Ollama.
+
+    - Cada conversación (``user_id``) se queda en el mismo nodo mientras esté
+      sano y no mucho más cargado que el resto, para aprovechar la caché del
+      prompt en ese nodo.
+    - Si no, se elige el nodo con menor ``(en curso + 1) * latencia media``.
+    - Un nodo que falla (error de conexión o 5xx) se expulsa durante
+      ``cooldown`` segundos, duplicando la espera con cada fallo consecutivo.
+      Cumplida la espera vuelve a recibir tráfico; la primera petición correcta
+      lo readmite del todo.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        cooldown: float = 30.0,
+        max_cooldown: float = 300.0,
+        sticky_max_imbalance: int = 4,
+        max_sticky_users: int = 10000,
+        ewma_alpha: float = 0.3,
+    ):
+        if not urls:
+            raise ValueError("Se necesita al menos un backend de Ollama.")
+        self.nodes = [OllamaNode(url) for url in urls]
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.sticky_max_imbalance = sticky_max_imbalance
+        self.max_sticky_users = max_sticky_users
+        self.ewma_alpha = ewma_alpha
+        self._sticky: "OrderedDict[str, OllamaNode]" = OrderedDict()
+
+    def pick(self, user_id: Optional[str] = None, exclude: Optional[List[OllamaNode]] = None) -> OllamaNode:
+        """Elegir el nodo para la próxima petición de ``user_id``."""
+        now = time.monotonic()
+        excluded = exclude or []
+        candidates = [n for n in self.nodes if n.available(now) and n not in excluded]
+        if not candidates:
+            # Ninguno disponible: probar el que antes termina su expulsión
+            remaining = [n for n in self.nodes if n not in excluded] or self.nodes
+            candidates = [min(remaining, key=lambda n: n.ejected_until)]
+
+        known = [n.latency for n in self.nodes if n.latency is not None]
+        default_latency = sum(known) / len(known) if known else 1.0
+        least = min(candidates, key=lambda n: self._score(n, default_latency))
+        if user_id:
+            sticky = self._sticky.get(user_id)
+            if (
+                sticky in candidates
+                and sticky.in_flight - least.in_flight <= self.sticky_max_imbalance
+            ):
+                self._sticky.move_to_end(user_id)
+                return sticky
+            self._sticky[user_id] = least
+            self._sticky.move_to_end(user_id)
+            while len(self._sticky) > self.max_sticky_users:
+                self._sticky.popitem(last=False)
+        return least
+
+    @asynccontextmanager
+    async def acquire(
+        self,
+        user_id: Optional[str] = None,
+        exclude: Optional[List[OllamaNode]] = None,
+    ) -> AsyncIterator[OllamaNode]:
+        """Reservar un nodo durante una petición y registrar su resultado.
+
+        Las excepciones de conexión y las respuestas 5xx expulsan el nodo; el
+        resto de excepciones se propagan sin afectar a su salud.
+        """
+        node = self.pick(user_id, exclude)
+        node.in_flight += 1
+        started = time.monotonic()
+        try:
+            yield node
+        except Exception as e:
+            if self.is_node_failure(e):
+                self.mark_failure(node, e)
+            raise
+        else:
+            self.mark_success(node, time.monotonic() - started)
+        finally:
+            node.in_flight -= 1
+
+    def mark_success(self, node: OllamaNode, elapsed: float):
+        """Actualizar la latencia media y readmitir el nodo si estaba expulsado"""
+        if node.latency is None:
+            node.latency = elapsed
+        else:
+            node.latency += self.ewma_alpha * (elapsed - node.latency)
+        if node.failures:
+            logger.info("Nodo de Ollama %s readmitido", node.url)
+        node.failures = 0
+        node.ejected_until = 0.0
+
+    def mark_failure(self, node: OllamaNode, error: Exception):
+        """Expulsar el nodo con espera exponencial"""
+        node.failures += 1
+        wait = min(self.cooldown * 2 ** (node.failures - 1), self.max_cooldown)
+        node.ejected_until = time.monotonic() + wait
+        logger.warning(
+            "Nodo de Ollama %s expulsado %.0fs tras %s fallo(s): %s",
+            node.url,
+            wait,
+            node.failures,
+            error,
+        )
+
+    def status(self) -> List[Dict[str, object]]:
+        """Estado de cada nodo, para /health"""
+        now = time.monotonic()
+        return [node.status(now) for node in self.nodes]
+
+    @staticmethod
+    def _score(node: OllamaNode, default_latency: float) -> float:
+        # Sin latencia observada se asume la media del resto de nodos
+        latency = node.latency if node.latency is not None else default_latency
+        return (node.in_flight + 1) * latency
+
+    @staticmethod
+    def is_node_failure(error: Exception) -> bool:
+        """Errores atribuibles al backend (conexión caída o 5xx)."""
+        if isinstance(error, httpx.TransportError):
+            return True
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+        return False
@@ -1,36 +1,108 @@
 # src/ollama_service.py
+import asyncio
 import httpx
 import logging
 import json
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional, List, Tuple, Any, Dict
+from typing import AsyncIterator, Callable, Optional, List, Tuple, Any, Dict
 from src.config import (
+    LOG_PAYLOADS,
     OLLAMA_BASE_TIMEOUT,
-    OLLAMA_BASE_URL,
+    OLLAMA_BASE_URLS,
     OLLAMA_ENDPOINT_CHAT,
+    OLLAMA_KEEP_ALIVE,
     OLLAMA_ENDPOINT_GENERATE,
     OLLAMA_MODEL,
-    OLLAMA_MAX_ROUND_FOR_TOOL_CALL
+    OLLAMA_MAX_CONCURRENCY,
+    OLLAMA_MAX_QUEUE,
+    OLLAMA_MAX_QUEUE_PER_USER,
+    OLLAMA_MAX_QUEUE_WAIT,
+    OLLAMA_MAX_ROUND_FOR_TOOL_CALL,
+    OLLAMA_NODE_COOLDOWN,
+    TOOL_CACHE_USER_TTL_SECONDS,
 )
-from src.master_prompt import MASTER_PROMPT
+from src.admission import AdmissionController, AdmissionRejected
+from src.database import run_db
+from src.master_prompt import MASTER_PROMPT, SUMMARY_PROMPT
+from src.metrics import (
+    ollama_eval_seconds,
+    ollama_eval_tokens,
+    ollama_prompt_eval_seconds,
+    ollama_prompt_tokens,
+    record_span,
+    span,
+    tool_seconds,
+)
+from src.ollama_pool import OllamaNode, OllamaPool
 from src.ollama_tools import TOOLS
 from src import tools as local_tools
+from src.response_cache import ResponseCache, prompt_version
+from src.serialization import ChatPayloadEncoder, dumps, dumps_str, loads
+from src.slot_index import slot_index, slot_key
+from src.tool_cache import ToolResultCache, UserToolCaches, tool_cache_key
 
 
 logger = logging.getLogger(__name__)
+# Peticiones/respuestas completas de Ollama (solo con LOG_PAYLOADS)
+payload_logger = logging.getLogger(f"{__name__}.payloads")
+
+FALLBACK_RESPONSE = "Lo siento, no pude procesar tu solicitud."
+
+# Herramientas sin efectos: se pueden ejecutar en paralelo dentro de una ronda
+READ_ONLY_TOOLS = frozenset({"get_appointment_lists", "check_occupied_slots", "find_free_slots"})
+
+# Prefijo estático del prompt: debe ser idéntico byte a byte entre peticiones
+SYSTEM_MESSAGE: Dict[str, Any] = {"role": "system", "content": MASTER_PROMPT}
+
+# Los cuerpos de /api/chat se envían ya codificados (ver src/serialization.py)
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def _is_read_only(fn: Optional[Callable[..., Any]]) -> bool:
+    return fn is not None and fn.__name__ in READ_ONLY_TOOLS
 
 
 class OllamaService:
     """Servicio para interactuar con Ollama"""
     
-    def __init__(self):
-        self.base_url = OLLAMA_BASE_URL
+    def __init__(self, base_urls: Optional[List[str]] = None):
+        # Backends de Ollama; las conversaciones se reparten entre ellos
+        self.pool = OllamaPool(base_urls or OLLAMA_BASE_URLS, cooldown=OLLAMA_NODE_COOLDOWN)
+        self.base_url = self.pool.nodes[0].url
+        # Locks de las herramientas de escritura: clave -> [lock, usuarios]
+        self._write_locks: Dict[str, List[Any]] = {}
+        # Memoización de herramientas de lectura (por turno y, opcionalmente, por usuario)
+        self.tool_caches = UserToolCaches(TOOL_CACHE_USER_TTL_SECONDS)
+        # Respuestas a primeros turnos sin herramientas
+        self.response_cache = ResponseCache()
+        self.admission = AdmissionController(
+            max_concurrency=OLLAMA_MAX_CONCURRENCY,
+            max_queue=OLLAMA_MAX_QUEUE,
+            max_queue_per_user=OLLAMA_MAX_QUEUE_PER_USER,
+            max_wait=OLLAMA_MAX_QUEUE_WAIT,
+        )
         self.model = OLLAMA_MODEL
         self.client = httpx.AsyncClient(timeout=OLLAMA_BASE_TIMEOUT)
         self.tools = TOOLS
+        # Partes estáticas del cuerpo de /api/chat, codificadas una vez
+        self._encoder: Optional[ChatPayloadEncoder] = None
+        self._encoder_key: Optional[Tuple[Any, ...]] = None
+        # Huella de prompt y herramientas para la caché de respuestas, calculada una vez
+        self._prompt_version: Optional[str] = None
+        self._prompt_version_key: Optional[Tuple[Any, ...]] = None
         self.api_generate = OLLAMA_ENDPOINT_GENERATE
         # Endpoint de chat de Ollama (requiere mensajes y soporta tools)
         self.api_chat = OLLAMA_ENDPOINT_CHAT
+        # Acumulado de evaluación del prompt (para verificar la reutilización de caché)
+        self.prompt_stats: Dict[str, int] = {
+            "rounds": 0,
+            "prompt_eval_count": 0,
+            "prompt_eval_duration_ns": 0,
+            "last_prompt_eval_count": 0,
+            "last_prompt_eval_duration_ns": 0,
+        }
     
 
     async def chat(
@@ -38,6 +110,8 @@ class OllamaService:
         message: str,
         context: Optional[str] = None,
         history: Optional[List[Tuple[str, str]]] = None,
+        user_id: Optional[str] = None,
+        first_turn: Optional[bool] = None,
     ) -> str:
         """
         Enviar un mensaje al modelo de Ollama y obtener una respuesta
@@ -46,138 +120,215 @@ class OllamaService:
             message: Mensaje del usuario
             context: Contexto adicional (por ejemplo, información sobre citas existentes)
             history: Historial de la conversacion, si existe en la BdD
+            user_id: Conversación a la que pertenece el mensaje (fija el backend)
+            first_turn: Si es el primer mensaje de la conversación. Si no se
+                indica, se deduce de ``history`` (que puede venir recortado).
         
         Returns:
             Respuesta del modelo
             :param history:
+
+        Raises:
+            AdmissionRejected: Si no hay plaza libre para hablar con Ollama.
         """
-        # Construir mensajes (formato chat) con contexto del sistema
-        system_prompt = MASTER_PROMPT
-        if context:
-            system_prompt += f"\n\nContexto adicional: {context}"
+        # Primer turno: la respuesta solo depende del mensaje, el prompt y el contexto
+        cache_key = None
+        if first_turn is None:
+            first_turn = not history
+        if first_turn and self.response_cache.enabled:
+            cache_key = self.response_cache.key(
+                message, self.model, self._current_prompt_version(), context
+            )
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
 
-        messages: List[Dict[str, Any]] = [{"role": "system", "content": system_prompt}]
+        messages = self._build_messages(message, context, history)
 
-        # Incluir historial previo (si existe) en formato chat
-        if history:
-            for u, b in history:
-                if u:
-                    messages.append({"role": "user", "content": u})
-                if b:
-                    messages.append({"role": "assistant", "content": b})
+        # Limitar los turnos simultáneos contra Ollama (cola justa por usuario)
+        async with self.admission.slot(user_id):
+            response, cacheable = await self._chat_rounds(messages, user_id)
+        if cache_key is not None and cacheable:
+            self.response_cache.put(cache_key, response)
+        return response
 
-        # Mensaje actual del usuario
-        messages.append({"role": "user", "content": message})
+    async def _chat_rounds(
+        self, messages: List[Dict[str, Any]], user_id: Optional[str]
+    ) -> Tuple[str, bool]:
+        """Rondas de /api/chat (sin streaming) hasta obtener la respuesta final.
 
+        Returns:
+            La respuesta y si se puede cachear (el modelo contestó sin usar
+            herramientas ni producirse errores).
+        """
+        tool_cache = self.tool_caches.for_turn(user_id)
+        # Mensajes ya codificados en rondas anteriores de este turno
+        encoded: List[bytes] = []
+        used_tools = False
         try:
             # Realizar una o más rondas para manejar tool calls si aparecen
             for _ in range(OLLAMA_MAX_ROUND_FOR_TOOL_CALL):  # límite de seguridad de iteraciones
-                response = await self.client.post(
-                    f"{self.base_url}{self.api_chat}",
-                    json={
-                        "model": self.model,
-                        "messages": messages,
-                        "stream": False,
-                        "tools": self.tools,
-                    },
-                )
-                response.raise_for_status()
-                data: Dict[str, Any] = response.json()
-                logger.info(f'----- data -> {data}')
+                with span("ollama_round"):
+                    response = await self._post_chat(
+                        self._encode_payload(messages, stream=False, encoded=encoded), user_id
+                    )
+                data: Dict[str, Any] = loads(response.content)
+                self._record_prompt_eval(data)
 
                 # Formatos posibles: {"message": {...}} o directamente llaves arriba
                 msg = data.get("message", data)
                 tool_calls = msg.get("tool_calls") or data.get("tool_calls")
                 assistant_content = msg.get("content") or data.get("response")
-                logger.info(f'\n\n----- msg -> {msg}\n\n----- tool_calls -> {tool_calls}'
-                            f'\n\n----- assistant_content {assistant_content}')
+                if LOG_PAYLOADS:
+                    payload_logger.info("Respuesta de Ollama", extra={"payload": data})
 
                 if tool_calls:
                     # Despachar cada tool call y agregar su resultado
-                    for tc in tool_calls:
-                        fn = None
-                        args: Dict[str, Any] = {}
-                        tool_call_id = tc.get("id") or tc.get("tool_call_id")
-
-                        # Estructura tipo OpenAI-like
-                        if isinstance(tc, dict):
-                            func_obj = tc.get("function") or {}
-                            name = func_obj.get("name") or tc.get("name")
-                            raw_args = func_obj.get("arguments") or tc.get("arguments")
-                            if isinstance(raw_args, str):
-                                try:
-                                    args = json.loads(raw_args) if raw_args else {}
-                                except Exception:
-                                    # Si no parsea, intentar como dict literal
-                                    try:
-                                        args = json.loads(raw_args.replace("'", '"'))
-                                    except Exception:
-                                        args = {}
-                            elif isinstance(raw_args, dict):
-                                args = raw_args
-                            else:
-                                args = {}
-                            fn = self._resolve_tool(name)
-
-                        result_payload: Dict[str, Any] = {
-                            "ok": False,
-                            "result": None,
-                            "error": None,
-                        }
-
-                        if fn:
-                            try:
-                                coerced_args = self._coerce_args_for_function(fn.__name__, args)
-                                result = fn(**coerced_args)
-                                # Serializar resultado a JSON-friendly
-                                result_payload["ok"] = True
-                                try:
-                                    json.dumps(result)  # comprobación rápida
-                                    result_payload["result"] = result
-                                except TypeError:
-                                    # Fallback de serialización simple
-                                    if hasattr(result, "model_dump_json"):
-                                        result_payload["result"] = json.loads(result.model_dump_json())
-                                    else:
-                                        result_payload["result"] = str(result)
-                            except Exception as e:  # noqa: BLE001
-                                logger.exception("Error ejecutando herramienta %s", fn.__name__)
-                                result_payload["error"] = str(e)
-                        else:
-                            result_payload["error"] = "Tool no encontrada"
-
-                        # Añadir mensaje de rol tool con el resultado
-                        tool_msg: Dict[str, Any] = {
-                            "role": "tool",
-                            "content": json.dumps(result_payload, ensure_ascii=False),
-                        }
-                        if tool_call_id:
-                            tool_msg["tool_call_id"] = tool_call_id
-                        if fn:
-                            tool_msg["name"] = fn.__name__
-                        messages.append(tool_msg)
-
+                    await self._run_tool_calls(tool_calls, messages, tool_cache)
+                    used_tools = True
                     # Continuar el bucle para dar al modelo el contexto de tool results
                     continue
 
                 # Si no hay tool calls, devolver el contenido del asistente
                 if assistant_content:
-                    return assistant_content
+                    return assistant_content, not used_tools
 
                 # Fallback a respuesta tipo generate
                 if "response" in data:
-                    return data.get("response", "Lo siento, no pude procesar tu solicitud.")
+                    response_text = data.get("response", FALLBACK_RESPONSE)
+                    return response_text, bool(response_text) and not used_tools
 
                 # Si no hay contenido, romper
                 break
 
             # Si llegamos aquí, no se pudo obtener respuesta útil
-            return "Lo siento, no pude procesar tu solicitud."
+            return FALLBACK_RESPONSE, False
+        except httpx.HTTPError as e:
+            return f"Error al conectar con el servicio de Ollama: {str(e)}", False
+        except Exception as e:
+            return f"Error inesperado: {str(e)}", False
+
+    async def chat_stream(
+        self,
+        message: str,
+        context: Optional[str] = None,
+        history: Optional[List[Tuple[str, str]]] = None,
+        user_id: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Igual que ``chat`` pero usando ``stream: true`` de Ollama.
+
+        Produce eventos a medida que el modelo genera tokens:
+
+        - ``{"type": "start"}`` en cuanto la petición obtiene plaza en la cola.
+        - ``{"type": "token", "content": "..."}`` por cada fragmento de texto.
+        - ``{"type": "tool", "name": "..."}`` cuando se ejecuta una herramienta
+          entre rondas.
+        - ``{"type": "done", "response": "..."}`` al final, con el texto completo
+          de la última ronda (el que se debe persistir).
+
+        Los errores no se propagan: igual que en ``chat``, el texto del error se
+        emite como respuesta final para que el cliente y el historial lo reflejen.
+        La excepción es ``AdmissionRejected``, que se lanza antes del evento
+        ``start`` si no hay plaza.
+        """
+        messages = self._build_messages(message, context, history)
+
+        async with self.admission.slot(user_id):
+            yield {"type": "start"}
+            async for event in self._stream_rounds(messages, user_id):
+                yield event
+
+    async def _stream_rounds(
+        self,
+        messages: List[Dict[str, Any]],
+        user_id: Optional[str],
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Rondas de /api/chat con ``stream: true``; ver ``chat_stream``."""
+        tool_cache = self.tool_caches.for_turn(user_id)
+        encoded: List[bytes] = []
+        try:
+            for _ in range(OLLAMA_MAX_ROUND_FOR_TOOL_CALL):
+                round_content: List[str] = []
+                tool_calls: List[Dict[str, Any]] = []
+                round_started = time.perf_counter()
+
+                async with self.pool.acquire(user_id) as node, self.client.stream(
+                    "POST",
+                    f"{node.url}{self.api_chat}",
+                    content=self._encode_payload(messages, stream=True, encoded=encoded),
+                    headers=JSON_HEADERS,
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        chunk: Dict[str, Any] = loads(line)
+                        msg = chunk.get("message") or {}
+                        if msg.get("tool_calls"):
+                            tool_calls.extend(msg["tool_calls"])
+                        content = msg.get("content") or chunk.get("response")
+                        if content:
+                            round_content.append(content)
+                            yield {"type": "token", "content": content}
+                        if chunk.get("done"):
+                            self._record_prompt_eval(chunk)
+                            break
+                record_span("ollama_round", time.perf_counter() - round_started)
+
+                if tool_calls:
+                    for name in await self._run_tool_calls(tool_calls, messages, tool_cache):
+                        yield {"type": "tool", "name": name}
+                    continue
+
+                yield {"type": "done", "response": "".join(round_content) or FALLBACK_RESPONSE}
+                return
+
+            yield {"type": "done", "response": FALLBACK_RESPONSE}
         except httpx.HTTPError as e:
-            return f"Error al conectar con el servicio de Ollama: {str(e)}"
+            yield {"type": "done", "response": f"Error al conectar con el servicio de Ollama: {str(e)}"}
         except Exception as e:
-            return f"Error inesperado: {str(e)}"
+            yield {"type": "done", "response": f"Error inesperado: {str(e)}"}
 
+    async def summarize(
+        self,
+        previous: Optional[str],
+        turns: List[Tuple[str, str]],
+        user_id: Optional[str] = None,
+    ) -> Optional[str]:
+        """Resumir turnos antiguos de una conversación (sin herramientas).
+
+        Args:
+            previous: Resumen anterior de la conversación, si lo hay.
+            turns: Turnos ``(usuario, asistente)`` a incorporar, en orden cronológico.
+            user_id: Conversación resumida (comparte backend con sus turnos, pero
+                espera en la cola de segundo plano, fuera del límite por usuario).
+
+        Returns:
+            El nuevo resumen, o ``None`` si Ollama no está disponible.
+        """
+        transcript = "\n".join(f"Usuario: {u}\nAsistente: {b}" for u, b in turns)
+        content = f"Resumen anterior: {previous}\n\n" if previous else ""
+        content += f"Conversación a resumir:\n{transcript}"
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": content},
+            ],
+            "stream": False,
+        }
+        if OLLAMA_KEEP_ALIVE:
+            payload["keep_alive"] = OLLAMA_KEEP_ALIVE
+        try:
+            async with self.admission.slot(user_id, background=True):
+                response = await self._post_chat(dumps(payload), user_id)
+        except (AdmissionRejected, httpx.HTTPError) as e:
+            logger.warning("No se pudo resumir la conversación %s: %s", user_id, e)
+            return None
+        data = loads(response.content)
+        summary = (data.get("message") or {}).get("content") or data.get("response")
+        return summary.strip() if summary else None
 
     async def close(self):
         """Cerrar el cliente HTTP"""
@@ -186,6 +337,274 @@ class OllamaService:
     # -------------------------
     # Utilidades internas
     # -------------------------
+    def _build_messages(
+        self,
+        message: str,
+        context: Optional[str],
+        history: Optional[List[Tuple[str, str]]],
+    ) -> List[Dict[str, Any]]:
+        """Construye la lista de mensajes (formato chat) para el modelo.
+
+        El orden está pensado para que Ollama reutilice la caché del prompt:
+        primero el prompt del sistema (idéntico en todas las peticiones), luego
+        el historial (que solo crece) y al final lo que cambia en cada turno,
+        el contexto adicional y el mensaje actual.
+        """
+        messages: List[Dict[str, Any]] = [SYSTEM_MESSAGE]
+
+        # Incluir historial previo (si existe) en formato chat
+        if history:
+            for u, b in history:
+                if u:
+                    messages.append({"role": "user", "content": u})
+                if b:
+                    messages.append({"role": "assistant", "content": b})
+
+        # Contexto dinámico después del prefijo estable
+        if context:
+            messages.append({"role": "system", "content": f"Contexto adicional: {context}"})
+
+        # Mensaje actual del usuario
+        messages.append({"role": "user", "content": message})
+        return messages
+
+    def _encode_payload(
+        self,
+        messages: List[Dict[str, Any]],
+        stream: bool,
+        encoded: Optional[List[bytes]] = None,
+    ) -> bytes:
+        """Cuerpo JSON de la petición a /api/chat.
+
+        ``encoded`` acumula los mensajes ya codificados del turno, para que cada
+        ronda solo codifique los nuevos (ver ``ChatPayloadEncoder``).
+        """
+        key = (self.model, id(self.tools), OLLAMA_KEEP_ALIVE)
+        if self._encoder_key != key:
+            self._encoder = ChatPayloadEncoder(self.model, self.tools, OLLAMA_KEEP_ALIVE, SYSTEM_MESSAGE)
+            self._encoder_key = key
+        return self._encoder.encode(messages, stream, encoded)
+
+    def _current_prompt_version(self) -> str:
+        """``prompt_version`` de ``MASTER_PROMPT`` y ``self.tools``; solo se recalcula si cambian"""
+        key = (MASTER_PROMPT, id(self.tools))
+        if self._prompt_version_key != key:
+            self._prompt_version = prompt_version(MASTER_PROMPT, self.tools)
+            self._prompt_version_key = key
+        return self._prompt_version
+
+    async def _post_chat(self, body: bytes, user_id: Optional[str]) -> httpx.Response:
+        """POST a /api/chat en un backend del pool, probando otro si el elegido falla."""
+        if LOG_PAYLOADS:
+            payload_logger.info("Petición a Ollama", extra={"payload": body.decode("utf-8")})
+        tried: List[OllamaNode] = []
+        while True:
+            try:
+                async with self.pool.acquire(user_id, exclude=tried) as node:
+                    tried.append(node)
+                    response = await self.client.post(
+                        f"{node.url}{self.api_chat}", content=body, headers=JSON_HEADERS
+                    )
+                    response.raise_for_status()
+                    return response
+            except httpx.HTTPError as e:
+                if not OllamaPool.is_node_failure(e) or len(tried) >= len(self.pool.nodes):
+                    raise
+                logger.warning("Reintentando la petición a Ollama en otro backend")
+
+    def _record_prompt_eval(self, data: Dict[str, Any]):
+        """Registrar ``prompt_eval_count``/``prompt_eval_duration`` de una ronda.
+
+        Ollama solo cuenta los tokens del prompt que tuvo que evaluar, así que un
+        valor bajo frente al tamaño del prompt indica que reutilizó el prefijo.
+        También alimenta las métricas de evaluación y generación (``eval_*``).
+        """
+        count = int(data.get("prompt_eval_count") or 0)
+        duration = int(data.get("prompt_eval_duration") or 0)
+        eval_count = int(data.get("eval_count") or 0)
+        eval_duration = int(data.get("eval_duration") or 0)
+        ollama_prompt_tokens.inc(count)
+        ollama_eval_tokens.inc(eval_count)
+        if duration:
+            ollama_prompt_eval_seconds.observe(duration / 1e9)
+            record_span("ollama_prompt_eval", duration / 1e9)
+        if eval_duration:
+            ollama_eval_seconds.observe(eval_duration / 1e9)
+            record_span("ollama_eval", eval_duration / 1e9)
+        stats = self.prompt_stats
+        stats["rounds"] += 1
+        stats["prompt_eval_count"] += count
+        stats["prompt_eval_duration_ns"] += duration
+        stats["last_prompt_eval_count"] = count
+        stats["last_prompt_eval_duration_ns"] = duration
+        logger.info(
+            "Ollama prompt_eval_count=%s prompt_eval_duration_ms=%.1f",
+            count,
+            duration / 1e6,
+        )
+
+    async def _run_tool_calls(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        messages: List[Dict[str, Any]],
+        tool_cache: Optional[ToolResultCache] = None,
+    ) -> List[str]:
+        """Ejecuta las tool calls de una ronda y añade sus resultados a ``messages``.
+
+        Las herramientas de solo lectura consecutivas se ejecutan a la vez en el
+        executor de base de datos; las de escritura van de una en una y, entre
+        conversaciones, serializadas por cita (o por franja al crear). Los
+        resultados se añaden siempre en el orden en que el modelo los pidió.
+
+        Si se pasa ``tool_cache``, las lecturas con los mismos argumentos que una
+        anterior (y sin escrituras de citas entremedias) reutilizan su resultado.
+
+        Returns:
+            Nombres de las herramientas solicitadas, en el orden recibido.
+        """
+        parsed = [self._parse_tool_call(tc) for tc in tool_calls]
+        payloads: List[Dict[str, Any]] = []
+
+        i = 0
+        while i < len(parsed):
+            fn, args, _, _ = parsed[i]
+            if _is_read_only(fn):
+                # Agrupar las lecturas consecutivas
+                j = i
+                while j < len(parsed) and _is_read_only(parsed[j][0]):
+                    j += 1
+                payloads.extend(await asyncio.gather(
+                    *(self._execute_tool(p[0], p[1], tool_cache) for p in parsed[i:j])
+                ))
+                i = j
+                continue
+            if fn is not None:
+                async with self._write_lock(self._write_lock_key(fn.__name__, args)):
+                    payloads.append(await self._execute_tool(fn, args))
+            else:
+                payloads.append({"ok": False, "result": None, "error": "Tool no encontrada"})
+            i += 1
+
+        names: List[str] = []
+        for (fn, _, tool_call_id, name), result_payload in zip(parsed, payloads):
+            # Añadir mensaje de rol tool con el resultado
+            tool_msg: Dict[str, Any] = {
+                "role": "tool",
+                "content": dumps_str(result_payload),
+            }
+            if tool_call_id:
+                tool_msg["tool_call_id"] = tool_call_id
+            if fn:
+                tool_msg["name"] = fn.__name__
+            messages.append(tool_msg)
+            names.append(fn.__name__ if fn else str(name))
+        return names
+
+    def _parse_tool_call(
+        self, tc: Dict[str, Any]
+    ) -> Tuple[Optional[Callable[..., Any]], Dict[str, Any], Optional[str], Optional[str]]:
+        """Extrae función, argumentos, id y nombre de una tool call."""
+        fn = None
+        args: Dict[str, Any] = {}
+        tool_call_id = tc.get("id") or tc.get("tool_call_id")
+        name = None
+
+        # Estructura tipo OpenAI-like
+        if isinstance(tc, dict):
+            func_obj = tc.get("function") or {}
+            name = func_obj.get("name") or tc.get("name")
+            raw_args = func_obj.get("arguments") or tc.get("arguments")
+            if isinstance(raw_args, str):
+                try:
+                    args = json.loads(raw_args) if raw_args else {}
+                except Exception:
+                    # Si no parsea, intentar como dict literal
+                    try:
+                        args = json.loads(raw_args.replace("'", '"'))
+                    except Exception:
+                        args = {}
+            elif isinstance(raw_args, dict):
+                args = raw_args
+            else:
+                args = {}
+            fn = self._resolve_tool(name)
+        return fn, args, tool_call_id, name
+
+    async def _execute_tool(
+        self,
+        fn: Callable[..., Any],
+        args: Dict[str, Any],
+        tool_cache: Optional[ToolResultCache] = None,
+    ) -> Dict[str, Any]:
+        """Ejecuta una herramienta y devuelve su resultado en formato JSON-friendly."""
+        result_payload: Dict[str, Any] = {
+            "ok": False,
+            "result": None,
+            "error": None,
+        }
+        cache_key = None
+        hit = False
+        started = time.perf_counter()
+        try:
+            coerced_args = self._coerce_args_for_function(fn.__name__, args)
+            if tool_cache is not None and _is_read_only(fn):
+                cache_key = tool_cache_key(fn.__name__, coerced_args)
+                cached = tool_cache.get(cache_key)
+                if cached is not None:
+                    result_payload, hit = cached, True
+                    return result_payload
+            version = slot_index.version
+            # Las herramientas abren sesiones síncronas: fuera del event loop
+            result = await run_db(fn, **coerced_args)
+            # Se serializa una sola vez al crear el mensaje de la herramienta;
+            # los modelos (p. ej. Appointment) salen como su model_dump
+            result_payload["ok"] = True
+            result_payload["result"] = result
+            if cache_key is not None:
+                tool_cache.put(cache_key, result_payload, version)
+        except local_tools.SlotConflict as e:
+            # Conflicto esperado: el modelo recibe la franja y las alternativas
+            logger.info("Franja ocupada en %s: %s", fn.__name__, e.slot)
+            result_payload["error"] = str(e)
+            result_payload["conflict"] = e.to_dict()
+        except Exception as e:  # noqa: BLE001
+            logger.exception("Error ejecutando herramienta %s", fn.__name__)
+            result_payload["error"] = str(e)
+        finally:
+            elapsed = time.perf_counter() - started
+            tool_seconds.observe(
+                elapsed, tool=fn.__name__, ok=str(result_payload["ok"]).lower(), cached=str(hit).lower()
+            )
+            record_span("tool", elapsed)
+        return result_payload
+
+    def _write_lock_key(self, fn_name: str, args: Dict[str, Any]) -> str:
+        """Clave de serialización de una herramienta de escritura."""
+        if fn_name == "save_appointment":
+            # Las altas compiten por la franja, no por una cita existente: la
+            # misma clave que el índice único, así "10:00+02:00" y "08:15Z"
+            # comparten lock
+            when = self._coerce_args_for_function(fn_name, args).get("date")
+            if isinstance(when, datetime):
+                return f"slot:{slot_key(when)}"
+            return f"slot:{when}"
+        return f"appointment:{args.get('appointment_id')}"
+
+    @asynccontextmanager
+    async def _write_lock(self, key: str) -> AsyncIterator[None]:
+        """Lock por clave que se descarta cuando nadie lo usa."""
+        entry = self._write_locks.get(key)
+        if entry is None:
+            entry = self._write_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._write_locks[key]
+
     def _resolve_tool(self, name: Optional[str]):
         """Mapea el nombre de la herramienta a una función local en src.tools"""
         if not name:
@@ -193,6 +612,7 @@ class OllamaService:
         mapping = {
             "get_appointment_lists": local_tools.get_appointment_lists,
             "check_occupied_slots": local_tools.check_occupied_slots,
+            "find_free_slots": local_tools.find_free_slots,
             "save_appointment": local_tools.save_appointment,
             "update_appointment": local_tools.update_appointment,
             "delete_appointment": local_tools.delete_appointment,
@@ -214,7 +634,7 @@ class OllamaService:
                 return None
 
         coerced = dict(args)
-        if fn_name in ("get_appointment_lists",):
+        if fn_name in ("get_appointment_lists", "find_free_slots"):
             coerced["start"] = parse_iso(args.get("start")) or args.get("start")
             coerced["end"] = parse_iso(args.get("end")) or args.get("end")
             # limit debe ser int
@@ -51,10 +51,36 @@ TOOLS = [
             "additionalProperties": False,
         },
     },
+    {
+        "type": "function",
+        "name": "find_free_slots",
+        "description": "Find the next free 30-minute slots within working hours. Use it to propose available times instead of probing them one by one.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "start": {
+                    "type": "string",
+                    "format": "date-time",
+                    "description": "Search from this datetime (inclusive) in ISO 8601. Optional (default now)."
+                },
+                "end": {
+                    "type": "string",
+                    "format": "date-time",
+                    "description": "Search until this datetime in ISO 8601. Optional."
+                },
+                "limit": {
+                    "type": "integer",
+                    "minimum": 1,
+                    "description": "Max number of free slots to return. Optional (default 5)."
+                }
+            },
+            "additionalProperties": False,
+        },
+    },
     {
         "type": "function",
         "name": "save_appointment",
-        "description": "Save appointment on database",
+        "description": "Save appointment on database. If the 30-minute slot is already booked it fails with conflict.code 'slot_taken' and free alternatives.",
         "parameters": {
             "type": "object",
             "properties": {
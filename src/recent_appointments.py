@@ -0,0 +1,60 @@
+# src/recent_appointments.py
+import threading
+from typing import Optional
+
+from sqlmodel import Session, select
+
+from src.models import Appointment
+from src.slot_index import slot_index
+
+
+class RecentAppointmentsContext:
+    """Bloque "Citas recientes" del contexto del chat, memoizado por versión.
+
+    Las citas cambian mucho menos que los mensajes, así que el bloque se
+    reconstruye solo cuando cambia ``slot_index.version``, que se incrementa en
+    cada alta, modificación o baja (rutas REST y herramientas del modelo).
+    """
+
+    def __init__(self, limit: int = 5):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._text: Optional[str] = None
+        self.rebuilds = 0
+
+    def get(self, session: Session) -> Optional[str]:
+        """Texto del bloque, o ``None`` si no hay citas."""
+        version = slot_index.version
+        with self._lock:
+            if self._version == version:
+                return self._text
+
+        appointments = session.exec(
+            select(Appointment)
+            .order_by(Appointment.date.desc()).limit(self.limit)
+        ).all()
+        text = None
+        if appointments:
+            text = "Citas recientes: " + ", ".join([
+                f"{apt.name} el {apt.date.strftime('%Y-%m-%d %H:%M')}"
+                for apt in appointments
+            ])
+
+        with self._lock:
+            # Se guarda con la versión leída antes de consultar: si hubo una
+            # escritura mientras tanto, la próxima llamada vuelve a construirlo
+            self._version = version
+            self._text = text
+            self.rebuilds += 1
+        return text
+
+    def invalidate(self):
+        """Forzar la reconstrucción en la próxima llamada"""
+        with self._lock:
+            self._version = None
+            self._text = None
+
+
+# Instancia global del contexto de citas recientes
+recent_appointments_context = RecentAppointmentsContext()
@@ -0,0 +1,90 @@
+# src/response_cache.py
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS
+
+
+def prompt_version(system_prompt: str, tools: List[Dict[str, Any]]) -> str:
+    """Huella del prompt de sistema y de las herramientas ofrecidas al modelo"""
+    digest = hashlib.sha256(system_prompt.encode("utf-8"))
+    digest.update(json.dumps(tools, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def normalize_message(message: str) -> str:
+    """Mensaje sin diferencias de mayúsculas ni de espacios"""
+    return " ".join(message.casefold().split())
+
+
+class ResponseCache:
+    """Caché LRU/TTL de respuestas a primeros turnos sin herramientas.
+
+    La clave combina el mensaje normalizado, el modelo, la versión del prompt
+    (``prompt_version``) y el contexto enviado al modelo, así que un cambio en
+    ``MASTER_PROMPT``, en las herramientas o en las citas recientes del
+    contexto da una clave distinta. Con ``ttl_seconds`` a 0 está desactivada.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    @staticmethod
+    def key(message: str, model: str, version: str, context: Optional[str]) -> str:
+        raw = "\x00".join([normalize_message(message), model, version, context or ""])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Respuesta cacheada o ``None`` si no está o ha caducado."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, response: str):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Vaciar la caché y reiniciar los contadores"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de uso de la caché"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -70,4 +70,24 @@ class AppointmentListResponse(BaseModel):
     """Esquema para lista de citas"""
     appointments: list[AppointmentResponse]
     total: int
+    # Cursor para pedir la página siguiente (None si no hay más)
+    next_after_date: Optional[datetime] = None
+    next_after_id: Optional[int] = None
 
+
+
+class AppointmentImportError(BaseModel):
+    """Error de una fila durante la importación masiva"""
+    line: int
+    error: str
+
+
+class AppointmentImportResponse(BaseModel):
+    """Resultado de la importación masiva de citas"""
+    imported: int
+    errors: list[AppointmentImportError]
+
+
+class FreeSlotsResponse(BaseModel):
+    """Esquema para franjas libres de 30 minutos"""
+    slots: list[datetime]
@@ -0,0 +1,69 @@
+# src/serialization.py
+from typing import Any, Dict, List, Optional
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def _default(obj: Any) -> Any:
+    """Tipos que el codificador no conoce: modelos pydantic/SQLModel y, si no, su texto"""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    return str(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """JSON compacto en UTF-8 (sin escapar acentos), con orjson.
+
+    ``datetime`` sale en ISO 8601 y los modelos pydantic como su ``model_dump``.
+    """
+    return orjson.dumps(obj, default=_default)
+
+
+def dumps_str(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    return orjson.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """Respuesta JSON de FastAPI codificada con ``dumps``"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class ChatPayloadEncoder:
+    """Cuerpo de las peticiones a /api/chat de Ollama, ya codificado.
+
+    El modelo, las herramientas, ``keep_alive`` y el mensaje de sistema son
+    iguales en todas las peticiones: se codifican una vez al crear el encoder.
+    En cada ronda solo se codifican los mensajes nuevos; ``encoded`` guarda los
+    ya codificados de las rondas anteriores del mismo turno (la lista de
+    mensajes solo crece).
+    """
+
+    def __init__(
+        self,
+        model: str,
+        tools: List[Dict[str, Any]],
+        keep_alive: Optional[str],
+        system_message: Dict[str, Any],
+    ):
+        head: Dict[str, Any] = {"model": model, "tools": tools}
+        if keep_alive:
+            head["keep_alive"] = keep_alive
+        # '{"model":...,"tools":[...]' + ',"messages":['
+        self._head = dumps(head)[:-1] + b',"messages":['
+        self._system_message = system_message
+        self._system = dumps(system_message)
+        self._tails = {True: b'],"stream":true}', False: b'],"stream":false}'}
+
+    def encode(self, messages: List[Dict[str, Any]], stream: bool, encoded: Optional[List[bytes]] = None) -> bytes:
+        if encoded is None:
+            encoded = []
+        for message in messages[len(encoded):]:
+            encoded.append(self._system if message is self._system_message else dumps(message))
+        return self._head + b",".join(encoded) + self._tails[stream]
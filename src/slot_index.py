@@ -0,0 +1,260 @@
+# src/slot_index.py
+import logging
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, Collection, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlmodel import Session, select
+
+from src.models import Appointment
+
+
+logger = logging.getLogger(__name__)
+
+# Cada cita ocupa media hora (ver MASTER_PROMPT)
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+
+def normalize_datetime(dt: datetime) -> datetime:
+    """Pasar un datetime con zona horaria a UTC naive (como se guarda en la BdD)."""
+    if dt.tzinfo is not None:
+        return dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def slot_of(dt: datetime) -> Tuple[date, int]:
+    """Día y número de franja de 30 minutos (0..47) en la que cae ``dt``."""
+    dt = normalize_datetime(dt)
+    return dt.date(), (dt.hour * 60 + dt.minute) // SLOT_MINUTES
+
+
+def slot_start(day: date, slot: int) -> datetime:
+    """Inicio de la franja ``slot`` del día ``day``."""
+    return datetime.combine(day, time()) + timedelta(minutes=slot * SLOT_MINUTES)
+
+
+def slot_key(dt: datetime) -> str:
+    """Clave de la franja de ``dt``: su inicio en UTC como ``"AAAA-MM-DDTHH:MM"``."""
+    return slot_start(*slot_of(dt)).isoformat(timespec="minutes")
+
+
+@event.listens_for(Appointment, "before_insert")
+def _set_slot_key(_mapper, _connection, appointment: Appointment):
+    # Cualquier alta pasa por el índice único de slot_key. La fecha se guarda
+    # en UTC naive, la misma que da la clave: "11:45+02:00" y "09:45" son la
+    # misma cita
+    appointment.date = normalize_datetime(appointment.date)
+    appointment.slot_key = slot_key(appointment.date)
+
+
+@event.listens_for(Appointment, "before_update")
+def _update_slot_key(_mapper, _connection, appointment: Appointment):
+    # Solo un cambio de fecha mueve la cita de franja; editar otros campos de
+    # una cita antigua sin slot_key (franja repetida) no debe chocar
+    if inspect(appointment).attrs.date.history.has_changes():
+        _set_slot_key(_mapper, _connection, appointment)
+
+
+def iter_bits(mask: int) -> Iterable[int]:
+    """Posiciones de los bits a 1 de ``mask``, de menor a mayor."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def working_mask(start: time, end: time) -> int:
+    """Bitmap con las franjas que caben enteras entre ``start`` y ``end``."""
+    first = -(-(start.hour * 60 + start.minute) // SLOT_MINUTES)  # redondeo hacia arriba
+    last = (end.hour * 60 + end.minute) // SLOT_MINUTES  # exclusivo
+    if last <= first:
+        return 0
+    return ((1 << last) - 1) & ~((1 << first) - 1)
+
+
+def find_free(
+    day_bitmap: Callable[[date], int],
+    start: datetime,
+    end: datetime,
+    limit: int,
+    work_mask: int,
+    work_days: Collection[int],
+) -> List[datetime]:
+    """Primeras ``limit`` franjas libres entre ``start`` y ``end``.
+
+    Recorre los días una sola vez: para cada uno calcula
+    ``work_mask & ~ocupadas`` y extrae los bits libres, sin probar franja a franja.
+
+    Args:
+        day_bitmap: Devuelve el bitmap de franjas ocupadas de un día.
+        start: Inicio del rango; se redondea a la siguiente franja completa.
+        end: Fin del rango (una franja libre debe empezar antes de ``end``).
+        limit: Máximo de franjas a devolver.
+        work_mask: Franjas del horario de atención (ver ``working_mask``).
+        work_days: Días laborables (``date.weekday()``).
+    """
+    start = normalize_datetime(start)
+    end = normalize_datetime(end)
+    start_day, start_slot = slot_of(start)
+    if slot_start(start_day, start_slot) < start:
+        start_slot += 1
+    end_day, end_slot = slot_of(end)
+    if slot_start(end_day, end_slot) == end:
+        end_slot -= 1
+
+    free: List[datetime] = []
+    day = start_day
+    while day <= end_day and len(free) < limit:
+        if day.weekday() in work_days:
+            lo = start_slot if day == start_day else 0
+            hi = end_slot if day == end_day else SLOTS_PER_DAY - 1
+            mask = ((1 << (hi + 1)) - 1) & ~((1 << lo) - 1) if hi >= lo else 0
+            for slot in iter_bits(work_mask & mask & ~day_bitmap(day)):
+                free.append(slot_start(day, slot))
+                if len(free) >= limit:
+                    break
+        day += timedelta(days=1)
+    return free
+
+
+class SlotIndex:
+    """Índice en memoria de la ocupación de franjas de 30 minutos.
+
+    Por cada día guarda un bitmap de 48 bits (una franja por bit) y, por cada
+    franja ocupada, los IDs de las citas que caen en ella. Así las consultas de
+    ocupación se resuelven en O(franjas) sin tocar la base de datos.
+
+    Se construye desde la tabla al arrancar (``rebuild``) y cada ruta que crea,
+    modifica o borra citas lo mantiene al día con ``add``/``remove``. Mientras no
+    se haya construido (``loaded`` es ``False``) los llamadores deben consultar
+    la base de datos.
+
+    ``version`` se incrementa con cada cambio, así que también sirve como
+    contador de versión de las citas para invalidar cachés derivadas.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._days: Dict[date, int] = {}
+        self._slots: Dict[Tuple[date, int], Set[int]] = {}
+        self._appointments: Dict[int, Appointment] = {}
+        self.loaded = False
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._appointments)
+
+    def clear(self):
+        """Vaciar el índice y marcarlo como no construido"""
+        with self._lock:
+            self._days.clear()
+            self._slots.clear()
+            self._appointments.clear()
+            self.loaded = False
+            self.version += 1
+
+    def rebuild(self, session: Session):
+        """Reconstruir el índice completo a partir de la tabla de citas"""
+        appointments = session.exec(select(Appointment)).all()
+        with self._lock:
+            self.clear()
+            for appointment in appointments:
+                self._insert(appointment)
+            self.loaded = True
+        logger.info("Índice de franjas construido con %s citas", len(appointments))
+
+    def add(self, appointment: Appointment):
+        """Registrar una cita nueva o actualizar la posición de una existente"""
+        if appointment.id is None:
+            return
+        with self._lock:
+            self._discard(appointment.id)
+            self._insert(appointment)
+            self.version += 1
+
+    def remove(self, appointment_id: int):
+        """Quitar una cita del índice (si estaba)"""
+        with self._lock:
+            self._discard(appointment_id)
+            self.version += 1
+
+    def day_bitmap(self, day: date) -> int:
+        """Bitmap de franjas ocupadas del día ``day`` (0 si está libre)."""
+        return self._days.get(day, 0)
+
+    def is_taken(self, dt: datetime, exclude_id: Optional[int] = None) -> bool:
+        """Indica si la franja de ``dt`` ya tiene alguna cita (salvo ``exclude_id``)."""
+        key = slot_of(dt)
+        with self._lock:
+            ids = self._slots.get(key)
+            if not ids:
+                return False
+            return any(i != exclude_id for i in ids)
+
+    def occupied(self, start: datetime, end: datetime) -> List[Appointment]:
+        """Citas cuyo ``date`` está en ``[start, end]``, ordenadas por fecha.
+
+        Devuelve copias desligadas de la sesión, para que los llamadores no
+        puedan alterar el índice.
+        """
+        start = normalize_datetime(start)
+        end = normalize_datetime(end)
+        start_day, start_slot = slot_of(start)
+        end_day, end_slot = slot_of(end)
+
+        found: List[Appointment] = []
+        with self._lock:
+            span = (end_day - start_day).days + 1
+            if span <= len(self._days):
+                days = (start_day + timedelta(days=i) for i in range(span))
+            else:
+                days = sorted(d for d in self._days if start_day <= d <= end_day)
+
+            for day in days:
+                bitmap = self._days.get(day)
+                if not bitmap:
+                    continue
+                lo = start_slot if day == start_day else 0
+                hi = end_slot if day == end_day else SLOTS_PER_DAY - 1
+                mask = ((1 << (hi + 1)) - 1) & ~((1 << lo) - 1)
+                for slot in iter_bits(bitmap & mask):
+                    for appointment_id in self._slots[(day, slot)]:
+                        appointment = self._appointments[appointment_id]
+                        if start <= appointment.date <= end:
+                            found.append(Appointment(**appointment.model_dump()))
+
+        found.sort(key=lambda a: (a.date, a.id))
+        return found
+
+    # -------------------------
+    # Utilidades internas (llamar con el lock tomado)
+    # -------------------------
+    def _insert(self, appointment: Appointment):
+        snapshot = Appointment(**appointment.model_dump())
+        snapshot.date = normalize_datetime(snapshot.date)
+        day, slot = slot_of(snapshot.date)
+        self._appointments[snapshot.id] = snapshot
+        self._slots.setdefault((day, slot), set()).add(snapshot.id)
+        self._days[day] = self._days.get(day, 0) | (1 << slot)
+
+    def _discard(self, appointment_id: int):
+        previous = self._appointments.pop(appointment_id, None)
+        if previous is None:
+            return
+        day, slot = slot_of(previous.date)
+        ids = self._slots.get((day, slot))
+        if ids is not None:
+            ids.discard(appointment_id)
+            if not ids:
+                del self._slots[(day, slot)]
+                bitmap = self._days.get(day, 0) & ~(1 << slot)
+                if bitmap:
+                    self._days[day] = bitmap
+                else:
+                    self._days.pop(day, None)
+
+
+# Instancia global del índice
+slot_index = SlotIndex()
@@ -0,0 +1,83 @@
+# src/tool_cache.py
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from src.slot_index import slot_index
+
+
+def tool_cache_key(fn_name: str, coerced_args: Dict[str, Any]) -> str:
+    """Clave estable para una herramienta y sus argumentos ya normalizados."""
+    return fn_name + ":" + json.dumps(coerced_args, sort_keys=True, default=str)
+
+
+class ToolResultCache:
+    """Resultados de herramientas de solo lectura, invalidados por escrituras.
+
+    Cada entrada guarda la ``slot_index.version`` del momento en que se
+    calculó; cualquier alta, modificación o baja de citas (herramienta o ruta
+    REST) cambia la versión y deja obsoletas todas las entradas. ``ttl_seconds``
+    limita además su antigüedad cuando la caché vive más que un turno.
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_entries: int = 128):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[int, float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            version, stored_at, payload = entry
+            expired = self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds
+            if version == slot_index.version and not expired:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(payload)
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, payload: Dict[str, Any], version: int):
+        """Guardar un resultado calculado con la versión de citas ``version``"""
+        self._entries[key] = (version, time.monotonic(), dict(payload))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class UserToolCaches:
+    """Cachés de herramientas por usuario con TTL corto (opcional).
+
+    Con ``ttl_seconds`` a 0 cada turno usa una caché propia y vacía.
+    """
+
+    def __init__(self, ttl_seconds: float, max_users: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self._caches: "OrderedDict[str, ToolResultCache]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def for_turn(self, user_id: Optional[str]) -> ToolResultCache:
+        """Caché a usar durante un turno de ``user_id``"""
+        if not user_id or self.ttl_seconds <= 0:
+            return ToolResultCache()
+        with self._lock:
+            cache = self._caches.get(user_id)
+            if cache is None:
+                cache = self._caches[user_id] = ToolResultCache(ttl_seconds=self.ttl_seconds)
+            self._caches.move_to_end(user_id)
+            while len(self._caches) > self.max_users:
+                self._caches.popitem(last=False)
+            return cache
+
+    def clear(self):
+        with self._lock:
+            self._caches.clear()
@@ -1,16 +1,62 @@
 # src/tools.py
-from datetime import datetime
-from typing import List, Optional
+from datetime import datetime, time, timedelta
+from typing import Any, Dict, List, Optional
 import logging
 
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 
+from src.config import (
+    FREE_SLOTS_DEFAULT_LIMIT,
+    FREE_SLOTS_MAX_DAYS,
+    WORKING_DAYS,
+    WORKING_HOURS_END,
+    WORKING_HOURS_START,
+)
 from src.database import engine
 from src.models import Appointment
+from src.slot_index import (
+    SLOT_MINUTES,
+    find_free,
+    normalize_datetime,
+    slot_index,
+    slot_key,
+    slot_of,
+    working_mask,
+)
 
 
 logger = logging.getLogger(__name__)
 
+# Horario de atención ya interpretado
+WORK_MASK = working_mask(time.fromisoformat(WORKING_HOURS_START), time.fromisoformat(WORKING_HOURS_END))
+WORK_DAYS = frozenset(int(d) for d in WORKING_DAYS.split(",") if d.strip())
+
+# Franjas libres que se proponen cuando la pedida ya está ocupada
+SLOT_CONFLICT_ALTERNATIVES = 3
+
+
+class SlotConflict(ValueError):
+    """La franja de 30 minutos pedida ya tiene una cita.
+
+    ``to_dict`` da la versión estructurada (código, franja y alternativas
+    libres) que reciben el modelo y los clientes de la API.
+    """
+
+    code = "slot_taken"
+
+    def __init__(self, date: datetime, alternatives: Optional[List[str]] = None):
+        self.date = date
+        self.slot = slot_key(date)
+        self.alternatives = alternatives or []
+        message = f"El horario {date.isoformat()} ya está ocupado."
+        if self.alternatives:
+            message += f" Horarios libres cercanos: {', '.join(self.alternatives)}."
+        super().__init__(message)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"code": self.code, "slot": self.slot, "alternatives": self.alternatives}
+
 
 def get_appointment_lists(
     start: Optional[datetime] = None,
@@ -32,11 +78,12 @@ def get_appointment_lists(
     logger.info(
         "Iniciando get_appointment_lists(start=%s, end=%s, limit=%s)", start, end, limit
     )
-    start_dt = start or datetime.utcnow()
+    # Las fechas se guardan en UTC naive: un rango con zona horaria se convierte
+    start_dt = normalize_datetime(start or datetime.utcnow())
 
     stmt = select(Appointment).where(Appointment.date >= start_dt)
     if end is not None:
-        stmt = stmt.where(Appointment.date <= end)
+        stmt = stmt.where(Appointment.date <= normalize_datetime(end))
     stmt = stmt.order_by(Appointment.date.asc())
     if isinstance(limit, int) and limit > 0:
         stmt = stmt.limit(limit)
@@ -63,9 +110,15 @@ def check_occupied_slots(start: datetime, end: datetime) -> List[Appointment]:
     logger.info(
         "Iniciando check_occupied_slots(start=%s, end=%s)", start, end
     )
+    start = normalize_datetime(start)
+    end = normalize_datetime(end)
     if end < start:
         raise ValueError("El parámetro 'end' no puede ser anterior a 'start'.")
 
+    # Ruta rápida: el índice en memoria responde sin tocar la base de datos
+    if slot_index.loaded:
+        return slot_index.occupied(start, end)
+
     stmt = (
         select(Appointment)
         .where(Appointment.date >= start)
@@ -77,6 +130,78 @@ def check_occupied_slots(start: datetime, end: datetime) -> List[Appointment]:
         return list(session.exec(stmt).all())
 
 
+def find_free_slots(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: Optional[int] = FREE_SLOTS_DEFAULT_LIMIT,
+) -> List[str]:
+    """Buscar las próximas franjas libres de 30 minutos dentro del horario de atención.
+
+    Calcula la disponibilidad en una sola pasada sobre las citas reservadas, de
+    modo que el modelo no tenga que probar horarios uno a uno.
+
+    Args:
+        start: Desde cuándo buscar (incluido). Si es None, desde ahora.
+        end: Hasta cuándo buscar. Si es None, ``FREE_SLOTS_MAX_DAYS`` días desde ``start``.
+        limit: Máximo de franjas a devolver.
+
+    Returns:
+        Inicios de las franjas libres en ISO 8601, en orden cronológico.
+    """
+    logger.info(
+        "Iniciando find_free_slots(start=%s, end=%s, limit=%s)", start, end, limit
+    )
+    start_dt = normalize_datetime(start or datetime.utcnow())
+    max_end = start_dt + timedelta(days=FREE_SLOTS_MAX_DAYS)
+    end_dt = min(normalize_datetime(end), max_end) if end is not None else max_end
+    if end_dt < start_dt:
+        raise ValueError("El parámetro 'end' no puede ser anterior a 'start'.")
+    if not isinstance(limit, int) or limit <= 0:
+        limit = FREE_SLOTS_DEFAULT_LIMIT
+
+    if slot_index.loaded:
+        day_bitmap = slot_index.day_bitmap
+    else:
+        stmt = (
+            select(Appointment.date)
+            .where(Appointment.date >= start_dt - timedelta(minutes=SLOT_MINUTES))
+            .where(Appointment.date <= end_dt)
+        )
+        bitmaps = {}
+        with Session(engine) as session:
+            for booked in session.exec(stmt).all():
+                day, slot = slot_of(booked)
+                bitmaps[day] = bitmaps.get(day, 0) | (1 << slot)
+        day_bitmap = lambda day: bitmaps.get(day, 0)  # noqa: E731
+
+    free = find_free(day_bitmap, start_dt, end_dt, limit, WORK_MASK, WORK_DAYS)
+    return [slot.isoformat() for slot in free]
+
+
+def commit_appointment(session: Session, appointment: Appointment) -> Appointment:
+    """Guardar el alta o el cambio de ``appointment`` en una sola escritura.
+
+    No se comprueba antes si la franja está libre: el índice único de
+    ``slot_key`` hace que la inserción (o el cambio de fecha) falle de forma
+    atómica si otra petición ya la ha ocupado, sin bloquear la tabla.
+
+    Raises:
+        SlotConflict: Si la franja de ``appointment.date`` ya tiene otra cita.
+    """
+    date = appointment.date
+    session.add(appointment)
+    try:
+        session.commit()
+    except IntegrityError as e:
+        session.rollback()
+        if "slot_key" not in str(e.orig):
+            raise
+        raise SlotConflict(date, find_free_slots(start=date, limit=SLOT_CONFLICT_ALTERNATIVES)) from e
+    session.refresh(appointment)
+    slot_index.add(appointment)
+    return appointment
+
+
 def save_appointment(
     name: str,
     date: datetime,
@@ -95,6 +220,9 @@ def save_appointment(
 
     Returns:
         La instancia de ``Appointment`` creada y persistida.
+
+    Raises:
+        SlotConflict: Si la franja de 30 minutos de ``date`` ya está ocupada.
     """
     logger.info(
         "Iniciando save_appointment(name=%s, date=%s, email=%s, phone=%s)",
@@ -117,10 +245,7 @@ def save_appointment(
     )
 
     with Session(engine) as session:
-        session.add(appointment)
-        session.commit()
-        session.refresh(appointment)
-        return appointment
+        return commit_appointment(session, appointment)
 
 
 def update_appointment(
@@ -147,6 +272,7 @@ def update_appointment(
     Raises:
         LookupError: Si no existe la cita con el ID indicado.
         TypeError: Si ``date`` se proporciona y no es un ``datetime`` válido.
+        SlotConflict: Si la nueva ``date`` cae en una franja ya ocupada.
     """
     logger.info(
         "Iniciando update_appointment(id=%s, name=%s, date=%s, email=%s, phone=%s)",
@@ -176,11 +302,7 @@ def update_appointment(
             appt.description = description
 
         appt.updated_at = datetime.utcnow()
-
-        session.add(appt)
-        session.commit()
-        session.refresh(appt)
-        return appt
+        return commit_appointment(session, appt)
 
 
 def delete_appointment(appointment_id: int) -> bool:
@@ -202,4 +324,5 @@ def delete_appointment(appointment_id: int) -> bool:
             raise LookupError(f"No existe la cita con id={appointment_id}.")
         session.delete(appt)
         session.commit()
+        slot_index.remove(appointment_id)
         return True
@@ -0,0 +1,117 @@
+# src/warmup.py
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Collection, Dict, List, Optional
+
+from src.config import OLLAMA_KEEP_ALIVE, OLLAMA_KEEP_ALIVE_INTERVAL, OLLAMA_WARMUP
+from src.ollama_pool import OllamaNode
+from src.ollama_service import SYSTEM_MESSAGE, OllamaService, ollama_service
+from src.slot_index import slot_of
+from src.tools import WORK_DAYS, WORK_MASK
+
+
+logger = logging.getLogger(__name__)
+
+
+def in_business_hours(now: datetime, work_mask: int = WORK_MASK, work_days: Collection[int] = WORK_DAYS) -> bool:
+    """Indica si ``now`` cae dentro del horario de atención"""
+    _, slot = slot_of(now)
+    return now.weekday() in work_days and bool(work_mask >> slot & 1)
+
+
+class ModelWarmer:
+    """Precarga del modelo en cada backend y keep-alive en horario de atención.
+
+    ``warm_all`` pide a cada nodo una respuesta de un token con el prefijo
+    estático (prompt de sistema y herramientas), de modo que el modelo queda
+    cargado y ese prefijo en la caché de Ollama. ``start`` lo lanza en segundo
+    plano al arrancar y lo repite cada ``interval`` segundos mientras dure el
+    horario de atención; fuera de él Ollama descarga el modelo cuando vence
+    ``keep_alive``.
+    """
+
+    def __init__(
+        self,
+        service: OllamaService,
+        keep_alive: str = OLLAMA_KEEP_ALIVE,
+        interval: float = OLLAMA_KEEP_ALIVE_INTERVAL,
+        enabled: bool = OLLAMA_WARMUP,
+    ):
+        self.service = service
+        self.keep_alive = keep_alive
+        self.interval = interval
+        self.enabled = enabled
+        self.nodes: Dict[str, Dict[str, Any]] = {
+            node.url: {"state": "pending"} for node in service.pool.nodes
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    def payload(self) -> Dict[str, Any]:
+        """Petición de calentamiento: mismo prefijo que un turno real, un token de salida"""
+        payload = {
+            "model": self.service.model,
+            "messages": [SYSTEM_MESSAGE],
+            "tools": self.service.tools,
+            "stream": False,
+            "options": {"num_predict": 1},
+        }
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    async def warm_node(self, node: OllamaNode) -> bool:
+        status = self.nodes.setdefault(node.url, {})
+        status["state"] = "warming"
+        started = time.perf_counter()
+        try:
+            response = await self.service.client.post(f"{node.url}{self.service.api_chat}", json=self.payload())
+            response.raise_for_status()
+        except Exception as e:  # noqa: BLE001
+            logger.warning("No se pudo precargar el modelo en %s: %s", node.url, e)
+            status.update(state="failed", error=str(e))
+            return False
+        status.update(
+            state="ready",
+            error=None,
+            duration_ms=round((time.perf_counter() - started) * 1000, 1),
+            last_warm=datetime.utcnow().isoformat(timespec="seconds"),
+        )
+        return True
+
+    async def warm_all(self) -> List[bool]:
+        """Precargar el modelo en todos los backends a la vez"""
+        return await asyncio.gather(*(self.warm_node(node) for node in self.service.pool.nodes))
+
+    def start(self):
+        """Lanzar el calentamiento inicial y el keep-alive en segundo plano"""
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        await self.warm_all()
+        while True:
+            await asyncio.sleep(self.interval)
+            if in_business_hours(datetime.utcnow()):
+                await self.warm_all()
+
+    def status(self) -> Dict[str, Any]:
+        """Estado del calentamiento, para /health"""
+        return {
+            "enabled": self.enabled,
+            "ready": all(n.get("state") == "ready" for n in self.nodes.values()),
+            "keep_alive": self.keep_alive,
+            "nodes": self.nodes,
+        }
+
+
+# Instancia global del calentador
+model_warmer = ModelWarmer(ollama_service)
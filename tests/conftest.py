@@ -8,22 +8,40 @@ from unittest.mock import AsyncMock, patch
 
 from src.main import app, get_session
 from src.models import Appointment, ChatMessage
+from src.history_cache import history_cache
+from src.recent_appointments import recent_appointments_context
+from src.slot_index import slot_index
 
 
 # Base de datos en memoria para testing
-@pytest.fixture(name="session")
-def session_fixture():
-    """Crear una sesión de base de datos en memoria para testing"""
+@pytest.fixture(name="engine")
+def engine_fixture():
+    """Crear un motor de base de datos en memoria para testing"""
     engine = create_engine(
         "sqlite:///:memory:",
         connect_args={"check_same_thread": False},
         poolclass=StaticPool,
     )
     SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(name="session")
+def session_fixture(engine):
+    """Crear una sesión de base de datos en memoria para testing"""
     with Session(engine) as session:
         yield session
 
 
+@pytest.fixture(name="tools_engine")
+def tools_engine_fixture(engine, monkeypatch):
+    """Hacer que las herramientas de src.tools usen la BdD en memoria"""
+    monkeypatch.setattr("src.tools.engine", engine)
+    yield engine
+    slot_index.clear()
+
+
 @pytest.fixture(name="client")
 def client_fixture(session: Session):
     """Crear un cliente de prueba para FastAPI"""
@@ -31,9 +49,14 @@ def client_fixture(session: Session):
         return session
     
     app.dependency_overrides[get_session] = get_session_override
+    # El índice de franjas es global: construirlo sobre la BdD de este test
+    slot_index.rebuild(session)
+    recent_appointments_context.invalidate()
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
+    slot_index.clear()
+    history_cache.clear()
 
 
 @pytest.fixture(name="mock_ollama_service")
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.admission import AdmissionController, AdmissionRejected
+from src.ollama_service import ollama_service
+
+
+def _controller(**overrides) -> AdmissionController:
+    options = dict(max_concurrency=1, max_queue=10, max_queue_per_user=10, max_wait=5)
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+async def test_limits_concurrency():
+    """Nunca hay más turnos activos que max_concurrency"""
+    controller = _controller(max_concurrency=2)
+    running = peak = 0
+
+    async def turn(i):
+        nonlocal running, peak
+        async with controller.slot(f"user-{i}"):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(*(turn(i) for i in range(6)))
+
+    assert peak == 2
+    assert controller.active == 0 and controller.queued == 0
+
+
+async def test_queue_is_fair_between_users():
+    """Las plazas se reparten por turnos entre usuarios, no por orden de llegada"""
+    controller = _controller()
+    order = []
+    gate = asyncio.Event()
+
+    async def turn(user_id, n):
+        async with controller.slot(user_id):
+            if n == 0:
+                await gate.wait()
+            order.append(user_id)
+
+    tasks = [asyncio.create_task(turn("bloqueo", 0))]
+    await asyncio.sleep(0)
+    # "ana" encola tres peticiones antes de que "luis" encole una
+    for user_id in ["ana", "ana", "ana", "luis"]:
+        tasks.append(asyncio.create_task(turn(user_id, 1)))
+    await asyncio.sleep(0)
+    gate.set()
+    await asyncio.gather(*tasks)
+
+    assert order == ["bloqueo", "ana", "luis", "ana", "ana"]
+
+
+async def test_rejects_when_queue_is_full():
+    """Con la cola llena se rechaza al momento con 429"""
+    controller = _controller(max_queue=1)
+    gate = asyncio.Event()
+
+    async def hold():
+        async with controller.slot("a"):
+            await gate.wait()
+
+    holder = asyncio.create_task(hold())
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as exc:
+        async with controller.slot("b"):
+            pass
+    assert exc.value.status_code == 429
+    assert exc.value.retry_after >= 1
+
+    gate.set()
+    await asyncio.gather(holder, waiter)
+
+
+async def test_background_work_does_not_use_the_user_quota():
+    """Un resumen en cola no cuenta para max_queue_per_user de su usuario"""
+    controller = _controller(max_queue_per_user=1)
+    gate = asyncio.Event()
+
+    async def hold(user_id, background=False):
+        async with controller.slot(user_id, background=background):
+            await gate.wait()
+
+    tasks = [asyncio.create_task(hold("otro"))]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(hold("ana", background=True)))
+    tasks.append(asyncio.create_task(hold("ana", background=True)))
+    await asyncio.sleep(0)
+    # Con dos resúmenes de "ana" en cola, su mensaje todavía entra en la cola
+    tasks.append(asyncio.create_task(hold("ana")))
+    await asyncio.sleep(0)
+    assert controller.queued == 3
+    assert controller.rejected == 0
+
+    gate.set()
+    await asyncio.gather(*tasks)
+    assert controller.active == 0 and controller.queued == 0
+
+
+async def test_rejects_after_max_wait():
+    """Si la espera supera max_wait se rechaza con 503 y se libera la cola"""
+    controller = _controller(max_wait=0.01)
+    gate = asyncio.Event()
+
+    async def hold():
+        async with controller.slot("a"):
+            await gate.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as exc:
+        async with controller.slot("b"):
+            pass
+    assert exc.value.status_code == 503
+    assert controller.queued == 0
+
+    gate.set()
+    await holder
+    assert controller.active == 0
+
+
+def test_chat_route_returns_retry_after(client: TestClient, monkeypatch):
+    """El endpoint responde 429 con Retry-After cuando no hay plaza"""
+    controller = _controller(max_concurrency=0, max_queue=0)
+    monkeypatch.setattr(ollama_service, "admission", controller)
+
+    response = client.post("/api/chat", json={"message": "Hola"})
+    stream = client.post("/api/chat/stream", json={"message": "Hola"})
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert stream.status_code == 429
@@ -2,6 +2,7 @@
 import pytest
 from datetime import datetime, timedelta
 from fastapi.testclient import TestClient
+from sqlalchemy import text
 
 
 def test_create_appointment(client: TestClient, sample_appointment_data: dict):
@@ -220,3 +221,118 @@ def test_appointment_crud_flow(client: TestClient):
     get_response = client.get(f"/api/appointments/{appointment_id}")
     assert get_response.status_code == 404
 
+
+
+def test_create_appointment_slot_taken(client: TestClient, sample_appointment_data: dict):
+    """No se puede crear una cita en una franja de 30 minutos ya ocupada"""
+    assert client.post("/api/appointments", json=sample_appointment_data).status_code == 200
+
+    conflicting = sample_appointment_data.copy()
+    conflicting["date"] = "2024-12-20T15:20:00"
+    response = client.post("/api/appointments", json=conflicting)
+
+    assert response.status_code == 409
+    assert "ocupado" in response.json()["detail"].lower()
+    assert response.json()["code"] == "slot_taken"
+    assert response.json()["slot"] == "2024-12-20T15:00"
+
+
+def test_update_appointment_into_taken_slot(client: TestClient):
+    """Mover una cita a una franja ocupada devuelve 409 y deja la cita como estaba"""
+    client.post("/api/appointments", json={"name": "Ana", "date": "2025-01-06T09:00:00"})
+    other = client.post("/api/appointments", json={"name": "Luis", "date": "2025-01-06T11:00:00"}).json()
+
+    response = client.put(f"/api/appointments/{other['id']}", json={"date": "2025-01-06T09:10:00"})
+
+    assert response.status_code == 409
+    assert response.json()["alternatives"][0] == "2025-01-06T09:30:00"
+    assert client.get(f"/api/appointments/{other['id']}").json()["date"] == "2025-01-06T11:00:00"
+
+
+def test_dates_with_offset_are_stored_in_utc(client: TestClient):
+    """Una cita con zona horaria se guarda en UTC y ocupa esa franja, no la de la hora local"""
+    with_offset = client.post("/api/appointments", json={"name": "Ana", "date": "2025-01-06T11:45:00+02:00"})
+    assert with_offset.status_code == 200
+    assert with_offset.json()["date"] == "2025-01-06T09:45:00"
+
+    # Misma hora en UTC: ocupada; misma hora "de pared": es otra franja
+    same_slot = client.post("/api/appointments", json={"name": "Luis", "date": "2025-01-06T09:45:00"})
+    assert same_slot.status_code == 409
+    assert same_slot.json()["slot"] == "2025-01-06T09:30"
+    wall_clock = client.post("/api/appointments", json={"name": "Eva", "date": "2025-01-06T11:45:00"})
+    assert wall_clock.status_code == 200
+    assert wall_clock.json()["date"] == "2025-01-06T11:45:00"
+
+
+def test_update_without_date_keeps_legacy_slot_key(client: TestClient, session):
+    """Editar solo el nombre de una cita antigua sin slot_key no da 409"""
+    client.post("/api/appointments", json={"name": "Ana", "date": "2025-01-06T09:00:00"})
+    legacy = client.post("/api/appointments", json={"name": "Luis", "date": "2025-01-06T10:20:00"}).json()
+    # Como la deja la migración cuando dos citas compartían franja
+    session.execute(
+        text("UPDATE appointment SET date = '2025-01-06 09:20:00.000000', slot_key = NULL WHERE id = :id"),
+        {"id": legacy["id"]},
+    )
+    session.commit()
+    session.expire_all()
+
+    response = client.put(f"/api/appointments/{legacy['id']}", json={"name": "Luis Pérez"})
+
+    assert response.status_code == 200
+    assert response.json()["name"] == "Luis Pérez"
+    assert session.execute(
+        text("SELECT slot_key FROM appointment WHERE id = :id"), {"id": legacy["id"]}
+    ).scalar() is None
+
+
+def test_list_free_slots(client: TestClient):
+    """El endpoint de franjas libres excluye las ocupadas"""
+    # 2025-01-06 es lunes
+    client.post("/api/appointments", json={"name": "Ana", "date": "2025-01-06T09:00:00"})
+
+    response = client.get(
+        "/api/slots/free", params={"start": "2025-01-06T09:00:00", "limit": 2}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["slots"] == ["2025-01-06T09:30:00", "2025-01-06T10:00:00"]
+
+
+def test_list_appointments_keyset_pagination(client: TestClient, sample_appointment_data: dict):
+    """Recorrer todas las citas con el cursor after_date/after_id"""
+    base = datetime(2025, 1, 6, 9, 0)
+    for i in range(5):
+        appointment_data = sample_appointment_data.copy()
+        appointment_data["name"] = f"Persona {i+1}"
+        appointment_data["date"] = (base + timedelta(days=i)).isoformat()
+        client.post("/api/appointments", json=appointment_data)
+
+    names = []
+    params = {"limit": 2}
+    while True:
+        data = client.get("/api/appointments", params=params).json()
+        assert data["total"] == 5
+        names.extend(a["name"] for a in data["appointments"])
+        if data["next_after_date"] is None:
+            break
+        params = {
+            "limit": 2,
+            "after_date": data["next_after_date"],
+            "after_id": data["next_after_id"],
+        }
+
+    assert names == [f"Persona {i+1}" for i in range(5)]
+
+    # Con solo after_date se excluye la cita de esa misma fecha
+    data = client.get("/api/appointments", params={"after_date": base.isoformat()}).json()
+    assert [a["name"] for a in data["appointments"]] == [f"Persona {i+1}" for i in range(1, 5)]
+
+
+def test_list_appointments_approximate_total(client: TestClient, sample_appointment_data: dict):
+    """approximate_total devuelve el total desde el índice en memoria"""
+    client.post("/api/appointments", json=sample_appointment_data)
+
+    response = client.get("/api/appointments", params={"approximate_total": True})
+
+    assert response.status_code == 200
+    assert response.json()["total"] == 1
@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+
+from fastapi.testclient import TestClient
+
+
+def test_import_ndjson_reports_row_errors(client: TestClient, sample_appointment_data: dict):
+    """La importación inserta por lotes y devuelve los errores con su línea"""
+    client.post("/api/appointments", json=sample_appointment_data)  # ocupa 2024-12-20 15:00
+    lines = [
+        json.dumps({"name": "Ana", "date": "2025-01-06T09:00:00"}),
+        "{no es json",
+        json.dumps({"name": "Sin fecha"}),
+        json.dumps({"name": "Choca con existente", "date": "2024-12-20T15:10:00"}),
+        json.dumps({"name": "Choca en el lote", "date": "2025-01-06T09:15:00"}),
+        json.dumps({"name": "Luis", "date": "2025-01-06T10:00:00", "email": "luis@example.com"}),
+    ]
+
+    response = client.post(
+        "/api/appointments/import",
+        params={"batch_size": 2},
+        content="\n".join(lines).encode(),
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["imported"] == 2
+    assert [e["line"] for e in data["errors"]] == [2, 3, 4, 5]
+    assert "ocupado" in data["errors"][2]["error"]
+    assert client.get("/api/appointments").json()["total"] == 3
+
+
+def test_import_csv(client: TestClient):
+    """Importar un CSV con cabecera"""
+    body = "name,email,date\nAna,,2025-01-06T09:00:00\nLuis,luis@example.com,2025-01-06T09:30:00\n"
+
+    response = client.post("/api/appointments/import", params={"format": "csv"}, content=body)
+
+    assert response.json() == {"imported": 2, "errors": []}
+
+
+def test_export_ndjson_and_csv(client: TestClient, sample_appointment_data: dict):
+    """La exportación devuelve todas las citas ordenadas por fecha"""
+    for i, date in enumerate(["2025-01-07T10:00:00", "2025-01-06T09:00:00"]):
+        client.post("/api/appointments", json={**sample_appointment_data, "name": f"P{i}", "date": date})
+
+    ndjson = client.get("/api/appointments/export")
+    assert ndjson.status_code == 200
+    rows = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert [r["name"] for r in rows] == ["P1", "P0"]
+
+    exported = client.get("/api/appointments/export", params={"format": "csv"})
+    assert exported.headers["content-type"].startswith("text/csv")
+    reader = list(csv.DictReader(io.StringIO(exported.text)))
+    assert [r["name"] for r in reader] == ["P1", "P0"]
+    assert reader[0]["email"] == sample_appointment_data["email"]
+
+
+def test_export_rejects_unknown_format(client: TestClient):
+    """Formatos desconocidos devuelven 400"""
+    assert client.get("/api/appointments/export", params={"format": "xml"}).status_code == 400
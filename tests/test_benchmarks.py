@@ -0,0 +1,40 @@
+from benchmarks.fake_ollama import FakeOllama
+from benchmarks.load import compare, percentile
+from benchmarks.serialization import run as run_serialization
+from src.ollama_service import OllamaService
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 95) == 0.0
+
+
+def test_compare_flags_regressions():
+    baseline = {"results": {"chat": {"p95_ms": 100.0, "req_per_s": 50.0}}}
+    assert compare({"chat": {"p95_ms": 110.0, "req_per_s": 48.0}}, baseline, 0.2) == []
+    assert compare({"chat": {"p95_ms": 130.0, "req_per_s": 48.0}}, baseline, 0.2) == ["chat"]
+
+
+def test_serialization_benchmark_runs():
+    result = run_serialization(turns=2, rounds=2, iterations=3)
+    assert set(result) == {"params", "stdlib", "fast", "speedup"}
+    assert result["fast"]["bytes_per_turn"] > 0
+
+
+async def test_fake_ollama_follows_tool_script(monkeypatch):
+    """El servidor simulado pide las herramientas del guion y luego responde"""
+    monkeypatch.setattr("src.ollama_service.local_tools.find_free_slots", lambda **kwargs: [])
+    fake = FakeOllama(latency=0, token_rate=10_000, tokens=5, tool_script=["find_free_slots"])
+    service = OllamaService()
+    service.response_cache.ttl_seconds = 0
+    service.client = fake.client()
+
+    assert await service.chat("Hola") == "bla bla bla bla bla"
+    assert fake.requests == 2
+    assert service.prompt_stats["rounds"] == 2
+
+    events = [event async for event in service.chat_stream("Hola")]
+    assert [e["type"] for e in events][:2] == ["start", "tool"]
+    assert events[-1] == {"type": "done", "response": "bla bla bla bla bla"}
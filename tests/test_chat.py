@@ -1,4 +1,6 @@
 # tests/test_chat.py
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock, patch
@@ -133,3 +135,32 @@ def test_chat_message_persistence(client: TestClient):
         assert isinstance(message_id, int)
         assert message_id > 0
 
+
+
+def test_chat_stream_endpoint(client: TestClient):
+    """Test del endpoint de chat en streaming (NDJSON)"""
+    async def fake_stream(message, context=None, history=None, user_id=None):
+        yield {"type": "token", "content": "Hola, "}
+        yield {"type": "tool", "name": "check_occupied_slots"}
+        yield {"type": "token", "content": "¿en qué te ayudo?"}
+        yield {"type": "done", "response": "Hola, ¿en qué te ayudo?"}
+
+    with patch("src.main.ollama_service.chat_stream", new=fake_stream):
+        response = client.post(
+            "/api/chat/stream",
+            json={"message": "Hola", "user_id": "stream-user"}
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines() if line]
+
+    assert [e["type"] for e in events] == ["token", "tool", "token", "done"]
+    done = events[-1]
+    assert done["response"] == "Hola, ¿en qué te ayudo?"
+    assert done["user_id"] == "stream-user"
+    assert isinstance(done["message_id"], int)
+
+    # El turno completo queda persistido en el historial
+    history = client.get("/api/chat/history", params={"user_id": "stream-user"}).json()
+    assert [item["content"] for item in history["items"]] == ["Hola", "Hola, ¿en qué te ayudo?"]
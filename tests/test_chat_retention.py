@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+from sqlmodel import Session, select
+
+from src.chat_retention import ChatRetention, unpack_turns
+from src.models import ChatArchive, ChatMessage
+
+
+async def test_old_turns_are_archived_in_batches(engine, monkeypatch):
+    """Los turnos antiguos pasan comprimidos al archivo y la tabla conserva los recientes"""
+    monkeypatch.setattr("src.chat_retention.engine", engine)
+    now = datetime(2025, 6, 1)
+    with Session(engine) as session:
+        for i in range(5):
+            user_id = "ana" if i % 2 == 0 else "luis"
+            session.add(ChatMessage(
+                user_id=user_id, user_message=f"viejo {i}", bot_response="ok",
+                created_at=now - timedelta(days=100 - i),
+            ))
+        session.add(ChatMessage(user_id="ana", user_message="reciente", bot_response="ok",
+                                created_at=now - timedelta(days=1)))
+        session.commit()
+
+    retention = ChatRetention(max_age_days=30, batch_size=2)
+    assert await retention.run_once(now=now) == 5
+    assert await retention.run_once(now=now) == 0
+
+    with Session(engine) as session:
+        assert [m.user_message for m in session.exec(select(ChatMessage))] == ["reciente"]
+        archives = session.exec(select(ChatArchive).order_by(ChatArchive.id)).all()
+    # Tres lotes (2 + 2 + 1), agrupados por usuario dentro de cada lote
+    assert sum(a.turns for a in archives) == 5
+    archived_ana = [t["user_message"] for a in archives if a.user_id == "ana" for t in unpack_turns(a.payload)]
+    assert archived_ana == ["viejo 0", "viejo 2", "viejo 4"]
+    assert retention.status()["archived"] == 5
+
+
+def test_retention_disabled_with_zero_days():
+    retention = ChatRetention(max_age_days=0)
+    assert not retention.enabled
+    retention.start()  # no lanza nada sin event loop
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+
+from src.chat_writer import ChatMessageWriter, IdAllocator
+from src.history_cache import history_cache
+from src.models import ChatMessage
+
+
+def _saved(engine) -> list:
+    with Session(engine) as session:
+        return [(m.id, m.user_message) for m in session.exec(select(ChatMessage).order_by(ChatMessage.id))]
+
+
+async def test_submit_returns_ids_and_flush_writes_one_batch(engine, monkeypatch):
+    """Los turnos tienen ID al encolarse y se guardan juntos en un lote"""
+    monkeypatch.setattr("src.chat_writer.engine", engine)
+    with Session(engine) as session:
+        session.add(ChatMessage(user_id="u1", user_message="antiguo", bot_response="ok"))
+        session.commit()
+    writer = ChatMessageWriter(enabled=True, flush_interval=60, ids=IdAllocator())
+
+    ids = [await writer.submit("u1", f"m{i}", "ok") for i in range(3)]
+
+    assert ids == [2, 3, 4]
+    assert [m.user_message for m in writer.pending("u1")] == ["m0", "m1", "m2"]
+    assert writer.pending("otro") == []
+    assert _saved(engine) == [(1, "antiguo")]
+
+    assert await writer.stop() == 3
+    assert _saved(engine)[1:] == [(2, "m0"), (3, "m1"), (4, "m2")]
+    assert writer.pending("u1") == []
+    assert writer.stats()["batches"] == 1
+
+
+async def test_background_task_flushes_full_batches(engine, monkeypatch):
+    monkeypatch.setattr("src.chat_writer.engine", engine)
+    writer = ChatMessageWriter(enabled=True, batch_size=2, flush_interval=60, ids=IdAllocator())
+
+    await writer.submit("u1", "a", "ok")
+    await writer.submit("u1", "b", "ok")
+    for _ in range(50):
+        if writer.written == 2:
+            break
+        await asyncio.sleep(0.01)
+
+    assert [text for _, text in _saved(engine)] == ["a", "b"]
+    await writer.stop()
+
+
+async def test_poisoned_batch_saves_good_rows_and_drops_the_bad_one(engine, monkeypatch):
+    """Un ID ya usado no bloquea la cola: el resto del lote se guarda y ese turno se descarta"""
+    monkeypatch.setattr("src.chat_writer.engine", engine)
+    ids = IdAllocator()
+    writer = ChatMessageWriter(enabled=True, flush_interval=60, ids=ids)
+    for i in range(3):
+        await writer.submit("u1", f"m{i}", "ok")
+    # Otro proceso escribe con el ID 2 antes del commit del lote
+    with Session(engine) as session:
+        session.add(ChatMessage(id=2, user_id="otro", user_message="ajeno", bot_response="ok"))
+        session.commit()
+
+    assert await writer.stop() == 2
+
+    assert _saved(engine) == [(1, "m0"), (2, "ajeno"), (3, "m2")]
+    assert writer.pending("u1") == []
+    stats = writer.stats()
+    assert (stats["failed_batches"], stats["dropped"], stats["queued"]) == (1, 1, 0)
+    # Los IDs siguientes no chocan con los ya entregados
+    assert ids.next_id() == 4
+
+
+async def test_transient_errors_are_retried_a_limited_number_of_times(engine, monkeypatch):
+    monkeypatch.setattr("src.chat_writer.engine", engine)
+    writer = ChatMessageWriter(enabled=True, flush_interval=60, max_retries=3, ids=IdAllocator())
+    await writer.submit("u1", "a", "ok")
+    attempts = []
+
+    def broken(batch):
+        attempts.append(len(batch))
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(ChatMessageWriter, "_write", staticmethod(broken))
+
+    assert await writer.flush() == 0
+    assert writer.pending("u1") != []
+    # Al apagar se agotan los intentos en lugar de reintentar para siempre
+    assert await writer.stop() == 0
+    assert writer.stats()["dropped"] == 1
+    assert writer.pending("u1") == []
+    assert len(attempts) == 6  # lote + fila en cada uno de los 3 intentos
+
+
+async def test_full_queue_falls_back_to_synchronous_write(engine, monkeypatch):
+    """Con la cola llena el turno se guarda en la petición y sus errores llegan al llamante"""
+    monkeypatch.setattr("src.chat_writer.engine", engine)
+    writer = ChatMessageWriter(enabled=True, flush_interval=60, max_pending=2, ids=IdAllocator())
+    await writer.submit("u1", "a", "ok")
+    await writer.submit("u1", "b", "ok")
+
+    assert await writer.submit("u1", "c", "ok") == 3
+    assert _saved(engine) == [(3, "c")]
+    assert [m.user_message for m in writer.pending("u1")] == ["a", "b"]
+
+    def broken(batch):
+        raise OperationalError("INSERT", {}, Exception("disk I/O error"))
+
+    monkeypatch.setattr(ChatMessageWriter, "_write", staticmethod(broken))
+    with pytest.raises(OperationalError):
+        await writer.submit("u1", "d", "ok")
+    assert writer.stats()["sync_writes"] == 1
+    monkeypatch.undo()
+    monkeypatch.setattr("src.chat_writer.engine", engine)
+    await writer.stop()
+
+
+def test_chat_write_behind_keeps_history_for_next_turn(client: TestClient, engine, mock_ollama_service, monkeypatch):
+    """Con escritura diferida el siguiente turno ve el anterior aunque no esté guardado"""
+    monkeypatch.setattr("src.chat_writer.engine", engine)
+    writer = ChatMessageWriter(enabled=True, flush_interval=60, ids=IdAllocator())
+    monkeypatch.setattr("src.main.chat_writer", writer)
+
+    first = client.post("/api/chat", json={"message": "Hola", "user_id": "wb"}).json()
+    # Ni caché ni tabla: el historial sale de la cola
+    history_cache.clear()
+    assert _saved(engine) == []
+    second = client.post("/api/chat", json={"message": "Sigo aquí", "user_id": "wb"}).json()
+
+    assert second["message_id"] == first["message_id"] + 1
+    _, _, history = mock_ollama_service.call_args.args
+    assert history == [("Hola", "Respuesta simulada del chatbot")]
+    items = client.get("/api/chat/history", params={"user_id": "wb"}).json()["items"]
+    assert [i["content"] for i in items if i["role"] == "user"] == ["Hola", "Sigo aquí"]
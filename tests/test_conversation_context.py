@@ -0,0 +1,117 @@
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from src.conversation_context import (
+    ConversationSummarizer, estimate_tokens, fit_history, pending_turns, turn_digest, turn_tokens
+)
+from src.models import ChatMessage, ConversationSummary
+
+
+def test_fit_history_keeps_latest_turns_within_budget():
+    history = [("a" * 400, "b" * 400), ("corto", "ok"), ("otro", "vale")]
+    cost_last_two = sum(estimate_tokens(t) for turn in history[1:] for t in turn)
+
+    kept, dropped = fit_history(history, budget=cost_last_two)
+    assert kept == history[1:]
+    assert dropped == history[:1]
+
+    # Con margen entra todo
+    assert fit_history(history, budget=10_000) == (history, [])
+
+
+def test_fit_history_always_keeps_the_latest_turn():
+    """Si el último turno no cabe entero se envía recortado, nunca un historial vacío"""
+    history = [("hola", "hola"), ("x" * 4000, "y" * 300)]
+
+    kept, dropped = fit_history(history, budget=200)
+
+    assert dropped == history[:1]
+    [(user_message, bot_response)] = kept
+    assert user_message.startswith("xxx") and user_message.endswith("…")
+    assert bot_response == "y" * 300
+    assert turn_tokens(kept[0]) <= 200
+    assert fit_history([], budget=200) == ([], [])
+    assert fit_history(history, budget=0) == ([("", "")], history[:1])
+
+
+def test_pending_turns_skips_already_summarized():
+    dropped = [("u1", "b1"), ("u2", "b2"), ("u3", "b3")]
+    summary = ConversationSummary(user_id="ana", summary="...", last_turn_digest=turn_digest(("u2", "b2")))
+
+    assert pending_turns(None, dropped) == dropped
+    assert pending_turns(summary, dropped) == [("u3", "b3")]
+    summary.last_turn_digest = turn_digest(("u0", "b0"))
+    assert pending_turns(summary, dropped) == dropped
+
+
+async def test_summarizer_persists_one_task_per_user(engine, session: Session, monkeypatch):
+    monkeypatch.setattr("src.conversation_context.engine", engine)
+    calls = []
+
+    async def summarize(previous, turns, user_id):
+        calls.append((previous, turns, user_id))
+        return "Ana quiere una limpieza el lunes"
+
+    summarizer = ConversationSummarizer(summarize, min_turns=2)
+    assert summarizer.schedule("ana", None, [("hola", "hola"), ("limpieza", "¿cuándo?")])
+    # Ya hay una tarea en curso para ese usuario
+    assert not summarizer.schedule("ana", None, [("otro", "turno")])
+    await summarizer.drain()
+
+    row = session.get(ConversationSummary, "ana")
+    assert row.summary == "Ana quiere una limpieza el lunes"
+    assert row.last_turn_digest == turn_digest(("limpieza", "¿cuándo?"))
+    assert len(calls) == 1
+    assert summarizer.stats() == {"running": 0, "completed": 1, "failed": 0, "deferred": 0}
+
+
+async def test_summarizer_waits_for_enough_pending_turns():
+    """Con pocos turnos pendientes no se llama al modelo; por turnos o por tokens, sí"""
+    calls = []
+
+    async def summarize(previous, turns, user_id):
+        calls.append(turns)
+        return None
+
+    summarizer = ConversationSummarizer(summarize, min_turns=3, min_tokens=100)
+    assert not summarizer.schedule("ana", None, [("hola", "hola")])
+    assert not summarizer.schedule("ana", None, [("hola", "hola"), ("vale", "ok")])
+    assert summarizer.stats()["deferred"] == 2
+
+    assert summarizer.schedule("ana", None, [("hola", "hola"), ("vale", "ok"), ("sí", "bien")])
+    await summarizer.drain()
+    assert summarizer.schedule("luis", None, [("x" * 400, "ok")])
+    await summarizer.drain()
+    assert len(calls) == 2
+
+
+def test_chat_sends_budgeted_history_and_summary(client: TestClient, session: Session, mock_ollama_service):
+    """Los turnos antiguos que no caben se resumen; el resumen va en el contexto"""
+    for i in range(6):
+        session.add(ChatMessage(user_id="ana", user_message=f"mensaje {i} " + "x" * 2000, bot_response="ok"))
+    session.add(ChatMessage(user_id="ana", user_message="último", bot_response="vale"))
+    session.commit()
+
+    with patch("src.main.conversation_summarizer.schedule") as schedule:
+        response = client.post("/api/chat", json={"message": "Hola", "user_id": "ana"})
+    assert response.status_code == 200
+
+    _, context, history = mock_ollama_service.call_args.args
+    assert mock_ollama_service.call_args.kwargs["first_turn"] is False
+    assert history[-1] == ("último", "vale")
+    assert len(history) < 7
+    user_id, previous, pending = schedule.call_args.args
+    assert (user_id, previous) == ("ana", None)
+    assert len(pending) + len(history) == 7
+
+    session.add(ConversationSummary(
+        user_id="ana", summary="Ana pidió una limpieza", last_turn_digest=turn_digest(pending[-1])
+    ))
+    session.commit()
+    with patch("src.main.conversation_summarizer.schedule") as schedule:
+        client.post("/api/chat", json={"message": "Hola otra vez", "user_id": "ana"})
+    schedule.assert_not_called()
+    _, context, _ = mock_ollama_service.call_args.args
+    assert "Resumen de la conversación anterior: Ana pidió una limpieza" in context
@@ -0,0 +1,100 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func
+from sqlmodel import SQLModel, Session, select
+
+from src.config import SQLITE_BUSY_TIMEOUT_MS
+from src.database import build_engine, run_db
+from src.history_cache import history_cache
+from src.main import app, get_session
+from src.models import ChatMessage
+
+
+async def test_run_db_runs_off_event_loop_thread():
+    """run_db ejecuta la función en el executor de base de datos, no en el event loop"""
+    loop_thread = threading.get_ident()
+
+    def work(a, b=0):
+        return threading.get_ident(), a + b
+
+    thread_id, result = await run_db(work, 1, b=2)
+
+    assert result == 3
+    assert thread_id != loop_thread
+
+
+def test_sqlite_profile_sets_pragmas(tmp_path):
+    engine = build_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == SQLITE_BUSY_TIMEOUT_MS
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+    engine.dispose()
+
+
+def test_concurrent_writers_with_open_reader_do_not_fail(tmp_path):
+    """Con WAL varios hilos escriben a la vez con un lector abierto sin errores de bloqueo"""
+    engine = build_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    SQLModel.metadata.create_all(engine)
+    writers, per_writer = 8, 25
+    errors = []
+
+    # Una transacción de lectura abierta bloquearía al escritor sin WAL
+    reader = engine.connect()
+    reader.exec_driver_sql("BEGIN")
+    reader.exec_driver_sql("SELECT COUNT(*) FROM chatmessage").scalar()
+
+    def write(n: int):
+        try:
+            for i in range(per_writer):
+                with Session(engine) as session:
+                    session.add(ChatMessage(user_id=f"user-{n}", user_message=f"m{i}", bot_response="ok"))
+                    session.commit()
+        except Exception as e:  # noqa: BLE001
+            errors.append(e)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        list(pool.map(write, range(writers)))
+    elapsed = time.perf_counter() - started
+    reader.rollback()
+    reader.close()
+
+    assert errors == []
+    with Session(engine) as session:
+        assert session.exec(select(func.count()).select_from(ChatMessage)).one() == writers * per_writer
+    # 200 commits con synchronous=NORMAL: muy por debajo del busy_timeout
+    assert elapsed < SQLITE_BUSY_TIMEOUT_MS / 1000
+    engine.dispose()
+
+
+def test_chat_does_not_hold_a_connection_while_waiting_for_ollama(tmp_path):
+    """Mientras el turno espera al modelo su conexión está de vuelta en el pool"""
+    engine = build_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    SQLModel.metadata.create_all(engine)
+    checked_out = []
+
+    async def chat(*args, **kwargs):
+        checked_out.append(engine.pool.checkedout())
+        return "ok"
+
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    try:
+        with patch("src.main.ollama_service.chat", new=AsyncMock(side_effect=chat)):
+            response = TestClient(app).post("/api/chat", json={"message": "Hola", "user_id": "pool"})
+    finally:
+        app.dependency_overrides.clear()
+        history_cache.clear()
+
+    assert response.status_code == 200
+    assert checked_out == [0]
+    assert engine.pool.checkedout() == 0
+    engine.dispose()
@@ -0,0 +1,56 @@
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+from src.history_cache import HistoryCache, history_cache
+
+
+def test_get_miss_then_hit():
+    """Una entrada guardada se devuelve hasta que se descarta"""
+    cache = HistoryCache(max_users=10, ttl_seconds=60, max_turns=3)
+    assert cache.get("u1") is None
+
+    cache.put("u1", [("hola", "buenas")])
+    assert cache.get("u1") == [("hola", "buenas")]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_append_keeps_last_turns_only_for_cached_users():
+    """append respeta max_turns y no crea entradas parciales"""
+    cache = HistoryCache(max_users=10, ttl_seconds=60, max_turns=2)
+    cache.append("nuevo", "a", "b")
+    assert cache.get("nuevo") is None
+
+    cache.put("u1", [("1", "r1")])
+    cache.append("u1", "2", "r2")
+    cache.append("u1", "3", "r3")
+    assert cache.get("u1") == [("2", "r2"), ("3", "r3")]
+
+
+def test_lru_eviction_and_ttl():
+    """Se expulsa el usuario menos reciente y las entradas caducan por TTL"""
+    cache = HistoryCache(max_users=2, ttl_seconds=60, max_turns=2)
+    cache.put("u1", [])
+    cache.put("u2", [])
+    cache.get("u1")
+    cache.put("u3", [])
+    assert cache.get("u2") is None
+    assert cache.get("u1") == []
+    assert cache.stats()["evictions"] == 1
+
+    expired = HistoryCache(max_users=2, ttl_seconds=0, max_turns=2)
+    expired.put("u1", [("a", "b")])
+    assert expired.get("u1") is None
+
+
+def test_chat_uses_cached_history(client: TestClient):
+    """El segundo turno recibe el historial desde la caché"""
+    with patch("src.main.ollama_service.chat", new_callable=AsyncMock) as mock_chat:
+        mock_chat.side_effect = ["Respuesta 1", "Respuesta 2"]
+        client.post("/api/chat", json={"message": "Turno 1", "user_id": "cache-user"})
+        client.post("/api/chat", json={"message": "Turno 2", "user_id": "cache-user"})
+
+    second_history = mock_chat.call_args_list[1].args[2]
+    assert second_history == [("Turno 1", "Respuesta 1")]
+    assert history_cache.stats()["hits"] == 1
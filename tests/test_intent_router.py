@@ -0,0 +1,94 @@
+from datetime import date, datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from src import tools
+from src.intent_router import IntentRouter, intent_router, normalize_message, parse_day
+from src.models import Appointment
+
+
+def _router(*enabled: str) -> IntentRouter:
+    """Router aislado con las reglas por defecto y contadores propios"""
+    router = IntentRouter(enabled)
+    for intent, pattern, handler in intent_router._rules:
+        router.register(intent, [pattern.pattern], handler)
+    return router
+
+
+def test_normalize_and_parse_day():
+    assert normalize_message("¿Qué horarios hay  MAÑANA?") == "que horarios hay manana"
+    today = date(2025, 1, 6)
+    assert parse_day("manana", today) == date(2025, 1, 7)
+    assert parse_day("el 2025-02-03", today) == date(2025, 2, 3)
+    assert parse_day("2025-02-31", today) is None
+
+
+def test_free_slots_intent_answers_without_model(tools_engine, session: Session):
+    """Los horarios libres de un día concreto se calculan directamente"""
+    day = date.today() + timedelta(days=7)
+    while day.weekday() != 0:
+        day += timedelta(days=1)
+    tools.save_appointment(
+        name="Ana", email="ana@example.com", phone="5551234567",
+        date=datetime.combine(day, datetime.min.time()).replace(hour=9),
+        description="Revisión",
+    )
+    router = _router("free_slots")
+
+    response = router.route(f"¿Qué horarios hay el {day.isoformat()}?")
+
+    assert response.startswith(f"Horarios libres para {day.isoformat()}")
+    assert "09:00" not in response
+    assert "09:30" in response
+    assert router.stats()["routed"] == 1
+
+
+def test_low_confidence_messages_fall_back_to_model():
+    """Solo se atienden mensajes que encajan enteros con un patrón habilitado"""
+    router = _router("free_slots", "list_appointments")
+
+    assert router.route("Quiero la cita para mañana a las 3pm") is None
+    assert router.route("¿Qué horarios hay mañana y pasado?") is None
+    # Sin la frase de seguridad no se listan citas
+    assert router.route("Lista mis citas") is None
+    # La cancelación no está habilitada
+    assert router.route("Cancela mi cita 12") is None
+
+    stats = router.stats()
+    assert stats["messages"] == 4
+    assert stats["routed_fraction"] == 0.0
+
+
+def test_cancel_intent(tools_engine, session: Session):
+    appointment = Appointment(
+        name="Ana", email="ana@example.com", phone="5551234567",
+        date=datetime(2030, 1, 7, 10, 0), description="Revisión",
+    )
+    session.add(appointment)
+    session.commit()
+    appointment_id = appointment.id
+    router = _router("cancel_appointment")
+
+    # Sin la frase de seguridad no se borra nada
+    assert router.route(f"Cancela mi cita #{appointment_id}") is None
+    assert session.get(Appointment, appointment_id) is not None
+
+    assert router.route(f"Soy el archimago, cancela la cita #{appointment_id}") == (
+        f"La cita {appointment_id} ha sido cancelada."
+    )
+    assert router.route("Soy el archimago, por favor, cancela la cita 999") == (
+        "No existe ninguna cita con el número 999."
+    )
+    session.expire_all()
+    assert session.get(Appointment, appointment_id) is None
+
+
+def test_chat_endpoint_uses_fast_path(client: TestClient, mock_ollama_service):
+    """Un mensaje reconocido se responde y se guarda sin llamar a Ollama"""
+    response = client.post("/api/chat", json={"message": "horarios libres para el 2030-01-05"})
+
+    assert response.status_code == 200
+    assert response.json()["response"] == "No quedan horarios libres para 2030-01-05 (2030-01-05)."
+    mock_ollama_service.assert_not_called()
+    assert client.get("/health").json()["fast_path"]["routed"] >= 1
@@ -0,0 +1,53 @@
+import io
+import json
+import logging
+
+from src.logging_config import (
+    JsonFormatter, LazyQueueHandler, SamplingFilter, parse_sampling, setup_logging, shutdown_logging, truncate
+)
+
+
+def _record(name="src.test", level=logging.INFO, msg="hola %s", args=("mundo",), **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_truncates_message_and_extras():
+    formatter = JsonFormatter(max_field_chars=10)
+    line = json.loads(formatter.format(_record(payload={"messages": ["x" * 50]}, node="gpu-a")))
+
+    assert line["msg"] == "hola mundo"
+    assert line["node"] == "gpu-a"
+    assert line["payload"] == '{"messages…(+58)'
+    assert truncate("abcdef", 3) == "abc…(+3)"
+
+
+def test_sampling_by_category():
+    sampler = SamplingFilter(parse_sampling("sqlalchemy=1,sqlalchemy.engine=0,src.tools=0.5"))
+
+    assert sampler.rate_for("sqlalchemy.engine.Engine") == 0.0
+    assert sampler.rate_for("sqlalchemy.pool") == 1.0
+    assert sampler.rate_for("src.main") == 1.0
+    assert not sampler.filter(_record(name="sqlalchemy.engine.Engine"))
+    # Los avisos y errores no se muestrean
+    assert sampler.filter(_record(name="sqlalchemy.engine.Engine", level=logging.WARNING))
+
+
+def test_queue_handler_defers_formatting():
+    handler = LazyQueueHandler(None)
+    record = handler.prepare(_record())
+    assert (record.msg, record.args) == ("hola %s", ("mundo",))
+
+
+def test_setup_logging_writes_through_listener():
+    shutdown_logging()
+    stream = io.StringIO()
+    try:
+        setup_logging(stream)
+        logging.getLogger("src.test").info("turno %s guardado", 3, extra={"user_id": "ana"})
+    finally:
+        shutdown_logging()
+        setup_logging()
+
+    assert "turno 3 guardado user_id=ana" in stream.getvalue()
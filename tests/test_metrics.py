@@ -0,0 +1,72 @@
+from fastapi.testclient import TestClient
+
+from src.metrics import Counter, Histogram, server_timing, tool_seconds
+from src.ollama_service import OllamaService
+from src.tool_cache import ToolResultCache
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demo", ["span"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, span="db")
+    histogram.observe(0.5, span="db")
+    histogram.observe(5, span="db")
+
+    lines = histogram.render()
+    assert 'demo_seconds_bucket{span="db",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{span="db",le="1.0"} 2' in lines
+    assert 'demo_seconds_bucket{span="db",le="+Inf"} 3' in lines
+    assert 'demo_seconds_sum{span="db"} 5.55' in lines
+    assert 'demo_seconds_count{span="db"} 3' in lines
+
+
+def test_counter_and_server_timing():
+    counter = Counter("demo_total", "Demo")
+    counter.inc(3)
+    assert counter.render()[-1] == "demo_total 3"
+    assert server_timing([("tool", 0.01), ("tool", 0.02), ("persist", 0.004)]) == (
+        'tool;dur=30.0;desc="x2", persist;dur=4.0'
+    )
+
+
+def test_chat_reports_server_timing_and_metrics(client: TestClient, mock_ollama_service):
+    response = client.post("/api/chat", json={"message": "Hola, quiero agendar una cita"})
+
+    assert response.status_code == 200
+    phases = [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")]
+    assert phases == ["history", "context", "persist", "total"]
+
+    body = client.get("/metrics").text
+    assert 'chat_span_duration_seconds_count{span="persist"}' in body
+    assert 'http_request_duration_seconds_count{method="POST",route="/api/chat",status="200"}' in body
+
+
+async def test_tool_calls_are_timed(monkeypatch):
+    def find_free_slots(start=None, end=None, limit=5):
+        return ["2030-01-07T09:00:00"]
+
+    monkeypatch.setattr("src.ollama_service.local_tools.find_free_slots", find_free_slots)
+    before = tool_seconds.count(tool="find_free_slots", ok="true", cached="false")
+    await OllamaService()._run_tool_calls(
+        [{"function": {"name": "find_free_slots", "arguments": {}}}], []
+    )
+    assert tool_seconds.count(tool="find_free_slots", ok="true", cached="false") == before + 1
+
+
+async def test_memoized_tool_calls_are_timed_as_cached(monkeypatch):
+    """Un acierto de la caché del turno se mide con su resultado real y cached=true"""
+    def find_free_slots(start=None, end=None, limit=5):
+        return ["2030-01-07T09:00:00"]
+
+    monkeypatch.setattr("src.ollama_service.local_tools.find_free_slots", find_free_slots)
+    labels = {"tool": "find_free_slots", "ok": "true"}
+    before = {c: tool_seconds.count(cached=c, **labels) for c in ("true", "false")}
+    calls = [{"function": {"name": "find_free_slots", "arguments": {"limit": 3}}}]
+
+    service = OllamaService()
+    cache = ToolResultCache()
+    await service._run_tool_calls(calls, [], cache)
+    await service._run_tool_calls(calls, [], cache)
+
+    assert tool_seconds.count(cached="false", **labels) == before["false"] + 1
+    assert tool_seconds.count(cached="true", **labels) == before["true"] + 1
+    assert tool_seconds.count(tool="find_free_slots", ok="false", cached="true") == 0
@@ -0,0 +1,54 @@
+from sqlalchemy import inspect, text
+
+from src.database import build_engine
+from src.migrations import run_migrations
+
+
+def test_slot_key_migration_backfills_and_adds_unique_index(tmp_path):
+    """Una BdD anterior recibe slot_key sin perder citas, aunque haya franjas repetidas"""
+    engine = build_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE appointment (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, email VARCHAR, "
+            "phone VARCHAR, date DATETIME NOT NULL, description VARCHAR, created_at DATETIME NOT NULL, "
+            "updated_at DATETIME)"
+        ))
+        conn.execute(text(
+            "INSERT INTO appointment (id, name, date, created_at) VALUES "
+            "(1, 'Ana', '2025-01-06 09:00:00.000000', '2025-01-01 00:00:00.000000'), "
+            "(2, 'Luis', '2025-01-06 09:20:00.000000', '2025-01-01 00:00:00.000000'), "
+            "(3, 'Eva', '2025-01-06 10:00:00.000000', '2025-01-01 00:00:00.000000')"
+        ))
+
+    run_migrations(engine)
+    run_migrations(engine)  # idempotente
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, slot_key FROM appointment ORDER BY id")).all()
+    assert rows == [(1, "2025-01-06T09:00"), (2, None), (3, "2025-01-06T10:00")]
+    indexes = {i["name"]: i for i in inspect(engine).get_indexes("appointment")}
+    assert indexes["ix_appointment_slot_key"]["unique"]
+    engine.dispose()
+
+
+def test_history_index_migration_replaces_user_id_index(tmp_path):
+    """El historial por usuario se lee por el índice compuesto, sin ordenar aparte"""
+    engine = build_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE chatmessage (id INTEGER PRIMARY KEY, user_id VARCHAR, user_message VARCHAR NOT NULL, "
+            "bot_response VARCHAR NOT NULL, created_at DATETIME NOT NULL)"
+        ))
+        conn.execute(text("CREATE INDEX ix_chatmessage_user_id ON chatmessage (user_id)"))
+
+    run_migrations(engine)
+
+    names = {i["name"] for i in inspect(engine).get_indexes("chatmessage")}
+    assert names == {"ix_chatmessage_user_id_created_at"}
+    with engine.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM chatmessage WHERE user_id = 'u' ORDER BY created_at DESC LIMIT 32"
+        )))
+    assert "ix_chatmessage_user_id_created_at" in plan
+    assert "TEMP B-TREE" not in plan
+    engine.dispose()
@@ -0,0 +1,93 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.ollama_pool import OllamaPool
+from src.ollama_service import OllamaService
+
+NODES = ["http://gpu-a:11434", "http://gpu-b:11434", "http://gpu-c:11434"]
+
+
+class FakeOllamaCluster:
+    """Varios backends de Ollama simulados, distinguidos por host"""
+
+    def __init__(self):
+        self.calls = {url: 0 for url in NODES}
+        self.down = set()
+        self.delay = {url: 0.0 for url in NODES}
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        url = f"{request.url.scheme}://{request.url.host}:{request.url.port}"
+        if url in self.down:
+            raise httpx.ConnectError("conexión rechazada", request=request)
+        self.calls[url] += 1
+        await asyncio.sleep(self.delay[url])
+        return httpx.Response(200, json={"message": {"role": "assistant", "content": url}})
+
+
+@pytest.fixture(name="cluster")
+def cluster_fixture():
+    return FakeOllamaCluster()
+
+
+@pytest.fixture(name="service")
+def service_fixture(cluster: FakeOllamaCluster):
+    service = OllamaService(base_urls=NODES)
+    service.pool.cooldown = 60
+    # Sin cola de admisión: estas pruebas miden solo el reparto entre nodos
+    service.admission.max_concurrency = 100
+    service.response_cache.ttl_seconds = 0
+    service.client = httpx.AsyncClient(transport=httpx.MockTransport(cluster.handler))
+    return service
+
+
+async def test_conversation_sticks_to_one_node(service: OllamaService):
+    """Los turnos de un mismo user_id van al mismo backend"""
+    answers = {await service.chat("Hola", user_id="ana") for _ in range(5)}
+    assert len(answers) == 1
+
+
+async def test_concurrent_conversations_spread_by_load(service: OllamaService, cluster: FakeOllamaCluster):
+    """Las conversaciones simultáneas se reparten entre los nodos menos cargados"""
+    cluster.delay = {url: 0.05 for url in NODES}
+
+    await asyncio.gather(*(service.chat("Hola", user_id=f"user-{i}") for i in range(6)))
+
+    assert sorted(cluster.calls.values()) == [2, 2, 2]
+
+
+async def test_failed_node_is_ejected_and_request_retried(service: OllamaService, cluster: FakeOllamaCluster):
+    """Un nodo caído se expulsa y la petición se reintenta en otro"""
+    first = await service.chat("Hola", user_id="ana")
+    cluster.down.add(first)
+
+    second = await service.chat("Hola", user_id="ana")
+
+    assert second != first
+    status = {node["url"]: node for node in service.pool.status()}
+    assert status[first]["healthy"] is False
+    assert status[first]["failures"] == 1
+
+    # Mientras está expulsado no recibe tráfico nuevo
+    for i in range(5):
+        await service.chat("Hola", user_id=f"otro-{i}")
+    assert cluster.calls[first] == 1
+
+
+async def test_node_readmitted_after_cooldown(service: OllamaService, cluster: FakeOllamaCluster):
+    """Cumplida la expulsión el nodo vuelve a recibir tráfico y se readmite"""
+    cluster.down.add(NODES[0])
+    service.pool.nodes[1].ejected_until = service.pool.nodes[2].ejected_until = float("inf")
+    await service.chat("Hola", user_id="ana")  # falla en gpu-a y reintenta en el resto
+    assert service.pool.nodes[0].failures == 1
+
+    cluster.down.clear()
+    service.pool.nodes[0].ejected_until = 0.0  # espera cumplida
+    assert await service.chat("Hola", user_id="luis") == NODES[0]
+    assert service.pool.nodes[0].failures == 0
+
+
+def test_pool_requires_nodes():
+    with pytest.raises(ValueError):
+        OllamaPool([])
@@ -0,0 +1,265 @@
+import json
+import time
+
+import httpx
+import pytest
+
+from src.ollama_service import OllamaService
+from src.slot_index import slot_index
+from src.tools import SlotConflict
+
+
+def _ndjson(*chunks: dict) -> bytes:
+    return b"".join(json.dumps(c).encode() + b"\n" for c in chunks)
+
+
+@pytest.fixture(name="service")
+def service_fixture():
+    """OllamaService aislado; cada test le asigna un transporte HTTP simulado"""
+    service = OllamaService()
+    # Sin caché de respuestas salvo en las pruebas que la activan
+    service.response_cache.ttl_seconds = 0
+    return service
+
+
+async def test_chat_stream_handles_tool_round(service: OllamaService, monkeypatch):
+    """El streaming ejecuta las tool calls entre rondas y sigue emitiendo tokens"""
+    def check_occupied_slots(start, end):
+        return []
+
+    monkeypatch.setattr(
+        "src.ollama_service.local_tools.check_occupied_slots", check_occupied_slots
+    )
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        requests.append(body)
+        assert body["stream"] is True
+        if len(requests) == 1:
+            content = _ndjson(
+                {"message": {"role": "assistant", "content": "", "tool_calls": [
+                    {"function": {"name": "check_occupied_slots", "arguments": {
+                        "start": "2025-01-01T09:00:00", "end": "2025-01-01T10:00:00"}}}
+                ]}, "done": False},
+                {"message": {"role": "assistant", "content": ""}, "done": True},
+            )
+        else:
+            content = _ndjson(
+                {"message": {"role": "assistant", "content": "Está "}, "done": False},
+                {"message": {"role": "assistant", "content": "libre."}, "done": False},
+                {"message": {"role": "assistant", "content": ""}, "done": True},
+            )
+        return httpx.Response(200, content=content)
+
+    service.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    events = [e async for e in service.chat_stream("¿Hay hueco a las 9?")]
+
+    assert events == [
+        {"type": "start"},
+        {"type": "tool", "name": "check_occupied_slots"},
+        {"type": "token", "content": "Está "},
+        {"type": "token", "content": "libre."},
+        {"type": "done", "response": "Está libre."},
+    ]
+    # La segunda ronda recibe el resultado de la herramienta
+    assert requests[1]["messages"][-1]["role"] == "tool"
+    assert requests[1]["messages"][-1]["name"] == "check_occupied_slots"
+
+
+async def test_chat_stream_reports_connection_errors(service: OllamaService):
+    """Un error HTTP termina el stream con un evento done con el mensaje de error"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(500)
+
+    service.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    events = [e async for e in service.chat_stream("Hola")]
+
+    assert [e["type"] for e in events] == ["start", "done"]
+    assert "Error al conectar" in events[-1]["response"]
+
+
+def test_build_messages_keeps_static_prefix(service: OllamaService):
+    """El prompt del sistema no cambia con el contexto; el contexto va al final"""
+    history = [("Hola", "¡Hola! ¿En qué te ayudo?")]
+    first = service._build_messages("Quiero una cita", "Citas recientes: Ana el 2025-01-01 10:00", history)
+    second = service._build_messages("Otra cosa", "Contexto del usuario: Luis", history)
+
+    assert json.dumps(first[:3]) == json.dumps(second[:3])
+    assert first[0]["role"] == "system"
+    assert first[-2] == {"role": "system", "content": "Contexto adicional: Citas recientes: Ana el 2025-01-01 10:00"}
+    assert first[-1] == {"role": "user", "content": "Quiero una cita"}
+
+
+async def test_chat_records_prompt_eval_stats(service: OllamaService):
+    """chat acumula prompt_eval_count/prompt_eval_duration de cada ronda"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={
+            "message": {"role": "assistant", "content": "Hola"},
+            "prompt_eval_count": 12,
+            "prompt_eval_duration": 3_000_000,
+        })
+
+    service.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    assert await service.chat("Hola") == "Hola"
+    assert await service.chat("Hola") == "Hola"
+
+    assert service.prompt_stats["rounds"] == 2
+    assert service.prompt_stats["prompt_eval_count"] == 24
+    assert service.prompt_stats["last_prompt_eval_duration_ns"] == 3_000_000
+
+
+async def test_read_only_tools_run_concurrently_in_order(service: OllamaService, monkeypatch):
+    """Las lecturas de una ronda se ejecutan a la vez y los resultados conservan el orden"""
+    events = []
+
+    def check_occupied_slots(start, end):
+        events.append(("start", "check"))
+        time.sleep(0.1)
+        events.append(("end", "check"))
+        return ["check"]
+
+    def get_appointment_lists(start=None, end=None, limit=48):
+        events.append(("start", "list"))
+        time.sleep(0.1)
+        events.append(("end", "list"))
+        return ["list"]
+
+    def delete_appointment(appointment_id):
+        events.append(("start", "delete"))
+        return True
+
+    monkeypatch.setattr("src.ollama_service.local_tools.check_occupied_slots", check_occupied_slots)
+    monkeypatch.setattr("src.ollama_service.local_tools.get_appointment_lists", get_appointment_lists)
+    monkeypatch.setattr("src.ollama_service.local_tools.delete_appointment", delete_appointment)
+
+    calls = [
+        {"function": {"name": "check_occupied_slots", "arguments": {
+            "start": "2025-01-01T09:00:00", "end": "2025-01-01T10:00:00"}}},
+        {"function": {"name": "get_appointment_lists", "arguments": {}}},
+        {"function": {"name": "delete_appointment", "arguments": {"appointment_id": "3"}}},
+    ]
+    messages = []
+    started = time.perf_counter()
+    names = await service._run_tool_calls(calls, messages)
+    elapsed = time.perf_counter() - started
+
+    assert names == ["check_occupied_slots", "get_appointment_lists", "delete_appointment"]
+    assert [json.loads(m["content"])["result"] for m in messages] == [["check"], ["list"], True]
+    assert elapsed < 0.19
+    # Ambas lecturas empezaron antes de que terminara ninguna; la escritura va después
+    assert {e for e in events[:2]} == {("start", "check"), ("start", "list")}
+    assert events[-1] == ("start", "delete")
+    assert service._write_locks == {}
+
+
+def test_save_lock_key_is_the_slot_key(service: OllamaService):
+    """Dos altas en la misma franja comparten lock aunque la hora venga en otra zona"""
+    key = service._write_lock_key("save_appointment", {"date": "2025-01-06T11:45:00+02:00"})
+
+    assert key == "slot:2025-01-06T09:30"
+    assert service._write_lock_key("save_appointment", {"date": "2025-01-06T09:50:00Z"}) == key
+    assert service._write_lock_key("save_appointment", {"date": "mañana"}) == "slot:mañana"
+
+
+async def test_read_only_tool_results_are_memoized_per_turn(service: OllamaService, monkeypatch):
+    """Una lectura repetida en el mismo turno se reutiliza hasta que cambian las citas"""
+    calls_made = []
+
+    def check_occupied_slots(start, end):
+        calls_made.append((start, end))
+        return [len(calls_made)]
+
+    monkeypatch.setattr("src.ollama_service.local_tools.check_occupied_slots", check_occupied_slots)
+    call = {"function": {"name": "check_occupied_slots", "arguments": {
+        "start": "2025-01-01T09:00:00", "end": "2025-01-01T10:00:00"}}}
+    tool_cache = service.tool_caches.for_turn("user-1")
+
+    messages = []
+    await service._run_tool_calls([call], messages, tool_cache)
+    await service._run_tool_calls([call], messages, tool_cache)
+    assert len(calls_made) == 1
+    assert [json.loads(m["content"])["result"] for m in messages] == [[1], [1]]
+
+    # Cualquier cambio de citas invalida lo memoizado
+    slot_index.remove(999)
+    await service._run_tool_calls([call], messages, tool_cache)
+    assert len(calls_made) == 2
+    assert json.loads(messages[-1]["content"])["result"] == [2]
+
+    # Otro turno empieza con la caché vacía
+    await service._run_tool_calls([call], [], service.tool_caches.for_turn("user-1"))
+    assert len(calls_made) == 3
+
+
+async def test_slot_conflict_reaches_the_model_structured(service: OllamaService, monkeypatch):
+    """Una reserva en franja ocupada devuelve al modelo el código y las alternativas"""
+    def save_appointment(name, date, **_):
+        raise SlotConflict(date, ["2025-01-06T10:30:00"])
+
+    monkeypatch.setattr("src.ollama_service.local_tools.save_appointment", save_appointment)
+    call = {"function": {"name": "save_appointment", "arguments": {
+        "name": "Ana", "date": "2025-01-06T10:10:00"}}}
+
+    messages = []
+    await service._run_tool_calls([call], messages)
+
+    payload = json.loads(messages[0]["content"])
+    assert payload["ok"] is False
+    assert "ocupado" in payload["error"]
+    assert payload["conflict"] == {
+        "code": "slot_taken", "slot": "2025-01-06T10:00", "alternatives": ["2025-01-06T10:30:00"],
+    }
+
+
+async def test_first_turn_responses_are_cached(service: OllamaService, monkeypatch):
+    """Un primer turno sin herramientas se reutiliza; con historial o tools, no"""
+    service.response_cache.ttl_seconds = 60
+    monkeypatch.setattr("src.ollama_service.local_tools.find_free_slots", lambda **kwargs: [])
+    posts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        posts.append(body)
+        last = body["messages"][-1]
+        if last["role"] == "user" and last["content"].startswith("busca"):
+            return httpx.Response(200, json={"message": {"role": "assistant", "content": "", "tool_calls": [
+                    {"function": {"name": "find_free_slots", "arguments": {}}}]}})
+        return httpx.Response(200, json={"message": {"role": "assistant", "content": f"respuesta {len(posts)}"}})
+
+    service.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    assert await service.chat("¿Cuál es el horario?") == "respuesta 1"
+    assert await service.chat("  ¿cuál es   el HORARIO?") == "respuesta 1"
+    assert len(posts) == 1
+
+    # Con historial o con otro contexto se consulta al modelo
+    assert await service.chat("¿Cuál es el horario?", history=[("Hola", "Hola")]) == "respuesta 2"
+    assert await service.chat("¿Cuál es el horario?", context="Contexto del usuario: Ana") == "respuesta 3"
+    # A mitad de conversación no se usa la caché aunque el historial llegue vacío
+    assert await service.chat("¿Cuál es el horario?", history=[], first_turn=False) == "respuesta 4"
+
+    # Un cambio en las herramientas (o en el prompt) invalida lo cacheado
+    service.tools = service.tools[:-1]
+    assert await service.chat("¿Cuál es el horario?") == "respuesta 5"
+    # Las respuestas que necesitaron herramientas no se cachean
+    assert await service.chat("busca huecos") == "respuesta 7"
+    assert await service.chat("busca huecos") == "respuesta 9"
+    assert service.response_cache.stats()["hits"] == 1
+
+
+def test_prompt_version_is_computed_once(service: OllamaService, monkeypatch):
+    """La huella de prompt y herramientas solo se recalcula si cambian las herramientas"""
+    calls = []
+
+    def counting(prompt, tools):
+        calls.append(len(tools))
+        return f"v{len(calls)}"
+
+    monkeypatch.setattr("src.ollama_service.prompt_version", counting)
+
+    assert service._current_prompt_version() == "v1"
+    assert service._current_prompt_version() == "v1"
+    service.tools = service.tools[:-1]
+    assert service._current_prompt_version() == "v2"
+    assert len(calls) == 2
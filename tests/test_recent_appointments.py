@@ -0,0 +1,45 @@
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+from src import tools
+from src.recent_appointments import recent_appointments_context
+
+
+def _send(client: TestClient, mock_chat: AsyncMock, message: str) -> str:
+    client.post("/api/chat", json={"message": message, "user_id": "ctx-user"})
+    return mock_chat.call_args.args[1]
+
+
+def test_context_rebuilt_only_when_appointments_change(
+    client: TestClient, sample_appointment_data: dict
+):
+    """El bloque de citas recientes se reutiliza hasta que cambian las citas"""
+    client.post("/api/appointments", json=sample_appointment_data)
+
+    rebuilds_before = recent_appointments_context.rebuilds
+    with patch("src.main.ollama_service.chat", new_callable=AsyncMock) as mock_chat:
+        mock_chat.return_value = "ok"
+        first = _send(client, mock_chat, "Hola")
+        second = _send(client, mock_chat, "Sigo aquí")
+        rebuilds = recent_appointments_context.rebuilds - rebuilds_before
+
+        other = sample_appointment_data.copy()
+        other.update(name="Ana Ruiz", date="2024-12-21T10:00:00")
+        client.post("/api/appointments", json=other)
+        third = _send(client, mock_chat, "¿Y ahora?")
+
+    assert first == second == "Citas recientes: Juan Pérez el 2024-12-20 15:00"
+    assert rebuilds == 1
+    assert recent_appointments_context.rebuilds - rebuilds_before == 2
+    assert third.startswith("Citas recientes: Ana Ruiz el 2024-12-21 10:00")
+
+
+def test_tool_writes_invalidate_context(client: TestClient, tools_engine, session):
+    """Las herramientas del modelo también invalidan el bloque"""
+    assert recent_appointments_context.get(session) is None
+
+    tools.save_appointment(name="Luis", date=datetime(2025, 2, 3, 11, 0))
+
+    assert recent_appointments_context.get(session) == "Citas recientes: Luis el 2025-02-03 11:00"
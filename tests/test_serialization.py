@@ -0,0 +1,44 @@
+import json
+from datetime import datetime
+
+from src.models import Appointment
+from src.ollama_service import SYSTEM_MESSAGE
+from src.ollama_tools import TOOLS
+from src.serialization import ChatPayloadEncoder, FastJSONResponse, dumps, dumps_str, loads
+
+
+def test_dumps_is_compact_utf8_and_handles_models():
+    appointment = Appointment(id=1, name="Begoña", date=datetime(2025, 1, 6, 9, 0), created_at=datetime(2025, 1, 1))
+
+    encoded = dumps({"result": [appointment], "at": datetime(2025, 1, 6, 9, 30)})
+
+    assert "Begoña".encode("utf-8") in encoded
+    data = loads(encoded)
+    assert data["at"] == "2025-01-06T09:30:00"
+    assert data["result"][0]["name"] == "Begoña"
+    assert data["result"][0]["date"] == "2025-01-06T09:00:00"
+    assert dumps_str([1, "á"]) == '[1,"á"]'
+
+
+def test_chat_payload_matches_plain_encoding_and_reuses_messages():
+    """El cuerpo precodificado equivale al dict de siempre; cada ronda solo codifica lo nuevo"""
+    encoder = ChatPayloadEncoder("modelo", TOOLS, "30m", SYSTEM_MESSAGE)
+    messages = [SYSTEM_MESSAGE, {"role": "user", "content": "¿Hay hueco el lunes?"}]
+    encoded = []
+
+    first = encoder.encode(messages, stream=False, encoded=encoded)
+    messages.append({"role": "tool", "content": '{"ok":true}'})
+    second = encoder.encode(messages, stream=True, encoded=encoded)
+
+    assert json.loads(first) == {
+        "model": "modelo", "tools": TOOLS, "keep_alive": "30m", "messages": messages[:2], "stream": False,
+    }
+    assert json.loads(second)["messages"] == messages
+    assert json.loads(second)["stream"] is True
+    assert len(encoded) == 3
+    assert second == encoder.encode(messages, stream=True)
+
+
+def test_fast_json_response_renders_with_dumps():
+    response = FastJSONResponse({"detail": "ocupado", "alternatives": ["2025-01-06T09:30:00"]})
+    assert response.body == b'{"detail":"ocupado","alternatives":["2025-01-06T09:30:00"]}'
@@ -0,0 +1,170 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+from sqlmodel import Session, SQLModel
+
+from src import tools
+from src.database import build_engine
+from src.models import Appointment
+from src.slot_index import SlotIndex, find_free, slot_index, slot_key, slot_of, working_mask
+
+
+def _appointment(appointment_id: int, date: datetime, name: str = "Paciente") -> Appointment:
+    return Appointment(id=appointment_id, name=name, date=date)
+
+
+def test_slot_of_uses_30_minute_buckets():
+    """Las franjas son de 30 minutos, 48 por día"""
+    assert slot_of(datetime(2025, 1, 1, 0, 0))[1] == 0
+    assert slot_of(datetime(2025, 1, 1, 9, 29))[1] == 18
+    assert slot_of(datetime(2025, 1, 1, 9, 30))[1] == 19
+    assert slot_of(datetime(2025, 1, 1, 23, 59))[1] == 47
+
+
+def test_slot_key_is_normalized_bucket_start():
+    assert slot_key(datetime(2025, 1, 1, 9, 29, 59)) == "2025-01-01T09:00"
+    assert slot_key(datetime(2025, 1, 1, 9, 30)) == "2025-01-01T09:30"
+    aware = datetime(2025, 1, 1, 11, 45, tzinfo=timezone(timedelta(hours=2)))
+    assert slot_key(aware) == "2025-01-01T09:30"
+
+
+def test_occupied_filters_exact_range_and_sorts():
+    """occupied devuelve solo las citas dentro de [start, end], ordenadas"""
+    index = SlotIndex()
+    index.add(_appointment(1, datetime(2025, 1, 2, 10, 0)))
+    index.add(_appointment(2, datetime(2025, 1, 1, 9, 10)))
+    index.add(_appointment(3, datetime(2025, 1, 1, 9, 20)))
+    index.add(_appointment(4, datetime(2025, 1, 3, 8, 0)))
+
+    found = index.occupied(datetime(2025, 1, 1, 9, 15), datetime(2025, 1, 2, 10, 0))
+
+    assert [a.id for a in found] == [3, 1]
+
+
+def test_add_moves_and_remove_frees_slot():
+    """Actualizar una cita la mueve de franja y borrarla libera la franja"""
+    index = SlotIndex()
+    index.add(_appointment(1, datetime(2025, 1, 1, 9, 0)))
+    assert index.is_taken(datetime(2025, 1, 1, 9, 15))
+
+    index.add(_appointment(1, datetime(2025, 1, 1, 11, 0)))
+    assert not index.is_taken(datetime(2025, 1, 1, 9, 15))
+    assert index.is_taken(datetime(2025, 1, 1, 11, 0))
+    assert not index.is_taken(datetime(2025, 1, 1, 11, 0), exclude_id=1)
+
+    index.remove(1)
+    assert not index.is_taken(datetime(2025, 1, 1, 11, 0))
+    assert len(index) == 0
+
+
+def test_occupied_returns_copies():
+    """Modificar una cita devuelta no altera el índice"""
+    index = SlotIndex()
+    index.add(_appointment(1, datetime(2025, 1, 1, 9, 0), name="Original"))
+
+    found = index.occupied(datetime(2025, 1, 1), datetime(2025, 1, 2))
+    found[0].name = "Cambiado"
+
+    assert index.occupied(datetime(2025, 1, 1), datetime(2025, 1, 2))[0].name == "Original"
+
+
+def test_tools_keep_index_in_sync(tools_engine):
+    """Las herramientas actualizan el índice y check_occupied_slots lo usa"""
+    with Session(tools_engine) as session:
+        slot_index.rebuild(session)
+
+    saved = tools.save_appointment(name="Ana", date=datetime(2025, 3, 1, 10, 0))
+    tools.update_appointment(saved.id, date=datetime(2025, 3, 1, 12, 0))
+
+    found = tools.check_occupied_slots(datetime(2025, 3, 1, 0, 0), datetime(2025, 3, 1, 23, 59))
+    assert [(a.id, a.date) for a in found] == [(saved.id, datetime(2025, 3, 1, 12, 0))]
+
+    with pytest.raises(ValueError):
+        tools.save_appointment(name="Luis", date=datetime(2025, 3, 1, 12, 15))
+
+    tools.delete_appointment(saved.id)
+    assert tools.check_occupied_slots(datetime(2025, 3, 1), datetime(2025, 3, 2)) == []
+
+
+def test_read_tools_convert_ranges_with_offset_to_utc(tools_engine):
+    """Un rango con zona horaria encuentra la cita guardada en UTC, con y sin índice"""
+    plus_two = timezone(timedelta(hours=2))
+    saved = tools.save_appointment(name="Ana", date=datetime(2025, 1, 6, 11, 45, tzinfo=plus_two))
+    assert saved.date == datetime(2025, 1, 6, 9, 45)
+    start = datetime(2025, 1, 6, 10, 0, tzinfo=plus_two)
+    end = datetime(2025, 1, 6, 12, 0, tzinfo=plus_two)
+
+    slot_index.clear()
+    assert [a.id for a in tools.get_appointment_lists(start=start, end=end)] == [saved.id]
+    assert [a.id for a in tools.check_occupied_slots(start, end)] == [saved.id]
+
+    with Session(tools_engine) as session:
+        slot_index.rebuild(session)
+    assert [a.id for a in tools.check_occupied_slots(start, end)] == [saved.id]
+
+
+def test_find_free_skips_occupied_and_non_working_time():
+    """find_free respeta el horario de atención, los días laborables y la ocupación"""
+    index = SlotIndex()
+    # 2025-01-03 es viernes
+    index.add(_appointment(1, datetime(2025, 1, 3, 17, 0)))
+    work = working_mask(time(9, 0), time(18, 0))
+
+    free = find_free(
+        index.day_bitmap,
+        datetime(2025, 1, 3, 16, 40),
+        datetime(2025, 1, 10),
+        limit=3,
+        work_mask=work,
+        work_days={0, 1, 2, 3, 4},
+    )
+
+    # 16:40 se redondea a 17:00 (ocupada); el fin de semana se salta
+    assert free == [
+        datetime(2025, 1, 3, 17, 30),
+        datetime(2025, 1, 6, 9, 0),
+        datetime(2025, 1, 6, 9, 30),
+    ]
+
+
+def test_find_free_slots_tool(tools_engine):
+    """La herramienta devuelve ISO 8601 y funciona con o sin índice construido"""
+    tools.save_appointment(name="Ana", date=datetime(2025, 1, 6, 9, 0))
+
+    from_db = tools.find_free_slots(start=datetime(2025, 1, 6, 9, 0), limit=2)
+    with Session(tools_engine) as session:
+        slot_index.rebuild(session)
+    from_index = tools.find_free_slots(start=datetime(2025, 1, 6, 9, 0), limit=2)
+
+    assert from_db == from_index == ["2025-01-06T09:30:00", "2025-01-06T10:00:00"]
+
+
+def test_concurrent_bookings_for_same_slot_only_one_wins(tmp_path, monkeypatch):
+    """Sin comprobación previa, el índice único deja pasar una sola reserva por franja"""
+    engine = build_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr("src.tools.engine", engine)
+
+    def book(i):
+        try:
+            return tools.save_appointment(name=f"Paciente {i}", date=datetime(2025, 1, 6, 10, i))
+        except tools.SlotConflict as e:
+            return e
+
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(book, range(8)))
+    finally:
+        slot_index.clear()
+
+    saved = [r for r in results if isinstance(r, Appointment)]
+    conflicts = [r for r in results if isinstance(r, tools.SlotConflict)]
+    assert len(saved) == 1 and len(conflicts) == 7
+    assert saved[0].slot_key == "2025-01-06T10:00"
+    assert conflicts[0].to_dict() == {
+        "code": "slot_taken",
+        "slot": "2025-01-06T10:00",
+        "alternatives": ["2025-01-06T10:30:00", "2025-01-06T11:00:00", "2025-01-06T11:30:00"],
+    }
+    engine.dispose()
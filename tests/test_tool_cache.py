@@ -0,0 +1,38 @@
+import time
+from datetime import datetime
+
+from src.slot_index import slot_index
+from src.tool_cache import ToolResultCache, UserToolCaches, tool_cache_key
+
+
+def test_key_is_independent_of_argument_order():
+    a = tool_cache_key("find_free_slots", {"start": datetime(2025, 1, 1, 9), "limit": 5})
+    b = tool_cache_key("find_free_slots", {"limit": 5, "start": datetime(2025, 1, 1, 9)})
+    assert a == b
+    assert a != tool_cache_key("get_appointment_lists", {"limit": 5, "start": datetime(2025, 1, 1, 9)})
+
+
+def test_entries_expire_with_version_and_ttl(monkeypatch):
+    cache = ToolResultCache(ttl_seconds=10)
+    cache.put("k", {"ok": True, "result": [1]}, slot_index.version)
+    assert cache.get("k") == {"ok": True, "result": [1]}
+
+    # Una entrada calculada antes de una escritura ya no es válida
+    cache.put("k", {"ok": True, "result": [1]}, slot_index.version - 1)
+    assert cache.get("k") is None
+
+    cache.put("k", {"ok": True, "result": [1]}, slot_index.version)
+    now = time.monotonic()
+    monkeypatch.setattr("src.tool_cache.time.monotonic", lambda: now + 11)
+    assert cache.get("k") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_user_caches_are_shared_only_with_ttl():
+    assert UserToolCaches(0).for_turn("u") is not UserToolCaches(0).for_turn("u")
+    caches = UserToolCaches(30, max_users=1)
+    first = caches.for_turn("u1")
+    assert caches.for_turn("u1") is first
+    caches.for_turn("u2")
+    assert caches.for_turn("u1") is not first
+    assert caches.for_turn(None) is not caches.for_turn(None)
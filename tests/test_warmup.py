@@ -0,0 +1,62 @@
+import asyncio
+import json
+from datetime import datetime
+
+import httpx
+
+from src.ollama_service import SYSTEM_MESSAGE, OllamaService
+from src.warmup import ModelWarmer, in_business_hours
+
+NODES = ["http://gpu-a:11434", "http://gpu-b:11434"]
+
+
+def _warmer(requests, down=(), **kwargs) -> ModelWarmer:
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host in down:
+            raise httpx.ConnectError("conexión rechazada", request=request)
+        requests.append((request.url.host, json.loads(request.content)))
+        return httpx.Response(200, json={"message": {"role": "assistant", "content": "."}, "done": True})
+
+    service = OllamaService(base_urls=NODES)
+    service.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return ModelWarmer(service, keep_alive="1h", **kwargs)
+
+
+def test_in_business_hours():
+    assert in_business_hours(datetime(2025, 1, 6, 10, 0))  # lunes
+    assert not in_business_hours(datetime(2025, 1, 6, 20, 0))
+    assert not in_business_hours(datetime(2025, 1, 5, 10, 0))  # domingo
+
+
+async def test_warm_all_loads_static_prefix_on_every_node():
+    requests = []
+    warmer = _warmer(requests, down={"gpu-b"})
+    assert warmer.status()["nodes"][NODES[0]]["state"] == "pending"
+
+    assert await warmer.warm_all() == [True, False]
+
+    host, payload = requests[0]
+    assert host == "gpu-a"
+    assert payload["messages"] == [SYSTEM_MESSAGE]
+    assert payload["tools"] == warmer.service.tools
+    assert payload["keep_alive"] == "1h"
+    assert payload["options"] == {"num_predict": 1}
+    status = warmer.status()
+    assert status["ready"] is False
+    assert status["nodes"][NODES[0]]["state"] == "ready"
+    assert status["nodes"][NODES[1]]["state"] == "failed"
+
+
+async def test_keep_alive_repeats_only_in_business_hours(monkeypatch):
+    requests = []
+    warmer = _warmer(requests, interval=0.01)
+    monkeypatch.setattr("src.warmup.in_business_hours", lambda now: False)
+    warmer.start()
+    await asyncio.sleep(0.05)
+    assert len(requests) == 2  # solo el calentamiento inicial
+
+    monkeypatch.setattr("src.warmup.in_business_hours", lambda now: True)
+    await asyncio.sleep(0.05)
+    await warmer.stop()
+    assert len(requests) > 2
+    assert warmer.status()["ready"] is True